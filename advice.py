@@ -0,0 +1,515 @@
+# advice.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from advice_cache import ALTERNATES_PER_KEY, default_cache
+from breaker import CircuitBreaker
+from gemini_pool import default_pool, key_hash
+from ratelimit import DEADLINE_S, RateLimited, default_limiter, is_retryable, status_code
+from scoring import CATEGORICAL, GREEN_FIELD, GREEN_FLAGS, GREEN_LABEL, NOTES_LABEL, PHONE_FIELD, PHONE_LABEL, SLIDERS, compute_score
+from lexicon import scan
+import telemetry
+
+MODEL = "gemini-2.5-flash"
+GENERATION_CONFIG = {"temperature": 1.3}
+# Súbelo cuando cambie el texto del prompt para no servir consejos de la versión anterior.
+PROMPT_VERSION = 3
+# Con streaming el consejo se va pintando según llega (ADVICE_STREAMING=0 para desactivarlo).
+STREAM_ADVICE = os.environ.get("ADVICE_STREAMING", "1") != "0"
+# Lo máximo que la página espera al primer trozo antes de tirar del consejo local.
+ADVICE_BUDGET_S = float(os.environ.get("ADVICE_BUDGET_S", "6"))
+# Respuestas por llamada (candidate_count): la primera va al chat y el resto a la reserva de
+# "pídele otra opinión". Con temperature 1.3 salen bien distintas. 1 = sin reserva.
+ADVICE_CANDIDATES = int(os.environ.get("ADVICE_CANDIDATES", "3"))
+# Cuando a una sesión le quedan estas opiniones (o menos) sin ver, se pide otra tanda en segundo plano.
+REROLL_LOW_WATER = 1
+
+# Pool de hilos a nivel de proceso: sobrevive a los reruns de Streamlit
+# (app.py se re-ejecuta entero, este módulo no).
+_prefetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="advice-prefetch")
+
+
+def _breaker_failure(e: Exception) -> bool:
+    # Solo cuenta lo que indica que Gemini está mal (no una key inválida ni nuestra propia cola).
+    # Un 429 tampoco: la cuota es de cada key y el breaker es de todo el proceso; que unas pocas
+    # usuarias sin cuota lo abran dejaría sin Gemini a todas las demás.
+    if isinstance(e, RateLimited) or status_code(e) == 429:
+        return False
+    return is_retryable(e)
+
+
+def new_breaker() -> CircuitBreaker:
+    # Para quien no deba compartir el de la app (batch.py): sus fallos no abren el de las usuarias, ni al revés.
+    return CircuitBreaker(is_failure=_breaker_failure)
+
+
+_breaker = new_breaker()
+_served = Counter()
+_served_lock = threading.Lock()
+
+
+# =========================
+# Prompt
+# =========================
+# La parte fija va como system_instruction: igual en todas las llamadas y no compite con el contexto
+# por el presupuesto. No hay caché de contexto: Gemini pide 1024 tokens como mínimo y esto son ~100.
+SYSTEM_INSTRUCTION = (
+    "Eres su mejor amiga y te cuenta su cita por WhatsApp. "
+    "Tono divertido, directo, cariñoso y protector; sarcasmo suave, sin insultos. "
+    "Nada de diagnósticos clínicos, nada de terapia, nada de patologizar. "
+    "Consejo realista según el score: con señales de control o inseguridad, primero seguridad y límites; "
+    "si pinta bien, hypea con cautela. El contexto va por orden de peso. "
+    "Máximo 4 frases cortas, 1-3 emojis, y acaba con algo práctico para hacer ahora."
+)
+# Tokens (estimados) para el contexto de cada cita. Lo que no cabe se queda fuera, empezando por lo que menos pesa.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("ADVICE_PROMPT_TOKENS", "160"))
+# Los factores que suman al menos esto van siempre, quepan o no: son los que hacen rojo un veredicto.
+MUST_POINTS = 15
+# Prioridad de lo que no es un factor del score (los factores usan sus puntos, de 0 a 25).
+TREND_PRIORITY = 30  # si va a peor con la misma persona, es lo primero que tiene que saber (y va siempre)
+NOTE_PRIORITY = 10  # lo que escribió ella, más lo que sumaron sus frases
+ALCOHOL_PRIORITY = 5
+LOCATION_PRIORITY = 1
+# Las preguntas 0–10 tal como se las hizo el cuestionario: "No escuchó: 9/10" se leería al revés.
+SLIDER_QUESTIONS = {
+    "me_dejo_hablar_0_10": "¿Te dejó hablar?",
+    "me_escucho_0_10": "¿Te escuchó de verdad?",
+    "me_hizo_preguntas_0_10": "¿Te hizo preguntas?",
+    "compatibilidad_valores_0_10": "Compatibilidad de valores",
+}
+# Cada nota puede llevarse como mucho esta parte del presupuesto (si no, una nota larga se come
+# los factores); si no cabe entera se recorta, pero no por debajo de MIN_NOTE_TOKENS. Las frases
+# que encontró el léxico no se recortan nunca: si quedan fuera del trozo, van citadas detrás.
+NOTE_SHARE = 0.35
+MIN_NOTE_TOKENS = 12
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes UTF-8 por token: en español sale parecido a countTokens, y las tildes y emojis pesan algo más.
+    return -(-len(text.encode("utf-8")) // 4)
+
+
+def _clip(text: str, tokens: int) -> str:
+    # Corta por palabra completa para que quepa en tokens (contando el "…").
+    cut = text.encode("utf-8")[: tokens * 4 - 3].decode("utf-8", errors="ignore")
+    return cut.rsplit(" ", 1)[0].rstrip(" ,.;:") + "…"
+
+
+class _Note:
+    """Una nota como línea de contexto: se puede recortar, salvo las frases que contaron en el score."""
+
+    __slots__ = ("head", "text", "flagged")
+
+    def __init__(self, head: str, raw: str, max_chars: int):
+        # Más de max_chars no cabría de ninguna forma: no hace falta limpiar el resto.
+        self.head = head
+        self.text = " ".join(raw[:max_chars].split())
+        self.flagged = [" ".join(f.split()) for f in dict.fromkeys(raw[h.start : h.end] for h in scan(raw))]
+
+    def line(self, tokens: int) -> str:
+        line = f"{self.head}: {self.text}"
+        if estimate_tokens(line) > tokens:
+            line = _clip(line, max(tokens, MIN_NOTE_TOKENS))
+        missing = [f for f in self.flagged if f not in line]
+        if missing:
+            line += " (" + " · ".join(f"«{f}»" for f in missing) + ")"
+        return line
+
+
+def _candidate_lines(data: dict, trend: dict | None, note_chars: int) -> list[tuple[float, object, bool]]:
+    """(prioridad, línea o _Note, imprescindible) de todo lo que podría ir en el contexto."""
+    _, _, breakdown = compute_score(data)
+    lines = []
+    for key, label, weights, _ in CATEGORICAL:
+        answer = data.get(key)
+        if answer in weights and answer != "Sin responder" and breakdown[label] > 0:
+            lines.append((breakdown[label], f"- {label}: {answer}", breakdown[label] >= MUST_POINTS))
+    for key, label, _, _ in SLIDERS:
+        answer = data.get(key)
+        if answer is not None and not str(answer).startswith("Sin") and breakdown[label] > 0:
+            lines.append((breakdown[label], f"- {SLIDER_QUESTIONS[key]} {answer}/10", breakdown[label] >= MUST_POINTS))
+    if breakdown[PHONE_LABEL] > 0:
+        lines.append((breakdown[PHONE_LABEL], f"- {PHONE_LABEL}: lo miró {data.get(PHONE_FIELD)} veces", False))
+    if breakdown[GREEN_LABEL] < 0:
+        greens = ", ".join(flag for flag, _ in GREEN_FLAGS if flag in data.get(GREEN_FIELD, []))
+        lines.append((-breakdown[GREEN_LABEL], f"- Green flags: {greens}", False))
+
+    notes = breakdown[NOTES_LABEL]
+    for field, head, pts in (("nota_rara", "- Lo que chirrió", max(notes, 0)), ("nota_buena", "- Lo bueno", max(-notes, 0))):
+        raw = data.get(field, "") or ""
+        if raw.strip():
+            note = _Note(head, raw, note_chars)
+            lines.append((NOTE_PRIORITY + pts, note, bool(note.flagged)))
+
+    if trend:
+        lines.append(
+            (
+                TREND_PRIORITY,
+                f"- Cita nº {trend['dates'] + 1} con él: score medio {trend['ewma']}, la última {trend['last']}; hoy {trend['direction']}",
+                True,
+            )
+        )
+        if trend["worse"]:
+            lines.append((TREND_PRIORITY, f"- Va a peor en: {', '.join(trend['worse'])}", True))
+    if data.get("alcohol"):
+        lines.append((ALCOHOL_PRIORITY, "- Hubo alcohol", False))
+    location = data.get("location")
+    if location and location != "Sin responder":
+        lines.append((LOCATION_PRIORITY, f"- Ubicación: {location}", False))
+    return lines
+
+
+def pack_context(data: dict, trend: dict | None = None, budget: int = PROMPT_TOKEN_BUDGET) -> list[str]:
+    """Las líneas de contexto, de más a menos prioridad: lo imprescindible siempre y el resto mientras quepa en budget tokens."""
+    note_max = max(MIN_NOTE_TOKENS, int(budget * NOTE_SHARE))
+    candidates = sorted(_candidate_lines(data, trend, note_max * 4), key=lambda c: -c[0])
+    chosen, left = {}, budget
+    for i, (_, line, must) in enumerate(candidates):
+        if must:
+            line = line.line(note_max) if isinstance(line, _Note) else line
+            chosen[i] = line
+            left -= estimate_tokens(line) + 1  # + el salto de línea
+    for i, (_, line, must) in enumerate(candidates):
+        if must:
+            continue
+        note = line if isinstance(line, _Note) else None
+        if note:
+            line = note.line(note_max)
+        cost = estimate_tokens(line) + 1
+        if cost <= left:
+            chosen[i] = line
+            left -= cost
+        elif note and left - 1 >= MIN_NOTE_TOKENS:
+            chosen[i] = line = note.line(left - 1)
+            left -= estimate_tokens(line) + 1
+    return [chosen[i] for i in sorted(chosen)]
+
+
+def prompt_context(data: dict, score: int, level: str, trend: dict | None = None) -> dict:
+    # Solo lo que de verdad llega al prompt: sirve también como key canónica de la caché.
+    return {"score": int(score), "level": level, "lines": pack_context(data, trend)}
+
+
+def _render(ctx: dict) -> str:
+    return "\n".join([f"Contexto:\n- Score: {ctx['score']}/100 ({ctx['level']})", *ctx["lines"]])
+
+
+def build_gemini_prompt(data: dict, score: int, level: str, trend: dict | None = None) -> str:
+    """La parte variable del prompt (el contexto de esta cita). La fija es SYSTEM_INSTRUCTION."""
+    return _render(prompt_context(data, score, level, trend))
+
+
+# =========================
+# Gemini
+# =========================
+def submission_id(data: dict) -> str:
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _candidate_texts(response) -> dict[int, str]:
+    # Con candidate_count > 1, response.text solo trae la primera: las demás van en candidates.
+    out = {}
+    for i, candidate in enumerate(getattr(response, "candidates", None) or ()):
+        parts = getattr(getattr(candidate, "content", None), "parts", None) or ()
+        index = getattr(candidate, "index", None)
+        out[i if index is None else index] = "".join(p.text for p in parts if getattr(p, "text", None))
+    return out
+
+
+def _log_usage(prompt: str, usage, seconds: float):
+    # Tokens reales de cada llamada (usage_metadata) junto a la estimación local, para comparar versiones del prompt.
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+    telemetry.count("prompt_tokens_total", prompt_tokens)
+    telemetry.count("cached_tokens_total", cached_tokens)
+    telemetry.count("output_tokens_total", output_tokens)
+    telemetry.event(
+        "llm_call",
+        model=MODEL,
+        prompt_version=PROMPT_VERSION,
+        ms=round(seconds * 1000, 1),
+        prompt_tokens=prompt_tokens,
+        cached_tokens=cached_tokens,
+        output_tokens=output_tokens,
+        estimated_tokens=estimate_tokens(SYSTEM_INSTRUCTION) + estimate_tokens(prompt),
+    )
+
+
+def generate_advice(api_key: str, prompt: str, on_chunk=None, alternates: list | None = None, deadline_s: float = DEADLINE_S) -> str:
+    """Consejo de Gemini. Con alternates, pide ADVICE_CANDIDATES respuestas y deja ahí las demás."""
+    streamed = False
+    multi = alternates is not None and ADVICE_CANDIDATES > 1
+
+    usage = None
+
+    def attempt(timeout_s: float) -> str:
+        nonlocal usage
+        config = dict(GENERATION_CONFIG, system_instruction=SYSTEM_INSTRUCTION, http_options={"timeout": int(timeout_s * 1000)})
+        if multi:
+            config["candidate_count"] = ADVICE_CANDIDATES
+            alternates.clear()  # por si es un reintento
+        usage = None
+        telemetry.count("llm_calls_total")
+        telemetry.count("prompt_chars_total", len(prompt))
+        t0 = time.perf_counter()
+        try:
+            with telemetry.span("gemini_call"):
+                text = _call(timeout_s, config)
+        except Exception as e:
+            telemetry.count("llm_errors_total", error=type(e).__name__)
+            raise
+        telemetry.count("response_chars_total", len(text) + sum(len(t) for t in alternates or ()))
+        _log_usage(prompt, usage, time.perf_counter() - t0)
+        return text
+
+    def _call(timeout_s: float, config: dict) -> str:
+        nonlocal streamed, usage
+        with default_pool().client(api_key) as client:
+            if on_chunk is None:
+                response = client.models.generate_content(
+                    model=MODEL,
+                    contents=prompt,
+                    config=config,
+                )
+                usage = getattr(response, "usage_metadata", None)
+                texts = _candidate_texts(response) if multi else {}
+                if texts:
+                    alternates.extend(t.strip() for i, t in sorted(texts.items()) if i and t.strip())
+                    return texts.get(0, "").strip()
+                return (response.text or "").strip()
+
+            parts, others = [], {}
+            for chunk in client.models.generate_content_stream(
+                model=MODEL,
+                contents=prompt,
+                config=config,
+            ):
+                # El recuento de tokens llega con el último trozo.
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                texts = _candidate_texts(chunk) if multi else {}
+                if texts:
+                    text = texts.pop(0, "")
+                    for i, t in texts.items():
+                        others.setdefault(i, []).append(t)
+                else:
+                    text = chunk.text or ""
+                if text:
+                    parts.append(text)
+                    streamed = True
+                    on_chunk(text)
+            if multi:
+                joined = ("".join(p).strip() for _, p in sorted(others.items()))
+                alternates.extend(t for t in joined if t)
+            return "".join(parts).strip()
+
+    # Si ya pintamos trozos en la burbuja, reintentar duplicaría el texto.
+    return default_limiter().call(attempt, key_hash(api_key), MODEL, deadline_s=deadline_s, retry_if=lambda e: not streamed)
+
+
+def _cache_key(ctx: dict) -> str:
+    return submission_id(dict(ctx, model=MODEL, prompt_version=PROMPT_VERSION))
+
+
+def advice_cache_key(data: dict, score: int, level: str, trend: dict | None = None) -> str:
+    return _cache_key(prompt_context(data, score, level, trend))
+
+
+def cached_advice(data: dict, score: int, level: str, trend: dict | None = None, cache=None) -> str | None:
+    """El consejo que ya está en la caché compartida, sin llamar a Gemini."""
+    return (cache or default_cache()).get(advice_cache_key(data, score, level, trend))
+
+
+def get_advice(
+    api_key: str,
+    data: dict,
+    score: int,
+    level: str,
+    on_chunk=None,
+    cache=None,
+    generate=None,
+    trend: dict | None = None,
+    breaker: CircuitBreaker | None = None,
+    deadline_s: float = DEADLINE_S,
+) -> tuple[str, str]:
+    """Devuelve (consejo, origen): "gemini" si hubo llamada, "cache" si lo sirvió la caché compartida."""
+    with telemetry.span("build_prompt"):
+        ctx = prompt_context(data, score, level, trend)
+        prompt = _render(ctx)
+    key = _cache_key(ctx)
+    cache = cache or default_cache()
+    breaker = breaker or _breaker
+    source = "cache"
+    alternates = []
+
+    def compute() -> str:
+        nonlocal source
+        source = "gemini"
+        if generate is not None:
+            return breaker.call(lambda: generate(api_key, prompt, on_chunk))
+        # En la misma llamada salen ya las primeras opiniones de reserva.
+        return breaker.call(lambda: generate_advice(api_key, prompt, on_chunk, alternates, deadline_s))
+
+    text = cache.get_or_compute(key, compute)
+    if alternates:
+        cache.add_alternates(key, alternates)
+    return text, source
+
+
+def record_served(path: str):
+    with _served_lock:
+        _served[path] += 1
+
+
+def served_stats() -> dict:
+    with _served_lock:
+        out = dict(_served)
+    # Sin reserva, cada "otra opinión" sería una llamada; con ella, solo las tandas.
+    rerolls = out.get("reroll_pool", 0) + out.get("reroll_gemini", 0)
+    if rerolls:
+        out["reroll_calls_saved"] = rerolls - out.get("reroll_topup_calls", 0)
+    out["breaker"] = _breaker.stats()
+    return out
+
+
+class AdviceJob:
+    """Consejo en curso: el hilo de fondo va dejando trozos y la página los pinta según llegan."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks: list[str] = []
+        self._done = False
+        self.future: Future | None = None
+        self.source: str | None = None
+
+    def push(self, chunk: str):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def _finish(self, future: Future):
+        with self._cond:
+            # Si vino de la caché no hubo trozos: lo entregamos de golpe.
+            if not self._chunks and not future.cancelled() and future.exception() is None:
+                self._chunks.append(future.result())
+            self._done = True
+            self._cond.notify_all()
+
+    def cancel(self) -> bool:
+        return self.future.cancel()
+
+    def result(self, timeout: float | None = None) -> str:
+        return self.future.result(timeout)
+
+    def stream(self, first_chunk_timeout: float | None = None):
+        deadline = None if first_chunk_timeout is None else time.monotonic() + first_chunk_timeout
+        seen = 0
+        while True:
+            with self._cond:
+                while len(self._chunks) == seen and not self._done:
+                    if seen == 0 and deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError("Gemini no respondió dentro del presupuesto de latencia.")
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                new = self._chunks[seen:]
+                seen = len(self._chunks)
+                done = self._done
+            if new:
+                yield "".join(new)
+            if done:
+                break
+
+
+def _run_job(job: AdviceJob, api_key: str, data: dict, score: int, level: str, trend: dict | None = None, trace=None, stream: bool = STREAM_ADVICE, **kwargs) -> str:
+    on_chunk = job.push if stream else None
+    with telemetry.bound(trace):
+        text, job.source = get_advice(api_key, data, score, level, on_chunk, trend=trend, **kwargs)
+    return text
+
+
+def prefetch_advice(
+    api_key: str, data: dict, score: int, level: str, trend: dict | None = None, cache=None, generate=None, stream: bool = STREAM_ADVICE
+) -> AdviceJob:
+    # Ojo: el hilo no tiene contexto de Streamlit, así que aquí nada de st.*
+    # stream=False cuando nadie va a pintar los trozos: la llamada sin streaming es más barata.
+    job = AdviceJob()
+    job.future = _prefetch_pool.submit(
+        _run_job, job, api_key, data, score, level, trend, telemetry.current(), stream, cache=cache, generate=generate
+    )
+    job.future.add_done_callback(job._finish)
+    return job
+
+
+# =========================
+# "Pídele otra opinión"
+# =========================
+# Tandas en vuelo por key (en este proceso): dos sesiones con la misma key esperan a la misma.
+_topups: dict[str, Future] = {}
+_topups_lock = threading.Lock()
+
+
+def _top_up(api_key: str, key: str, prompt: str, cache, trace=None) -> int:
+    with telemetry.bound(trace):
+        alternates = []
+        first = _breaker.call(lambda: generate_advice(api_key, prompt, None, alternates))
+        record_served("reroll_topup_calls")
+        return cache.add_alternates(key, [first, *alternates])
+
+
+def top_up_opinions(api_key: str, data: dict, score: int, level: str, trend: dict | None = None, cache=None) -> Future:
+    """Una llamada (ADVICE_CANDIDATES respuestas) que rellena la reserva de esa key."""
+    cache = cache or default_cache()
+    key = advice_cache_key(data, score, level, trend)
+    with _topups_lock:
+        future = _topups.get(key)
+        if future is not None and not future.done():
+            return future
+        prompt = build_gemini_prompt(data, score, level, trend)
+        future = _topups[key] = _prefetch_pool.submit(_top_up, api_key, key, prompt, cache, telemetry.current())
+    # Fuera del lock: si ya ha terminado, el callback corre en este mismo hilo.
+    future.add_done_callback(lambda f: _forget_top_up(key, f))
+    return future
+
+
+def _forget_top_up(key: str, future: Future):
+    with _topups_lock:
+        if _topups.get(key) is future:
+            del _topups[key]
+
+
+def another_opinion(
+    api_key: str, data: dict, score: int, level: str, seen: int, trend: dict | None = None, cache=None, wait_s: float = ADVICE_BUDGET_S
+) -> tuple[str, str]:
+    """La opinión de reserva número seen (0 = la primera) y su origen: "pool" si ya estaba, "gemini" si hubo que esperarla.
+
+    Si quedan pocas por ver, pide otra tanda en segundo plano para que la siguiente también sea instantánea.
+    """
+    cache = cache or default_cache()
+    key = advice_cache_key(data, score, level, trend)
+    have = cache.alternates(key)
+    if have >= ALTERNATES_PER_KEY:
+        seen %= have  # reserva llena: se recorren en bucle, ya no hay más llamadas
+    future = None
+    if have < ALTERNATES_PER_KEY and have - seen - 1 < REROLL_LOW_WATER:
+        future = top_up_opinions(api_key, data, score, level, trend, cache)
+
+    text = cache.alternate(key, seen) if seen < have else None
+    source = "pool"
+    if text is None:
+        future = future or top_up_opinions(api_key, data, score, level, trend, cache)
+        have = future.result(timeout=wait_s)
+        if not have:
+            raise RuntimeError("Gemini no devolvió ninguna opinión.")
+        text, source = cache.alternate(key, seen % have), "gemini"
+    record_served(f"reroll_{source}")
+    telemetry.count("rerolls_total", source=source)
+    return text, source
@@ -0,0 +1,266 @@
+# advice_cache.py
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "advice.sqlite3")
+MAX_ENTRIES = int(os.environ.get("ADVICE_CACHE_MAX_ENTRIES", "5000"))
+TTL_S = float(os.environ.get("ADVICE_CACHE_TTL_S", str(7 * 24 * 3600)))
+# Opiniones de reserva ("pídele otra opinión") por key; pasado el tope, las sesiones las recorren en bucle.
+ALTERNATES_PER_KEY = int(os.environ.get("ADVICE_ALTERNATES_PER_KEY", "12"))
+# Si el proceso que está llamando a Gemini muere, los demás toman el relevo pasado este tiempo.
+LEASE_S = 30.0
+POLL_S = 0.05
+
+COUNTERS = ("hits", "misses", "coalesced", "evictions")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS advice (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS advice_last_access ON advice(last_access);
+CREATE INDEX IF NOT EXISTS advice_created_at ON advice(created_at);
+CREATE TABLE IF NOT EXISTS alternates (
+    key TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (key, n)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS alternates_created_at ON alternates(created_at);
+CREATE TABLE IF NOT EXISTS inflight (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class AdviceCache:
+    """Caché de consejos compartida entre procesos (SQLite) con LRU + TTL y single-flight."""
+
+    def __init__(self, path: str | None = None, max_entries: int = MAX_ENTRIES, ttl_s: float = TTL_S, lease_s: float = LEASE_S):
+        # ADVICE_CACHE_PATH se lee aquí y no al importar: api.py --dry-run lo cambia con el módulo ya cargado.
+        self.path = path or os.environ.get("ADVICE_CACHE_PATH", DEFAULT_PATH)
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.lease_s = lease_s
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flights: dict[str, Future] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.executemany("INSERT OR IGNORE INTO stats(name, value) VALUES (?, 0)", [(c,) for c in COUNTERS])
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, name: str, n: int = 1):
+        if n:
+            self._conn().execute("UPDATE stats SET value = value + ? WHERE name = ?", (n, name))
+
+    # -------------------------
+    # Lectura / escritura
+    # -------------------------
+    def get(self, key: str) -> str | None:
+        conn = self._conn()
+        row = conn.execute("SELECT text, created_at FROM advice WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl_s:
+            if conn.execute("DELETE FROM advice WHERE key = ?", (key,)).rowcount:
+                self._bump("evictions")
+            return None
+        conn.execute("UPDATE advice SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, text: str):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO advice(key, text, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, now, now),
+            )
+            evicted = conn.execute("DELETE FROM advice WHERE created_at < ?", (now - self.ttl_s,)).rowcount
+            over = conn.execute("SELECT COUNT(*) FROM advice").fetchone()[0] - self.max_entries
+            if over > 0:
+                evicted += conn.execute(
+                    "DELETE FROM advice WHERE key IN (SELECT key FROM advice ORDER BY last_access LIMIT ?)",
+                    (over,),
+                ).rowcount
+            self._bump("evictions", evicted)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -------------------------
+    # Opiniones de reserva
+    # -------------------------
+    def add_alternates(self, key: str, texts: list[str]) -> int:
+        """Añade al final de la reserva de key las que no estén ya. Devuelve cuántas hay ahora."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Caducan con el mismo TTL que los consejos.
+            conn.execute("DELETE FROM alternates WHERE created_at < ?", (now - self.ttl_s,))
+            rows = conn.execute("SELECT n, text FROM alternates WHERE key = ? ORDER BY n", (key,)).fetchall()
+            seen = {text for _, text in rows}
+            count, nxt = len(rows), (rows[-1][0] + 1 if rows else 0)
+            for text in texts:
+                if count >= ALTERNATES_PER_KEY:
+                    break
+                if text and text not in seen:
+                    conn.execute("INSERT INTO alternates(key, n, text, created_at) VALUES (?, ?, ?, ?)", (key, nxt, text, now))
+                    seen.add(text)
+                    count, nxt = count + 1, nxt + 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def alternates(self, key: str) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM alternates WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl_s)
+        ).fetchone()[0]
+
+    def alternate(self, key: str, i: int) -> str | None:
+        # La i-ésima por orden de llegada (si alguna ha caducado, la numeración tiene huecos).
+        row = self._conn().execute(
+            "SELECT text FROM alternates WHERE key = ? AND created_at >= ? ORDER BY n LIMIT 1 OFFSET ?",
+            (key, time.time() - self.ttl_s, i),
+        ).fetchone()
+        return row[0] if row else None
+
+    # -------------------------
+    # Single-flight
+    # -------------------------
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        text = self.get(key)
+        if text is not None:
+            self._bump("hits")
+            return text
+
+        # Dentro del proceso: las sesiones con la misma key esperan al mismo Future.
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._flights[key] = flight
+        if not leader:
+            self._bump("coalesced")
+            return flight.result()
+
+        try:
+            text = self._compute_across_processes(key, compute)
+            flight.set_result(text)
+            return text
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _compute_across_processes(self, key: str, compute: Callable[[], str]) -> str:
+        while True:
+            if self._acquire_lease(key):
+                try:
+                    # Otra réplica pudo terminar justo antes de que cogiéramos el lease.
+                    text = self.get(key)
+                    if text is not None:
+                        self._bump("hits")
+                        return text
+                    self._bump("misses")
+                    text = compute()
+                    if text:
+                        self.put(key, text)
+                    return text
+                finally:
+                    self._release_lease(key)
+
+            # Otra réplica ya está llamando a Gemini con esta key: esperamos su resultado.
+            deadline = time.monotonic() + self.lease_s
+            while time.monotonic() < deadline:
+                time.sleep(POLL_S)
+                text = self.get(key)
+                if text is not None:
+                    self._bump("coalesced")
+                    return text
+                if not self._lease_alive(key):
+                    break
+            # Lease liberado sin resultado (falló) o caducado: lo intentamos nosotros.
+
+    def _acquire_lease(self, key: str) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND started_at < ?", (key, now - self.lease_s))
+            acquired = conn.execute(
+                "INSERT OR IGNORE INTO inflight(key, owner, started_at) VALUES (?, ?, ?)",
+                (key, self._owner, now),
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def _release_lease(self, key: str):
+        self._conn().execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def _lease_alive(self, key: str) -> bool:
+        row = self._conn().execute("SELECT started_at FROM inflight WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] < self.lease_s
+
+    # -------------------------
+    # Métricas
+    # -------------------------
+    def stats(self) -> dict:
+        conn = self._conn()
+        out = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        out["entries"] = conn.execute("SELECT COUNT(*) FROM advice").fetchone()[0]
+        out["inflight"] = conn.execute("SELECT COUNT(*) FROM inflight").fetchone()[0]
+        out["alternates"] = conn.execute("SELECT COUNT(*) FROM alternates").fetchone()[0]
+        lookups = out.get("hits", 0) + out.get("misses", 0) + out.get("coalesced", 0)
+        out["hit_ratio"] = (lookups - out.get("misses", 0)) / lookups if lookups else 0.0
+        return out
+
+
+_default_cache: AdviceCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> AdviceCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AdviceCache()
+        return _default_cache
@@ -0,0 +1,133 @@
+# analytics.py
+import hmac
+import math
+import os
+
+import streamlit as st
+
+from history import default_history
+from scoring import LEVELS
+
+# Página solo para operadoras: ?page=analytics&token=<ANALYTICS_TOKEN>. Sin token configurado, no existe.
+TOKEN = os.environ.get("ANALYTICS_TOKEN", "")
+# Puntos máximos de las series temporales: con años de datos agrupamos por semanas/meses.
+MAX_POINTS = 120
+SCORE_BIN = 5
+LEVEL_ORDER = [name for _, name in LEVELS]
+RISKY_LEVELS = tuple(LEVEL_ORDER[2:])  # naranja y rojo
+LEVEL_COLORS = ["#3CB371", "#F4C430", "#FF8C00", "#DC143C"]
+
+
+def allowed(query_params) -> bool:
+    if not TOKEN or query_params.get("page") != "analytics":
+        return False
+    return hmac.compare_digest((query_params.get("token") or "").encode("utf-8"), TOKEN.encode("utf-8"))
+
+
+def store_version() -> int:
+    return default_history().version()
+
+
+# =========================
+# Datos (de los rollups, nunca de la tabla de envíos)
+# =========================
+@st.cache_data(max_entries=4, show_spinner=False)
+def frames(version: int) -> dict:
+    # version solo está para la clave de la caché: cambia con cada lote que escribe el histórico.
+    import pandas as pd
+
+    r = default_history().rollups()
+    score = pd.DataFrame(r["score"], columns=["level", "score", "n"])
+    daily = pd.DataFrame(r["daily"], columns=["day", "level", "n", "score_sum"])
+    context = pd.DataFrame(r["context"], columns=["location", "alcohol", "level", "n"])
+    contrib = pd.DataFrame(r["contrib"], columns=["factor", "n", "points"])
+
+    total = int(score["n"].sum())
+    summary = {
+        "total": total,
+        "avg_score": float((score["score"] * score["n"]).sum() / total) if total else 0.0,
+        "risky_share": float(score.loc[score["level"].isin(RISKY_LEVELS), "n"].sum() / total) if total else 0.0,
+    }
+
+    score["bin"] = score["score"] // SCORE_BIN * SCORE_BIN
+    histogram = score.groupby(["bin", "level"], as_index=False)["n"].sum()
+
+    contrib["share"] = contrib["n"] / total if total else 0.0
+    contrib["avg_points"] = contrib["points"] / contrib["n"]
+    contrib = contrib.sort_values("n", ascending=False).head(12)
+
+    context["risky"] = context["level"].isin(RISKY_LEVELS) * context["n"]
+    cross = context.groupby(["location", "alcohol"], as_index=False)[["n", "risky"]].sum()
+    cross["risky_share"] = cross["risky"] / cross["n"]
+    cross["alcohol"] = cross["alcohol"].map({0: "Sin alcohol", 1: "Con alcohol"})
+
+    return {"summary": summary, "histogram": histogram, "contrib": contrib, "cross": cross, "trend": downsample(daily)}
+
+
+def downsample(daily):
+    import pandas as pd
+
+    if daily.empty:
+        return daily.assign(date=pd.Series(dtype="datetime64[ns]"))
+    first, last = int(daily["day"].min()), int(daily["day"].max())
+    step = max(1, math.ceil((last - first + 1) / MAX_POINTS))
+    daily = daily.assign(bucket=first + (daily["day"] - first) // step * step)
+    out = daily.groupby(["bucket", "level"], as_index=False)[["n", "score_sum"]].sum()
+    out["date"] = pd.to_datetime(out["bucket"] * 86400, unit="s")
+    return out
+
+
+# =========================
+# Gráficos (Altair, cacheados por versión del histórico)
+# =========================
+@st.cache_resource(max_entries=4, show_spinner=False)
+def charts(version: int) -> dict:
+    import altair as alt
+
+    f = frames(version)
+    color = alt.Color("level:N", title="Nivel", scale=alt.Scale(domain=LEVEL_ORDER, range=LEVEL_COLORS))
+
+    histogram = (
+        alt.Chart(f["histogram"])
+        .mark_bar()
+        .encode(
+            x=alt.X("bin:Q", title="Score", bin=alt.BinParams(step=SCORE_BIN, extent=[0, 100 + SCORE_BIN])),
+            y=alt.Y("sum(n):Q", title="Veredictos"),
+            color=color,
+            tooltip=["level:N", "bin:Q", "sum(n):Q"],
+        )
+    )
+
+    contrib = (
+        alt.Chart(f["contrib"])
+        .mark_bar(color="#C71585")
+        .encode(
+            x=alt.X("share:Q", title="% de veredictos donde suma", axis=alt.Axis(format="%")),
+            y=alt.Y("factor:N", title=None, sort="-x"),
+            tooltip=["factor:N", "n:Q", alt.Tooltip("avg_points:Q", format=".1f")],
+        )
+    )
+
+    base = alt.Chart(f["cross"]).encode(
+        x=alt.X("alcohol:N", title=None),
+        y=alt.Y("location:N", title=None),
+    )
+    cross = base.mark_rect().encode(
+        color=alt.Color("risky_share:Q", title="% naranja/rojo", scale=alt.Scale(scheme="reds"), legend=alt.Legend(format="%")),
+        tooltip=["location:N", "alcohol:N", "n:Q", alt.Tooltip("risky_share:Q", format=".0%")],
+    ) + base.mark_text(baseline="middle").encode(text="n:Q")
+
+    trend = f["trend"]
+    volume = (
+        alt.Chart(trend)
+        .mark_bar()
+        .encode(x=alt.X("date:T", title=None), y=alt.Y("sum(n):Q", title="Veredictos"), color=color)
+    )
+    avg = (
+        alt.Chart(trend)
+        .transform_aggregate(n="sum(n)", score_sum="sum(score_sum)", groupby=["date"])
+        .transform_calculate(avg_score="datum.score_sum / datum.n")
+        .mark_line(color="#4B0082", point=True)
+        .encode(x="date:T", y=alt.Y("avg_score:Q", title="Score medio", scale=alt.Scale(domain=[0, 100])))
+    )
+    return {"histogram": histogram, "contrib": contrib, "cross": cross, "volume": volume, "avg": avg}
@@ -0,0 +1,385 @@
+# api.py
+"""API HTTP del detector, sin Streamlit: cada petición es una llamada, no un rerun del script.
+
+    python api.py --port 8600 --workers 4
+    python api.py --dry-run --fake-latency-ms 300        # LLM falso (benchmarks/api_load.py)
+
+    POST /v1/score          date_data                      → {score, level, breakdown}
+    POST /v1/score/batch    {"items": [date_data, ...]}    → {results: [...]} (hasta API_BATCH_MAX)
+    POST /v1/advice         date_data                      → {score, level, breakdown, advice, source}
+    POST /v1/advice/stream  date_data                      → NDJSON: {"chunk": …} por trozo y al final
+                                                             {"done": true, "advice": …, "source": …}
+    GET  /healthz
+    GET  /metrics           Prometheus (de este worker; TELEMETRY=1)
+
+date_data es el mismo dict que arma page_cuestionario; lo que falte cuenta como "Sin responder".
+Los consejos usan la key de la cabecera X-Goog-Api-Key o, si no viene, GEMINI_API_KEY del
+servidor. Cada worker tiene su tope de llamadas al LLM en vuelo (API_LLM_CONCURRENCY); la caché
+de consejos (SQLite) la comparten todos.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import advice
+from advice_cache import AdviceCache, default_cache
+from breaker import CircuitOpen
+from fallback_advice import local_advice
+from lexicon import NOTE_FIELDS
+from ratelimit import RateLimited
+from scoring import GREEN_FIELD, GREEN_FLAGS, OPTIONS, PHONE_FIELD, SLIDERS, compute_score
+from session_model import LOCATIONS
+import telemetry
+
+BATCH_MAX = int(os.environ.get("API_BATCH_MAX", "1000"))
+# A partir de este tamaño el lote se puntúa en un hilo (unos 4 ms): el event loop sigue atendiendo.
+BATCH_THREAD_MIN = 256
+# Llamadas al LLM en vuelo por worker. Más de 8 no sirve: es el tamaño del pool de advice.py.
+LLM_CONCURRENCY = int(os.environ.get("API_LLM_CONCURRENCY", "8"))
+# Lo que una petición espera hueco hacia el LLM antes de conformarse con el consejo local.
+LLM_QUEUE_S = float(os.environ.get("API_LLM_QUEUE_S", "2"))
+ADVICE_TIMEOUT_S = float(os.environ.get("API_ADVICE_TIMEOUT_S", str(advice.ADVICE_BUDGET_S)))
+NOTE_MAX_CHARS = 2000
+TEXT_MAX_CHARS = 80
+# LLM falso (lo pone `--dry-run`): nada de red ni de cuota.
+DRY_RUN = os.environ.get("API_DRY_RUN", "0") == "1"
+FAKE_LATENCY_MS = float(os.environ.get("API_FAKE_LATENCY_MS", "300"))
+
+_SLIDER_KEYS = frozenset(key for key, _, _, _ in SLIDERS)
+_SLIDER_VALUES = frozenset(["Sin responder", *(str(i) for i in range(11))])
+_GREENS = frozenset(flag for flag, _ in GREEN_FLAGS)
+
+
+# =========================
+# Validación
+# =========================
+def validate(data) -> list[dict]:
+    """Errores de un date_data ({field, error}); lista vacía si se puede puntuar tal cual."""
+    if not isinstance(data, dict):
+        return [{"field": None, "error": "se esperaba un objeto JSON"}]
+    errors = []
+
+    def bad(field, error):
+        errors.append({"field": field, "error": error})
+
+    for key, v in data.items():
+        if key in OPTIONS:
+            if v not in OPTIONS[key]:
+                bad(key, f"tiene que ser una de: {', '.join(OPTIONS[key])}")
+        elif key in _SLIDER_KEYS:
+            # isinstance antes del frozenset: una lista o un dict no se pueden buscar ahí (TypeError → 500).
+            if not (type(v) is int and 0 <= v <= 10) and not (isinstance(v, str) and v in _SLIDER_VALUES):
+                bad(key, "tiene que ser un entero de 0 a 10 o \"Sin responder\"")
+        elif key == PHONE_FIELD:
+            if type(v) is not int or v < 0:
+                bad(key, "tiene que ser un entero >= 0")
+        elif key == GREEN_FIELD:
+            if not isinstance(v, list) or not all(isinstance(f, str) and f in _GREENS for f in v):
+                bad(key, f"tiene que ser una lista con algunas de: {', '.join(sorted(_GREENS))}")
+        elif key in NOTE_FIELDS:
+            if not isinstance(v, str) or len(v) > NOTE_MAX_CHARS:
+                bad(key, f"tiene que ser texto de hasta {NOTE_MAX_CHARS} caracteres")
+        elif key == "alcohol":
+            if type(v) is not bool:
+                bad(key, "tiene que ser true o false")
+        elif key == "location":
+            if v not in LOCATIONS:
+                bad(key, f"tiene que ser una de: {', '.join(LOCATIONS)}")
+        elif key == "person":
+            if not isinstance(v, str) or len(v) > TEXT_MAX_CHARS:
+                bad(key, f"tiene que ser texto de hasta {TEXT_MAX_CHARS} caracteres")
+        elif key == "id":
+            if not isinstance(v, (str, int)) or type(v) is bool:
+                bad(key, "tiene que ser texto o un entero")
+        else:
+            bad(key, "campo desconocido")
+    return errors
+
+
+def _result(score: int, level: str, breakdown: dict) -> dict:
+    return {"score": int(score), "level": level, "breakdown": breakdown}
+
+
+def score_many(items: list[dict]) -> list[dict]:
+    # Con dicts sueltos (lo que llega en JSON) score_batch no compensa: pasarlos a columnas cuesta
+    # más que puntuarlos uno a uno. Ver batch.py para ficheros grandes.
+    return [_result(*compute_score(d)) for d in items]
+
+
+# =========================
+# Consejo
+# =========================
+def _fake_generate(_key: str, prompt: str, on_chunk=None) -> str:
+    # Media latencia hasta el primer trozo y la otra media repartida entre el resto, como el de verdad.
+    text = f"[dry-run] Consejo de prueba para un prompt de {len(prompt)} caracteres. Cuídate mucho. 💖"
+    words = text.split(" ")
+    time.sleep(FAKE_LATENCY_MS / 2000)
+    for word in words:
+        if on_chunk is not None:
+            on_chunk(word + " ")
+        time.sleep(FAKE_LATENCY_MS / 2000 / len(words))
+    return text
+
+
+GENERATE = _fake_generate if DRY_RUN else None
+_dry_cache: AdviceCache | None = None
+_dry_cache_lock = threading.Lock()
+
+
+def _cache() -> AdviceCache:
+    # En dry-run, nunca la caché compartida: los consejos falsos se servirían luego a usuarias de verdad.
+    global _dry_cache
+    if not DRY_RUN:
+        return default_cache()
+    with _dry_cache_lock:
+        if _dry_cache is None:
+            path = os.environ.get("API_DRY_CACHE_PATH") or os.path.join(tempfile.mkdtemp(prefix="rfd-api-"), "advice.sqlite3")
+            _dry_cache = AdviceCache(path=path)
+        return _dry_cache
+
+
+_llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+
+
+def _fallback_source(e: BaseException) -> str:
+    # Los mismos orígenes que registra page_veredicto.
+    if isinstance(e, TimeoutError):
+        return "fallback_timeout"
+    if isinstance(e, CircuitOpen):
+        return "fallback_breaker"
+    if isinstance(e, RateLimited):
+        return "fallback_ratelimit"
+    return "fallback_error"
+
+
+async def _acquire_slot() -> bool:
+    try:
+        await asyncio.wait_for(_llm_slots.acquire(), LLM_QUEUE_S)
+        return True
+    except TimeoutError:
+        telemetry.count("api_llm_busy_total")
+        return False
+
+
+def _start_job(api_key: str, data: dict, score: int, level: str, stream: bool) -> advice.AdviceJob:
+    """Lanza el consejo con un hueco de _llm_slots ya cogido; lo suelta el job al terminar, no la petición."""
+    loop = asyncio.get_running_loop()
+    try:
+        job = advice.prefetch_advice(api_key, data, score, level, cache=_cache(), generate=GENERATE, stream=stream)
+    except BaseException:
+        _llm_slots.release()
+        raise
+    # Tras un timeout (o si el cliente corta el stream) Gemini sigue en segundo plano: si el hueco se
+    # soltara ya, LLM_CONCURRENCY no acotaría las llamadas de verdad.
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(_llm_slots.release)
+        except RuntimeError:  # el loop ya se cerró (apagando el worker)
+            pass
+
+    job.future.add_done_callback(release)
+    return job
+
+
+def _cached(data: dict, score: int, level: str) -> str | None:
+    # Un acierto de caché no ocupa hueco hacia el LLM: se sirve sin esperar a nadie.
+    # Es SQLite síncrono (con escrituras en WAL puede esperar al lock): llamar con run_in_threadpool.
+    return _cache().get(advice.advice_cache_key(data, score, level))
+
+
+def _api_key(request: Request) -> str:
+    return (request.headers.get("x-goog-api-key") or os.environ.get("GEMINI_API_KEY") or "").strip()
+
+
+async def _advice_input(request: Request):
+    """(api_key, date_data, score, level, breakdown) o la respuesta de error."""
+    data, errors = await _read(request)
+    if errors:
+        return errors
+    api_key = "dry-run" if DRY_RUN else _api_key(request)
+    if not api_key:
+        return JSONResponse({"errors": [{"field": None, "error": "falta la cabecera X-Goog-Api-Key"}]}, status_code=401)
+    # compute_score escanea las notas: fuera del event loop, como todo lo de los consejos.
+    return (api_key, data, *(await run_in_threadpool(compute_score, data)))
+
+
+# =========================
+# Rutas
+# =========================
+async def _read(request: Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, JSONResponse({"errors": [{"field": None, "error": "el cuerpo no es JSON"}]}, status_code=400)
+    errors = validate(body)
+    if errors:
+        return None, JSONResponse({"errors": errors}, status_code=422)
+    return body, None
+
+
+def _timed(route: str):
+    def wrap(handler):
+        async def timed(request: Request):
+            t0 = time.perf_counter()
+            response = await handler(request)
+            telemetry.observe("api_request_seconds", time.perf_counter() - t0, route=route)
+            telemetry.count("api_requests_total", route=route, status=response.status_code)
+            return response
+
+        return timed
+
+    return wrap
+
+
+@_timed("score")
+async def score(request: Request):
+    data, errors = await _read(request)
+    if errors:
+        return errors
+    return JSONResponse(_result(*compute_score(data)))
+
+
+@_timed("score_batch")
+async def score_batch_route(request: Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"errors": [{"field": None, "error": "el cuerpo no es JSON"}]}, status_code=400)
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        return JSONResponse({"errors": [{"field": "items", "error": "se esperaba una lista"}]}, status_code=422)
+    if len(items) > BATCH_MAX:
+        return JSONResponse({"errors": [{"field": "items", "error": f"como mucho {BATCH_MAX} por petición"}]}, status_code=413)
+
+    errors = [dict(e, index=i) for i, item in enumerate(items) for e in validate(item)]
+    if errors:
+        return JSONResponse({"errors": errors}, status_code=422)
+
+    telemetry.count("api_batch_items_total", len(items))
+    if len(items) < BATCH_THREAD_MIN:
+        results = score_many(items)
+    else:
+        results = await run_in_threadpool(score_many, items)
+    for data, res in zip(items, results):
+        if "id" in data:
+            res["id"] = data["id"]
+    return JSONResponse({"results": results})
+
+
+@_timed("advice")
+async def advice_route(request: Request):
+    got = await _advice_input(request)
+    if not isinstance(got, tuple):
+        return got
+    api_key, data, score_, level, breakdown = got
+    text = await run_in_threadpool(_cached, data, score_, level)
+    if text is not None:
+        source = "cache"
+    elif not await _acquire_slot():
+        text, source = local_advice(score_, level, breakdown), "fallback_busy"
+    else:
+        # /v1/advice devuelve el texto entero: sin streaming hacia Gemini (aunque ADVICE_STREAMING esté activo).
+        job = _start_job(api_key, data, score_, level, stream=False)
+        try:
+            # Si se pasa de tiempo, Gemini sigue en segundo plano y deja el consejo en la caché.
+            text = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), ADVICE_TIMEOUT_S)
+            source = job.source or "gemini"
+        except Exception as e:
+            text, source = local_advice(score_, level, breakdown), _fallback_source(e)
+    advice.record_served(f"api_{source}")
+    return JSONResponse({**_result(score_, level, breakdown), "advice": text, "source": source})
+
+
+@_timed("advice_stream")
+async def advice_stream(request: Request):
+    got = await _advice_input(request)
+    if not isinstance(got, tuple):
+        return got
+    api_key, data, score_, level, breakdown = got
+
+    def line(obj: dict) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def body():
+        # La cabecera va primero: el cliente pinta el score mientras llega el consejo.
+        yield line(_result(score_, level, breakdown))
+        text = await run_in_threadpool(_cached, data, score_, level)
+        if text is not None:
+            source = "cache"
+            yield line({"chunk": text})
+        elif not await _acquire_slot():
+            text, source = local_advice(score_, level, breakdown), "fallback_busy"
+        else:
+            job = _start_job(api_key, data, score_, level, stream=advice.STREAM_ADVICE)
+            try:
+                async for chunk in iterate_in_threadpool(job.stream(first_chunk_timeout=ADVICE_TIMEOUT_S)):
+                    yield line({"chunk": chunk})
+                text, source = job.result(), job.source or "gemini"
+            except Exception as e:
+                # Si ya habían salido trozos, el cliente se queda con el "advice" de la última línea.
+                text, source = local_advice(score_, level, breakdown), _fallback_source(e)
+        advice.record_served(f"api_{source}")
+        yield line({"done": True, "advice": text, "source": source})
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+async def healthz(request: Request):
+    return JSONResponse({"ok": True, "pid": os.getpid(), "dry_run": DRY_RUN})
+
+
+async def metrics(request: Request):
+    return PlainTextResponse(telemetry.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/score", score, methods=["POST"]),
+        Route("/v1/score/batch", score_batch_route, methods=["POST"]),
+        Route("/v1/advice", advice_route, methods=["POST"]),
+        Route("/v1/advice/stream", advice_stream, methods=["POST"]),
+        Route("/healthz", healthz),
+        Route("/metrics", metrics),
+    ]
+)
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Red Flag Detector como API HTTP (sin Streamlit).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=1, help="procesos (cada uno con su event loop)")
+    parser.add_argument("--dry-run", action="store_true", help="LLM falso: nada de red ni de cuota")
+    parser.add_argument("--fake-latency-ms", type=float, default=FAKE_LATENCY_MS, help="latencia del LLM falso")
+    args = parser.parse_args(argv)
+
+    # Los workers son procesos nuevos que importan api.py: la configuración les llega por entorno.
+    if args.dry_run:
+        os.environ["API_DRY_RUN"] = "1"
+        os.environ["API_FAKE_LATENCY_MS"] = str(args.fake_latency_ms)
+        # Caché desechable (compartida por los workers): los consejos falsos no acaban en la de verdad.
+        os.environ["API_DRY_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="rfd-api-"), "advice.sqlite3")
+    uvicorn.run(
+        "api:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
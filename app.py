@@ -1,12 +1,41 @@
-```python
 # app.py
+import functools
+
 import streamlit as st
-from google import genai
+
+import analytics
+from advice import ADVICE_BUDGET_S, advice_cache_key, another_opinion, cached_advice, prefetch_advice, record_served, submission_id
+from breaker import CircuitOpen
+from chat_html import chat_html, header_html
+from fallback_advice import local_advice
+from gemini_pool import key_hash
+from history import known_people, person_timeline, person_trend, record_submission
+from lexicon import NOTE_FIELDS, explain, highlight, scan
+import profiler
+from ratelimit import RateLimited
+from scoring import NOTES_LABEL, OPTIONS, compute_score
+from session_model import GREENS, LOCATIONS, SLIDER_OPTIONS, DateData, cap_chat, format_memory, memory_report, pack_breakdown, unpack_breakdown
+import telemetry
+from timeline import replay
+from whatsapp import parse_upload
+from whatif import FACTORS, WhatIf
 
 # =========================
 # Config + State
 # =========================
 st.set_page_config(page_title="Red Flag Detector", page_icon="🚩", layout="wide")
+telemetry.begin_rerun(st.session_state)
+
+
+def fragment(fn):
+    """st.fragment con telemetría: un rerun solo del fragmento no pasa por begin_rerun/end_rerun."""
+
+    @functools.wraps(fn)
+    def traced(*args, **kwargs):
+        with telemetry.fragment(st.session_state, fn.__name__):
+            return fn(*args, **kwargs)
+
+    return st.fragment(traced)
 
 
 def init_state():
@@ -15,11 +44,21 @@ def init_state():
     if "api_key" not in st.session_state:
         st.session_state.api_key = ""
     if "date_data" not in st.session_state:
-        st.session_state.date_data = {}
+        st.session_state.date_data = None
     if "score" not in st.session_state:
         st.session_state.score = None
     if "level" not in st.session_state:
         st.session_state.level = None
+    if "submission_id" not in st.session_state:
+        st.session_state.submission_id = None
+    if "advice" not in st.session_state:
+        st.session_state.advice = {}
+    if "advice_job" not in st.session_state:
+        st.session_state.advice_job = None
+    if "advice_source" not in st.session_state:
+        st.session_state.advice_source = {}
+    if "opinions" not in st.session_state:
+        st.session_state.opinions = {}
 
 
 def go(page: str):
@@ -27,13 +66,13 @@ def go(page: str):
     st.rerun()
 
 
-init_state()
+with telemetry.span("init_state"):
+    init_state()
 
 # =========================
 # CSS (inspirado en tu base)
 # =========================
-st.markdown(
-    """
+CSS = """
 <style>
 /* Fondo girlie */
 .stApp { background: linear-gradient(135deg, #FFF0F5 0%, #FFDEE9 100%); }
@@ -137,6 +176,10 @@ div[data-testid="stVerticalBlock"] > div:has(div.element-container) {
 .row-left{ text-align: left; }
 .row-right{ text-align: right; }
 
+/* Frases marcadas de las notas */
+mark.flag-red{ background: rgba(220, 20, 60, 0.18); border-radius: 4px; padding: 0 2px; }
+mark.flag-green{ background: rgba(60, 179, 113, 0.22); border-radius: 4px; padding: 0 2px; }
+
 .time{
     font-size: 11px;
     opacity: 0.65;
@@ -155,222 +198,138 @@ hr.soft {
     margin: 16px 0;
 }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
+with telemetry.span("css"):
+    st.markdown(CSS, unsafe_allow_html=True)
 
 # =========================
 # Helpers: chat rendering
 # =========================
-def render_chat(messages):
-    html = ["<div class='chat-wrap'>"]
-    for m in messages:
-        side = m.get("side", "left")
-        text = (m.get("text", "") or "").replace("\n", "<br>")
-        t = m.get("time", None)
-
-        row_class = "row-right" if side == "right" else "row-left"
-        bubble_class = "right" if side == "right" else "left"
-        time_html = f"<span class='time'>{t}</span>" if t else ""
-
-        html.append(
-            f"""
-<div class="chat-row {row_class}">
-  <div class="bubble {bubble_class}">
-    {text}{time_html}
-  </div>
-</div>
-"""
-        )
-    html.append("</div>")
-    st.markdown("\n".join(html), unsafe_allow_html=True)
+CHAT_WINDOW = 30
 
 
-def render_chat_header(name: str, status: str = "en línea", avatar_url: str | None = None):
-    if not avatar_url:
-        avatar_url = (
-            "data:image/svg+xml;utf8,"
-            "<svg xmlns='http://www.w3.org/2000/svg' width='84' height='84'>"
-            "<rect width='100%25' height='100%25' rx='42' ry='42' fill='%23FFD6E7'/>"
-            "<text x='50%25' y='58%25' font-size='44' text-anchor='middle'>💅</text>"
-            "</svg>"
-        )
+def render_chat(messages, window: int | None = None, key: str = "chat"):
+    with telemetry.span("render_chat"):
+        _render_chat(messages, window, key)
 
-    st.markdown(
-        f"""
-<div class="wa-header">
-  <img class="wa-avatar" src="{avatar_url}" />
-  <div class="wa-title">
-    <div class="wa-name">{name}</div>
-    <div class="wa-status">{status}</div>
-  </div>
-</div>
-""",
-        unsafe_allow_html=True,
-    )
+
+def _render_chat(messages, window: int | None, key: str):
+    # Con window solo pintamos las últimas N burbujas: el payload no crece con la conversación.
+    if window is not None:
+        shown = st.session_state.get(f"{key}_shown", window)
+        hidden = len(messages) - shown
+        if hidden > 0:
+            if st.button(f"⬆️ Ver {min(window, hidden)} mensajes anteriores", key=f"{key}_older"):
+                st.session_state[f"{key}_shown"] = shown + window
+                st.rerun()
+            messages = messages[-shown:]
+    st.markdown(chat_html(messages), unsafe_allow_html=True)
 
 
-def clamp(x, lo=0, hi=100):
-    return max(lo, min(hi, x))
+def render_chat_header(name: str, status: str = "en línea", avatar_url: str | None = None):
+    st.markdown(header_html(name, status, avatar_url), unsafe_allow_html=True)
 
 
 # =========================
-# Heurística de score
+# Consejo de Gemini (una vez por envío)
 # =========================
-def compute_score(data: dict) -> tuple[int, str, dict]:
-    points = 0
-    breakdown = {}
-
-    staff = data.get("trato_personal", "Sin responder")
-    staff_map = {"Maravilloso": 0, "Correcto": 5, "Seco": 15, "Maleducado": 25, "Sin responder": 10}
-    p = staff_map.get(staff, 10)
-    points += p
-    breakdown["Trato al personal"] = p
-
-    control = data.get("control_movil_redes", "Sin responder")
-    p = 20 if control == "Sí" else (8 if control == "Sin responder" else 0)
-    points += p
-    breakdown["Control (móvil/redes)"] = p
-
-    limites = data.get("respeto_limites", "Sin responder")
-    limites_map = {"Sí, 10/10": 0, "Más o menos": 10, "No, insistió": 25, "Sin responder": 8}
-    p = limites_map.get(limites, 8)
-    points += p
-    breakdown["Respeto de límites"] = p
-
-    exs = data.get("tema_exs", "Sin responder")
-    ex_map = {"Cero drama": 0, "Lo mencionó normal": 5, "Rant / victimismo": 10, "Comparó contigo": 15, "Sin responder": 6}
-    p = ex_map.get(exs, 6)
-    points += p
-    breakdown["Tema ex’s"] = p
-
-    celos = data.get("celos", "Sin responder")
-    cel_map = {"No": 0, "Un poco": 8, "Sí": 15, "Sin responder": 6}
-    p = cel_map.get(celos, 6)
-    points += p
-    breakdown["Celos"] = p
-
-    aislado = data.get("insistio_sitio_aislado", "Sin responder")
-    p = 25 if aislado == "Sí" else (10 if aislado == "Sin responder" else 0)
-    points += p
-    breakdown["Insistió en sitio aislado"] = p
-
-    presion = data.get("presiono_alcohol", "Sin responder")
-    p = 20 if presion == "Sí" else (8 if presion == "Sin responder" else 0)
-    points += p
-    breakdown["Presión con alcohol"] = p
-
-    bombing = data.get("love_bombing", "Sin responder")
-    p = 15 if bombing == "Sí" else (5 if bombing == "Sin responder" else 0)
-    points += p
-    breakdown["Love bombing"] = p
-
-    incoh = data.get("incoherencias", "Sin responder")
-    p = 15 if incoh == "Sí" else (6 if incoh == "Sin responder" else 0)
-    points += p
-    breakdown["Incoherencias"] = p
-
-    def to_int_0_10(v, default_mid=5):
-        if v is None:
-            return default_mid
-        if isinstance(v, int):
-            return clamp(v, 0, 10)
-        s = str(v).strip()
-        if s.lower().startswith("sin"):
-            return default_mid
-        try:
-            return clamp(int(s), 0, 10)
-        except Exception:
-            return default_mid
-
-    escucho = to_int_0_10(data.get("me_escucho_0_10", "Sin responder"), 5)
-    dejo_hablar = to_int_0_10(data.get("me_dejo_hablar_0_10", "Sin responder"), 5)
-    pregunto = to_int_0_10(data.get("me_hizo_preguntas_0_10", "Sin responder"), 5)
-
-    p_listen = int(round((10 - escucho) * 1.2))
-    p_speak = int(round((10 - dejo_hablar) * 1.2))
-    p_questions = int(round((10 - pregunto) * 1.0))
-
-    points += p_listen + p_speak + p_questions
-    breakdown["No escuchó / poca atención"] = p_listen
-    breakdown["Interrumpía / no te dejó hablar"] = p_speak
-    breakdown["Cero curiosidad por ti"] = p_questions
-
-    valores = to_int_0_10(data.get("compatibilidad_valores_0_10", "Sin responder"), 6)
-    p = int(round((10 - valores) * 0.9))
-    points += p
-    breakdown["Valores poco alineados"] = p
-
-    miradas_movil = data.get("miradas_movil", 0)
-    try:
-        miradas_movil = int(miradas_movil)
-    except Exception:
-        miradas_movil = 0
-    p = int(clamp(miradas_movil * 1.2, 0, 15))
-    points += p
-    breakdown["Móvil (demasiado presente)"] = p
-
-    greens = data.get("green_flags", [])
-    green_bonus = 0
-    if "Pidió consentimiento / fue respetuoso" in greens:
-        green_bonus += 10
-    if "Te hizo sentir segura (plan lógico, acompañar, etc.)" in greens:
-        green_bonus += 8
-    if "Comunicación clara y amable" in greens:
-        green_bonus += 7
-    points -= green_bonus
-    breakdown["Green flags (resta)"] = -green_bonus
-
-    score = clamp(points, 0, 100)
+def collect_date_data() -> dict:
+    return {
+        "location": st.session_state.get("sb_location", "Otro"),
+        "alcohol": bool(st.session_state.get("sb_alcohol", False)),
+        "me_dejo_hablar_0_10": st.session_state.get("me_dejo_hablar_0_10"),
+        "me_escucho_0_10": st.session_state.get("me_escucho_0_10"),
+        "me_hizo_preguntas_0_10": st.session_state.get("me_hizo_preguntas_0_10"),
+        "miradas_movil": st.session_state.get("miradas_movil", 0),
+        "trato_personal": st.session_state.get("trato_personal"),
+        "compatibilidad_valores_0_10": st.session_state.get("compatibilidad_valores_0_10"),
+        "control_movil_redes": st.session_state.get("control_movil_redes"),
+        "respeto_limites": st.session_state.get("respeto_limites"),
+        "tema_exs": st.session_state.get("tema_exs"),
+        "celos": st.session_state.get("celos"),
+        "insistio_sitio_aislado": st.session_state.get("insistio_sitio_aislado"),
+        "presiono_alcohol": st.session_state.get("presiono_alcohol"),
+        "love_bombing": st.session_state.get("love_bombing"),
+        "incoherencias": st.session_state.get("incoherencias"),
+        "green_flags": st.session_state.get("green_flags", []),
+        "nota_rara": st.session_state.get("nota_rara", ""),
+        "nota_buena": st.session_state.get("nota_buena", ""),
+        "person": " ".join(st.session_state.get("person_name", "").split()),
+    }
 
-    if score <= 20:
-        level = "🟢 Verde"
-    elif score <= 45:
-        level = "🟡 Amarillo"
-    elif score <= 70:
-        level = "🟠 Naranja"
-    else:
-        level = "🔴 Rojo"
-
-    return score, level, breakdown
-
-
-def build_gemini_prompt(data: dict, score: int, level: str) -> str:
-    location = data.get("location", "Sin responder")
-    alcohol = data.get("alcohol", False)
-    trato = data.get("trato_personal", "Sin responder")
-    exs = data.get("tema_exs", "Sin responder")
-    celos = data.get("celos", "Sin responder")
-    notas_red = (data.get("nota_rara", "") or "").strip()
-    notas_green = (data.get("nota_buena", "") or "").strip()
-
-    summary_lines = [
-        f"- Score: {score}/100 ({level})",
-        f"- Ubicación: {location}",
-        f"- ¿Alcohol?: {'Sí' if alcohol else 'No'}",
-        f"- Trato al personal: {trato}",
-        f"- Ex’s: {exs}",
-        f"- Celos: {celos}",
-    ]
-    if notas_red:
-        summary_lines.append(f"- Lo que chirrió: {notas_red[:180]}")
-    if notas_green:
-        summary_lines.append(f"- Lo bueno: {notas_green[:180]}")
-
-    summary = "\n".join(summary_lines)
-
-    return (
-        "Eres la mejor amiga de la chica que está contando su cita por WhatsApp. "
-        "Tono: divertido, directo, cariñoso y protector. Un toque sarcástico suave, cero insultos. "
-        "Nada de diagnósticos clínicos, nada de terapia, nada de patologizar.\n\n"
-        "Objetivo: dale un consejo realista y accionable según el score. "
-        "Si hay señales de seguridad o control, prioriza seguridad y límites. "
-        "Si pinta bien, hypea con cautela.\n\n"
-        "Formato: máximo 4 frases cortas, estilo chat. Usa 1-3 emojis máximo.\n\n"
-        "Contexto:\n"
-        f"{summary}\n\n"
-        "Termina con un consejo práctico para hacer ahora (durante o después de la cita)."
-    )
+
+def owner_id() -> str:
+    # Las personas de cada usuaria van con el hash de su API key: la key nunca se guarda.
+    return key_hash(st.session_state.api_key)
+
+
+def start_advice_prefetch(data: dict, defer: bool = False) -> str:
+    sid = submission_id(data)
+    if sid in st.session_state.advice:
+        return sid
+    job = st.session_state.advice_job
+    if job and job["id"] == sid:
+        return sid
+
+    score, level, breakdown = compute_score(data)
+    # Si ya hay citas con esta persona, Gemini sabe hacia dónde va la cosa.
+    trend = person_trend(owner_id(), data.get("person"))
+    context = trend.context(score, breakdown) if trend else None
+    key = advice_cache_key(data, score, level, context)
+    if job and job["key"] == key and job_usable(job["job"]):
+        # Mismo prompt (p. ej. la nota cambió más allá de lo que entra en el contexto): el job vale tal cual.
+        job["id"] = sid
+        st.session_state.advice_trend = (sid, context)
+        return sid
+    if defer and job and job["job"].future.running():
+        # La llamada en vuelo no se puede parar: en vez de una más por cada edición de la nota,
+        # la correcta la arranca la siguiente respuesta con ella ya terminada (o el veredicto).
+        return sid
+
+    # Cambió alguna respuesta: el consejo anterior ya no vale.
+    cancel_advice_prefetch()
+    job = prefetch_advice(st.session_state.api_key, data, score, level, context)
+    st.session_state.advice_job = {"id": sid, "key": key, "job": job}
+    # "Otra opinión" necesita la misma key de caché: el contexto de tendencia cambia al guardar esta cita.
+    st.session_state.advice_trend = (sid, context)
+    return sid
+
+
+def job_usable(job) -> bool:
+    # Ni cancelado ni fallado: en vuelo, en cola o con su consejo.
+    future = job.future
+    return not future.cancelled() and (not future.done() or future.exception() is None)
+
+
+def cancel_advice_prefetch():
+    job = st.session_state.advice_job
+    if job:
+        # Si ya está en vuelo no se puede parar, pero su resultado se descarta.
+        job["job"].cancel()
+    st.session_state.advice_job = None
+
+
+def late_advice(sid: str, data: dict, score: int, level: str) -> str | None:
+    """Tras un fallback por timeout, el consejo de Gemini si ya ha llegado (del job o de la caché compartida)."""
+    job = st.session_state.advice_job
+    if job and job["id"] == sid:
+        future = job["job"].future
+        if not future.done():
+            return None
+        st.session_state.advice_job = None
+        if not future.cancelled() and future.exception() is None:
+            return future.result()
+    trend_sid, trend = st.session_state.get("advice_trend", (None, None))
+    return cached_advice(data, score, level, trend if trend_sid == sid else None)
+
+
+def advice_job(sid: str):
+    job = st.session_state.advice_job
+    if not job or job["id"] != sid:
+        start_advice_prefetch(st.session_state.date_data.to_dict())
+        job = st.session_state.advice_job
+    return job["job"]
 
 
 # =========================
@@ -400,7 +359,7 @@ def page_landing():
         render_chat_header("Bestie 💖", status=st.session_state.chat_status, avatar_url=None)
 
         # Chat
-        render_chat(st.session_state.landing_chat)
+        render_chat(st.session_state.landing_chat, window=CHAT_WINDOW, key="landing_chat")
 
         st.markdown("<hr class='soft'/>", unsafe_allow_html=True)
         st.markdown("<div class='small-note'>Si no tienes key todavía: link oficial.</div>", unsafe_allow_html=True)
@@ -432,12 +391,166 @@ def page_landing():
             masked = "•" * min(16, max(8, len(st.session_state.api_key)))
             st.session_state.landing_chat.append({"side": "right", "text": f"Aquí va: {masked}", "time": "22:45"})
             st.session_state.landing_chat.append({"side": "left", "text": "Perfecto. Abriendo el cuestionario…", "time": "22:45"})
+            cap_chat(st.session_state.landing_chat)
 
-            st.session_state.api_key_draft = ""
+            # El widget ya está pintado (no se puede asignar); al cambiar de página Streamlit lo limpia.
+            st.session_state.pop("api_key_draft", None)
             st.session_state.chat_status = "en línea"
             go("cuestionario")
 
 
+QUESTION_DEFAULTS = {
+    "me_dejo_hablar_0_10": "Sin responder",
+    "me_escucho_0_10": "Sin responder",
+    "me_hizo_preguntas_0_10": "Sin responder",
+    "trato_personal": "Sin responder",
+    "compatibilidad_valores_0_10": "Sin responder",
+    "control_movil_redes": "Sin responder",
+    "respeto_limites": "Sin responder",
+    "tema_exs": "Sin responder",
+    "celos": "Sin responder",
+    "insistio_sitio_aislado": "Sin responder",
+    "presiono_alcohol": "Sin responder",
+    "love_bombing": "Sin responder",
+    "incoherencias": "Sin responder",
+}
+CORE_KEYS = list(QUESTION_DEFAULTS.keys())
+
+
+def answered(v):
+    if v is None:
+        return False
+    s = str(v).strip().lower()
+    return not s.startswith("sin responder")
+
+
+def answered_count() -> int:
+    return sum(1 for k in CORE_KEYS if answered(st.session_state.get(k)))
+
+
+# Cada bloque del cuestionario es un fragment: mover un slider solo re-ejecuta su bloque,
+# no el CSS, el sidebar ni el resto de columnas.
+def after_answer():
+    count = answered_count()
+    # Al 100% ya arrancamos el consejo en segundo plano; si luego cambia algo, se invalida.
+    if count == len(CORE_KEYS):
+        start_advice_prefetch(collect_date_data(), defer=True)
+    else:
+        cancel_advice_prefetch()
+    # La barra de progreso solo cambia cuando una pregunta entra o sale de "Sin responder":
+    # solo entonces pagamos un rerun completo.
+    if count != st.session_state.get("progress_shown"):
+        st.rerun()
+
+
+@fragment
+def questionnaire_progress():
+    count = st.session_state.progress_shown
+    st.progress(count / max(1, len(CORE_KEYS)))
+    st.caption(f"Progreso: {count}/{len(CORE_KEYS)}")
+
+
+@fragment
+def questionnaire_context():
+    st.markdown("## 📍 Contexto")
+    st.selectbox(
+        "¿Dónde fue la cita?",
+        LOCATIONS,
+        index=0,
+        key="sb_location",
+    )
+    st.toggle("¿Hubo vinito / alcohol? 🍷", key="sb_alcohol")
+    st.text_input(
+        "¿Con quién? (opcional)",
+        key="person_name",
+        placeholder="p. ej. Dani",
+        help="Si me dices su nombre, junto esta cita con las anteriores y te enseño cómo evoluciona.",
+    )
+    people = known_people(owner_id())
+    if people:
+        st.caption("Ya me has contado de: " + " · ".join(f"{name} ({n})" for name, n in people[:6]))
+    after_answer()
+
+
+@fragment
+def questionnaire_comunicacion():
+    with st.container():
+        st.markdown("### 🗣️ Comunicación")
+        st.select_slider("¿Te dejó hablar? (0–10)", options=SLIDER_OPTIONS, key="me_dejo_hablar_0_10")
+        st.select_slider("¿Te escuchó de verdad? (0–10)", options=SLIDER_OPTIONS, key="me_escucho_0_10")
+        st.select_slider("¿Te hizo preguntas sobre ti? (0–10)", options=SLIDER_OPTIONS, key="me_hizo_preguntas_0_10")
+        st.number_input("Veces que miró el móvil", 0, 50, 0, key="miradas_movil")
+    after_answer()
+
+
+@fragment
+def questionnaire_respeto():
+    with st.container():
+        st.markdown("### 🤝 Respeto & valores")
+        st.selectbox("Trato al personal", OPTIONS["trato_personal"], key="trato_personal")
+        st.select_slider("Compatibilidad de valores (0–10)", options=SLIDER_OPTIONS, key="compatibilidad_valores_0_10")
+        st.selectbox("Cuando marcaste un límite…", OPTIONS["respeto_limites"], key="respeto_limites")
+        st.selectbox("Tema ex’s…", OPTIONS["tema_exs"], key="tema_exs")
+    after_answer()
+
+
+@fragment
+def questionnaire_seguridad():
+    with st.container():
+        st.markdown("### 🚨 Control, celos y seguridad")
+        st.selectbox("¿Control móvil/redes?", OPTIONS["control_movil_redes"], key="control_movil_redes")
+        st.selectbox("¿Celos raritos?", OPTIONS["celos"], key="celos")
+        st.selectbox("¿Insistió en sitio aislado?", OPTIONS["insistio_sitio_aislado"], key="insistio_sitio_aislado")
+        st.selectbox("¿Te presionó con alcohol?", OPTIONS["presiono_alcohol"], key="presiono_alcohol")
+        st.selectbox("¿Love bombing?", OPTIONS["love_bombing"], key="love_bombing")
+        st.selectbox("¿Incoherencias?", OPTIONS["incoherencias"], key="incoherencias")
+    after_answer()
+
+
+@fragment
+def questionnaire_green_flags():
+    with st.container():
+        st.markdown("### ✅ Green flags")
+        st.multiselect(
+            "Marca si pasó:",
+            GREENS,
+            key="green_flags",
+        )
+        st.text_area("Algo que te chirrió", key="nota_rara", height=90)
+        st.text_area("Algo que te gustó", key="nota_buena", height=90)
+    after_answer()
+
+
+def questionnaire_import():
+    with st.expander("📲 ¿Tienes el chat con él? Súbelo y relleno lo que pueda"):
+        upload = st.file_uploader("Exporta el chat desde WhatsApp (sin archivos) y súbelo aquí", type=["txt"], key="wa_upload")
+        if upload is None:
+            return
+
+        # Se parsea una vez por fichero; en la sesión solo quedan los contadores.
+        cached = st.session_state.get("wa_stats")
+        if cached is None or cached[0] != upload.file_id:
+            with st.spinner("Leyendo el chat…"), telemetry.span("whatsapp_parse"):
+                stats = parse_upload(upload)
+            telemetry.count("whatsapp_bytes_total", stats.size)
+            cached = st.session_state.wa_stats = (upload.file_id, stats)
+        stats = cached[1]
+        st.caption(f"{stats.messages:,} mensajes · {stats.size / 1e6:.1f} MB leídos en {stats.seconds:.2f} s ({stats.mb_s:.1f} MB/s)")
+
+        people = stats.people()
+        if len(people) < 2:
+            st.warning("No encuentro a dos personas hablando. ¿Seguro que es un chat exportado de WhatsApp?")
+            return
+        me = st.selectbox("¿Quién eres tú?", people, key="wa_me")
+        st.markdown("\n".join(f"- {line}" for line in stats.summary(me)))
+
+        signals = stats.signals(me)
+        if signals and st.button("✨ Rellenar el cuestionario con esto"):
+            for k, v in signals.items():
+                st.session_state[k] = v
+            st.rerun()
+
+
 def page_cuestionario():
     st.markdown("<h1 class='main-title'>📝 Cuestionario: el chismómetro con método</h1>", unsafe_allow_html=True)
 
@@ -447,41 +560,7 @@ def page_cuestionario():
             go("landing")
         return
 
-    with st.sidebar:
-        st.markdown("## 📍 Contexto")
-        st.selectbox(
-            "¿Dónde fue la cita?",
-            ["Restaurante chic", "Cafetería mona", "Paseo por el parque", "Cine", "Su casa (🚩)", "Otro"],
-            index=0,
-            key="sb_location",
-        )
-        st.toggle("¿Hubo vinito / alcohol? 🍷", key="sb_alcohol")
-        st.divider()
-        if st.button("⬅️ Volver a Landing"):
-            go("landing")
-
-    def answered(v):
-        if v is None:
-            return False
-        s = str(v).strip().lower()
-        return not s.startswith("sin responder")
-
-    defaults = {
-        "me_dejo_hablar_0_10": "Sin responder",
-        "me_escucho_0_10": "Sin responder",
-        "me_hizo_preguntas_0_10": "Sin responder",
-        "trato_personal": "Sin responder",
-        "compatibilidad_valores_0_10": "Sin responder",
-        "control_movil_redes": "Sin responder",
-        "respeto_limites": "Sin responder",
-        "tema_exs": "Sin responder",
-        "celos": "Sin responder",
-        "insistio_sitio_aislado": "Sin responder",
-        "presiono_alcohol": "Sin responder",
-        "love_bombing": "Sin responder",
-        "incoherencias": "Sin responder",
-    }
-    for k, v in defaults.items():
+    for k, v in QUESTION_DEFAULTS.items():
         if k not in st.session_state:
             st.session_state[k] = v
     if "miradas_movil" not in st.session_state:
@@ -493,89 +572,54 @@ def page_cuestionario():
     if "nota_buena" not in st.session_state:
         st.session_state.nota_buena = ""
 
-    core_keys = list(defaults.keys())
-    answered_count = sum(1 for k in core_keys if answered(st.session_state.get(k)))
-    st.progress(answered_count / max(1, len(core_keys)))
-    st.caption(f"Progreso: {answered_count}/{len(core_keys)}")
+    # Antes que los widgets: si rellena desde el chat, sus claves aún se pueden escribir.
+    questionnaire_import()
 
-    c1, c2, c3 = st.columns([1, 1, 1])
+    # En un rerun completo todo se pinta con este valor; los fragments lo comparan con el suyo.
+    st.session_state.progress_shown = answered_count()
 
-    with c1:
-        with st.container():
-            st.markdown("### 🗣️ Comunicación")
-            st.select_slider("¿Te dejó hablar? (0–10)", options=["Sin responder"] + [str(i) for i in range(11)], key="me_dejo_hablar_0_10")
-            st.select_slider("¿Te escuchó de verdad? (0–10)", options=["Sin responder"] + [str(i) for i in range(11)], key="me_escucho_0_10")
-            st.select_slider("¿Te hizo preguntas sobre ti? (0–10)", options=["Sin responder"] + [str(i) for i in range(11)], key="me_hizo_preguntas_0_10")
-            st.number_input("Veces que miró el móvil", 0, 50, 0, key="miradas_movil")
+    with st.sidebar:
+        questionnaire_context()
+        st.divider()
+        if st.button("⬅️ Volver a Landing"):
+            go("landing")
 
-    with c2:
-        with st.container():
-            st.markdown("### 🤝 Respeto & valores")
-            st.selectbox("Trato al personal", ["Sin responder", "Maravilloso", "Correcto", "Seco", "Maleducado"], key="trato_personal")
-            st.select_slider("Compatibilidad de valores (0–10)", options=["Sin responder"] + [str(i) for i in range(11)], key="compatibilidad_valores_0_10")
-            st.selectbox("Cuando marcaste un límite…", ["Sin responder", "Sí, 10/10", "Más o menos", "No, insistió"], key="respeto_limites")
-            st.selectbox("Tema ex’s…", ["Sin responder", "Cero drama", "Lo mencionó normal", "Rant / victimismo", "Comparó contigo"], key="tema_exs")
+    questionnaire_progress()
 
+    c1, c2, c3 = st.columns([1, 1, 1])
+    with c1:
+        questionnaire_comunicacion()
+    with c2:
+        questionnaire_respeto()
     with c3:
-        with st.container():
-            st.markdown("### 🚨 Control, celos y seguridad")
-            st.selectbox("¿Control móvil/redes?", ["Sin responder", "No", "Sí"], key="control_movil_redes")
-            st.selectbox("¿Celos raritos?", ["Sin responder", "No", "Un poco", "Sí"], key="celos")
-            st.selectbox("¿Insistió en sitio aislado?", ["Sin responder", "No", "Sí"], key="insistio_sitio_aislado")
-            st.selectbox("¿Te presionó con alcohol?", ["Sin responder", "No", "Sí"], key="presiono_alcohol")
-            st.selectbox("¿Love bombing?", ["Sin responder", "No", "Sí"], key="love_bombing")
-            st.selectbox("¿Incoherencias?", ["Sin responder", "No", "Sí"], key="incoherencias")
+        questionnaire_seguridad()
 
     st.markdown("<hr class='soft'/>", unsafe_allow_html=True)
-    with st.container():
-        st.markdown("### ✅ Green flags")
-        st.multiselect(
-            "Marca si pasó:",
-            ["Pidió consentimiento / fue respetuoso", "Te hizo sentir segura (plan lógico, acompañar, etc.)", "Comunicación clara y amable"],
-            key="green_flags",
-        )
-        st.text_area("Algo que te chirrió", key="nota_rara", height=90)
-        st.text_area("Algo que te gustó", key="nota_buena", height=90)
+    questionnaire_green_flags()
 
     if st.button("🏁 Veredicto final"):
-        missing = [k for k in core_keys if not answered(st.session_state.get(k))]
+        missing = [k for k in CORE_KEYS if not answered(st.session_state.get(k))]
         if missing:
             st.error("Te faltan respuestas (las que están en ‘Sin responder’).")
             return
 
-        st.session_state.date_data = {
-            "location": st.session_state.get("sb_location", "Otro"),
-            "alcohol": bool(st.session_state.get("sb_alcohol", False)),
-            "me_dejo_hablar_0_10": st.session_state.get("me_dejo_hablar_0_10"),
-            "me_escucho_0_10": st.session_state.get("me_escucho_0_10"),
-            "me_hizo_preguntas_0_10": st.session_state.get("me_hizo_preguntas_0_10"),
-            "miradas_movil": st.session_state.get("miradas_movil", 0),
-            "trato_personal": st.session_state.get("trato_personal"),
-            "compatibilidad_valores_0_10": st.session_state.get("compatibilidad_valores_0_10"),
-            "control_movil_redes": st.session_state.get("control_movil_redes"),
-            "respeto_limites": st.session_state.get("respeto_limites"),
-            "tema_exs": st.session_state.get("tema_exs"),
-            "celos": st.session_state.get("celos"),
-            "insistio_sitio_aislado": st.session_state.get("insistio_sitio_aislado"),
-            "presiono_alcohol": st.session_state.get("presiono_alcohol"),
-            "love_bombing": st.session_state.get("love_bombing"),
-            "incoherencias": st.session_state.get("incoherencias"),
-            "green_flags": st.session_state.get("green_flags", []),
-            "nota_rara": st.session_state.get("nota_rara", ""),
-            "nota_buena": st.session_state.get("nota_buena", ""),
-        }
-
-        score, level, breakdown = compute_score(st.session_state.date_data)
+        data = collect_date_data()
+
+        with telemetry.span("compute_score"):
+            score, level, breakdown = compute_score(data)
+        # En la sesión se queda la versión compacta; to_dict() la devuelve tal cual.
+        st.session_state.date_data = DateData.from_dict(data)
         st.session_state.score = score
         st.session_state.level = level
-        st.session_state.breakdown = breakdown
+        st.session_state.breakdown = pack_breakdown(breakdown)
+        st.session_state.submission_id = start_advice_prefetch(data)
         go("veredicto")
 
 
 def page_veredicto():
     st.markdown("<h1 class='main-title'>🔮 Veredicto (con cariño y estadísticas)</h1>", unsafe_allow_html=True)
 
-    if not st.session_state.date_data:
+    if st.session_state.date_data is None:
         st.error("No tengo tus respuestas.")
         if st.button("⬅️ Ir al cuestionario"):
             go("cuestionario")
@@ -583,6 +627,8 @@ def page_veredicto():
 
     score = st.session_state.score
     level = st.session_state.level
+    data = st.session_state.date_data.to_dict()
+    breakdown = unpack_breakdown(st.session_state.get("breakdown", {}))
 
     intro = [
         {"side": "left", "text": "Vengo con el veredicto. Respira.", "time": None},
@@ -599,46 +645,249 @@ def page_veredicto():
         vibe = "Alarma. Si te sentiste insegura, confía y sal de ahí. 🚨"
 
     intro.append({"side": "left", "text": vibe, "time": None})
+
+    # Frases de las notas que han contado, marcadas dentro de lo que escribió.
+    found = explain(data)
+    if found:
+        quotes = [f"«{highlight(data[f])}»" for f in NOTE_FIELDS if isinstance(data.get(f), str) and scan(data[f])]
+        intro.append({"side": "left", "text": "De tus notas me quedo con esto:\n" + "\n".join(quotes), "time": None})
     render_chat(intro)
+    if found:
+        phrases = " · ".join(f"“{phrase}” ({weight:+d})" for phrase, weight in found)
+        st.caption(f"Frases de tus notas: {phrases} → {breakdown.get(NOTES_LABEL, 0):+d} en el score")
 
     st.markdown("<hr class='soft'/>", unsafe_allow_html=True)
     st.markdown("### 💬 Mensaje de tu bestie (Gemini)")
 
-    prompt_ia = build_gemini_prompt(st.session_state.date_data, score, level)
+    sid = st.session_state.submission_id
+    ask = {"side": "right", "text": "Vale. Dímelo claro.", "time": None}
+    header_slot = st.empty()
+    chat_slot = st.empty()
+
+    advice_text = st.session_state.advice.get(sid)
+    note = None
+    if advice_text is not None and st.session_state.advice_source.get(sid, (None,))[0] == "fallback_timeout":
+        # El de reserva solo hasta que llegue el de Gemini, que siguió en segundo plano.
+        late = late_advice(sid, data, score, level)
+        if late is not None:
+            advice_text = st.session_state.advice[sid] = late
+            st.session_state.advice_source[sid] = ("gemini_late", None)
+            record_served("gemini_late")
+    if advice_text is not None:
+        record_served("session")
+    else:
+        job = advice_job(sid)
+        with header_slot.container():
+            render_chat_header("Bestie 💖", status="✨ consultando al oráculo…")
+        with chat_slot.container():
+            render_chat([ask])
 
-    try:
-        client = genai.Client(api_key=st.session_state.api_key)
-        with st.spinner("✨ Consultando al oráculo..."):
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt_ia,
-                config={"temperature": 1.3},
-            )
+        try:
+            partial = ""
+            for chunk in job.stream(first_chunk_timeout=ADVICE_BUDGET_S):
+                if not partial:
+                    with header_slot.container():
+                        render_chat_header("Bestie 💖", status="escribiendo…")
+                partial += chunk
+                with chat_slot.container():
+                    render_chat([ask, {"side": "left", "text": partial + " ▍", "time": None}])
+            advice_text = job.result()
+            source = job.source or "gemini"
+        except TimeoutError:
+            # Gemini sigue en segundo plano y dejará su consejo en la caché compartida.
+            source = "fallback_timeout"
+            note = "🐢 Gemini va lento hoy, así que te lo digo yo directamente."
+        except CircuitOpen:
+            source = "fallback_breaker"
+            note = "😴 Gemini está KO ahora mismo, así que te lo digo yo directamente."
+        except RateLimited as e:
+            source = "fallback_ratelimit"
+            wait = f"{int(e.retry_after) + 1} s" if e.retry_after else "un minuto"
+            note = f"💖 El oráculo está saturado (vuelve a tener hueco en ~{wait}). Mientras, te lo digo yo."
+        except Exception as e:
+            source = "fallback_error"
+            note = f"🚨 Ups, algo falló con Gemini ({type(e).__name__}). Mientras, te lo digo yo."
+
+        if source.startswith("fallback"):
+            # Tras un timeout el job sigue vivo: late_advice recoge su resultado en el siguiente rerun.
+            if source != "fallback_timeout":
+                st.session_state.advice_job = None
+            advice_text = local_advice(score, level, breakdown)
+        st.session_state.advice[sid] = advice_text
+        st.session_state.advice_source[sid] = (source, note)
+        record_served(source)
+        record_submission(sid, data, score, level, breakdown, advice_text, source, owner_id())
+
+    with header_slot.container():
+        render_chat_header("Bestie 💖", status="en línea")
+    with chat_slot.container():
+        render_chat([ask, {"side": "left", "text": advice_text, "time": None}])
+    _, note = st.session_state.advice_source.get(sid, (None, note))
+    if note:
+        st.caption(note)
+    verdict_reroll(sid, data, score, level)
+
+    if data.get("person"):
+        st.markdown("<hr class='soft'/>", unsafe_allow_html=True)
+        verdict_timeline(data, score, level, breakdown, sid)
+
+    st.markdown("<hr class='soft'/>", unsafe_allow_html=True)
+    verdict_whatif()
 
+
+@fragment
+def verdict_reroll(sid: str, data: dict, score: int, level: str):
+    # Sale de la reserva que llenó la misma llamada del consejo: no hay que esperar a Gemini.
+    seen, text = st.session_state.opinions.get(sid, (0, None))
+    if st.button("🔄 Pídele otra opinión", key="reroll"):
+        trend_sid, trend = st.session_state.get("advice_trend", (None, None))
+        try:
+            with st.spinner("Se lo vuelvo a preguntar…"):
+                text, _ = another_opinion(
+                    st.session_state.api_key, data, score, level, seen, trend if trend_sid == sid else None
+                )
+            seen += 1
+            st.session_state.opinions[sid] = (seen, text)
+        except Exception:
+            st.caption("😅 Ahora mismo no me sale otra opinión. Prueba en un ratito.")
+    if text is not None:
         render_chat(
-            [
-                {"side": "right", "text": "Vale. Dímelo claro.", "time": None},
-                {"side": "left", "text": (response.text or "").strip(), "time": None},
-            ]
+            [{"side": "right", "text": "¿Y otra opinión? 🙏", "time": None}, {"side": "left", "text": text, "time": None}],
+            key="reroll_chat",
         )
 
-    except Exception as e:
-        if "429" in str(e):
-            st.error("💖 El oráculo está saturado. Espera un minuto y reintenta.")
-        else:
-            st.error(f"🚨 Ups, algo falló con Gemini: {e}")
+
+def verdict_timeline(data: dict, score: int, level: str, breakdown: dict, sid: str):
+    name = data["person"]
+    rows = person_timeline(owner_id(), name)
+    # El envío de ahora puede seguir en la cola del writer: lo añadimos a mano.
+    if not any(row["submission_id"] == sid for row in rows):
+        rows.append({"submission_id": sid, "created_at": None, "score": score, "level": level, "breakdown": breakdown})
+    st.markdown(f"### 📈 Tu historial con {name}")
+    if len(rows) < 2:
+        st.caption("Es la primera cita que me cuentas con esta persona. La próxima vez ya te enseño cómo va.")
+        return
+
+    points = replay(rows)
+    _, ewma, worse = points[-1]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Citas", len(rows))
+    m2.metric("Score de hoy", score, delta=score - rows[-2]["score"], delta_color="inverse")
+    m3.metric("Media reciente", f"{ewma:.0f}")
+    st.line_chart(
+        {
+            "Cita": list(range(1, len(rows) + 1)),
+            "Score": [row["score"] for row in rows],
+            "Media": [round(avg, 1) for _, avg, _ in points],
+        },
+        x="Cita",
+        y=["Score", "Media"],
+        color=["#DC143C", "#FF69B4"],
+    )
+    if worse:
+        st.markdown("**Va a peor:** " + " · ".join(f"{f} ({rows[-2]['breakdown'].get(f, 0):+d} → {breakdown.get(f, 0):+d})" for f in worse))
+
+    with st.expander("Factor a factor"):
+        labels = [f for f in breakdown if any(row["breakdown"].get(f, 0) for row in rows)]
+        table = ["| Factor | " + " | ".join(str(i) for i in range(1, len(rows) + 1)) + " |", "|---|" + "---|" * len(rows)]
+        for f in labels:
+            table.append(f"| {f} | " + " | ".join(f"{row['breakdown'].get(f, 0):+d}" for row in rows) + " |")
+        st.markdown("\n".join(table))
+
+
+@fragment
+def verdict_whatif():
+    # Todo sale de las tablas de whatif.py (sumas y restas): cambiar de pregunta no recalcula el score.
+    w = WhatIf(st.session_state.date_data.to_dict(), unpack_breakdown(st.session_state.get("breakdown", {})))
+    st.markdown("### 🔮 ¿Y si…?")
+
+    for direction, verb in ((-1, "bajar"), (1, "subir")):
+        result = w.minimal_changes(direction)
+        if result is None:
+            continue
+        target, changes = result
+        steps = " + ".join(f"**{c.factor.label}**: {c.before} → {c.after}" for c in changes)
+        st.markdown(f"Para {verb} a {target} bastaría con: {steps}")
+
+    labels = [f.label for f in FACTORS]
+    i = st.selectbox("¿Y si hubieras contestado otra cosa en…?", range(len(FACTORS)), format_func=labels.__getitem__, key="whatif_factor")
+    rows = ["| Respuesta | Score | Nivel |", "|---|---|---|"]
+    for option, score, level, current in w.alternatives(i):
+        rows.append(f"| {option}{' ← ahora' if current else ''} | {score} | {level} |")
+    st.markdown("\n".join(rows))
+
+    with st.expander("Todas las preguntas de un vistazo"):
+        lines = []
+        for j, f in enumerate(FACTORS):
+            scores = [score for _, score, _, _ in w.alternatives(j)]
+            lines.append(f"- **{f.label}** ({w.answer(j)}): entre {min(scores)} y {max(scores)}")
+        st.markdown("\n".join(lines))
+
+
+# =========================
+# PAGE: ANALYTICS (operadoras)
+# =========================
+def page_analytics():
+    st.markdown("<h1 class='main-title'>📊 Analytics (solo operadoras)</h1>", unsafe_allow_html=True)
+
+    version = analytics.store_version()
+    summary = analytics.frames(version)["summary"]
+    if not summary["total"]:
+        st.info("Todavía no hay veredictos guardados.")
+        return
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Veredictos", f"{summary['total']:,}".replace(",", "."))
+    m2.metric("Score medio", f"{summary['avg_score']:.1f}")
+    m3.metric("Naranja o rojo", f"{summary['risky_share']:.0%}")
+
+    charts = analytics.charts(version)
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("#### Distribución del score por nivel")
+        st.altair_chart(charts["histogram"], width="stretch")
+    with c2:
+        st.markdown("#### Lo que más suma")
+        st.altair_chart(charts["contrib"], width="stretch")
+
+    c3, c4 = st.columns(2)
+    with c3:
+        st.markdown("#### Sitio × alcohol")
+        st.altair_chart(charts["cross"], width="stretch")
+    with c4:
+        st.markdown("#### Evolución")
+        st.altair_chart(charts["volume"], width="stretch")
+        st.altair_chart(charts["avg"], width="stretch")
 
 
 # =========================
 # Router
 # =========================
-if st.session_state.page == "landing":
-    page_landing()
-elif st.session_state.page == "cuestionario":
-    page_cuestionario()
-elif st.session_state.page == "veredicto":
-    page_veredicto()
-else:
+PAGES = {
+    "landing": page_landing,
+    "cuestionario": page_cuestionario,
+    "veredicto": page_veredicto,
+    "analytics": page_analytics,
+}
+
+if analytics.allowed(st.query_params):
+    st.session_state.page = "analytics"
+elif st.session_state.page == "analytics":
     st.session_state.page = "landing"
-    st.rerun()
-```
+
+page = st.session_state.page
+try:
+    if page in PAGES:
+        with telemetry.span(f"page_{page}"), profiler.capture(page, st.session_state, st.query_params):
+            PAGES[page]()
+    else:
+        st.session_state.page = "landing"
+        st.rerun()
+finally:
+    telemetry.end_rerun(page)
+
+if telemetry.DEBUG_PANEL:
+    with st.sidebar.expander("⏱️ Debug: spans de esta sesión"):
+        st.code(telemetry.format_spans(st.session_state.get("telemetry")), language=None)
+    with st.sidebar.expander("🧠 Debug: memoria de esta sesión"):
+        st.code(format_memory(memory_report(st.session_state)), language=None)
@@ -0,0 +1,250 @@
+# batch.py
+"""Puntúa (y si quieres, aconseja) un JSONL/CSV de citas sin pasar por Streamlit.
+
+    python batch.py citas.jsonl -o resultados.jsonl --workers 4
+    python batch.py citas.csv -o resultados.jsonl --advice --dry-run
+    python batch.py citas.jsonl -o resultados.jsonl --resume
+
+Cada línea del JSONL es un date_data como el que arma page_cuestionario. En CSV, cada columna
+es un campo de date_data; green_flags va como lista JSON o separada por "|".
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from scoring import compute_score
+
+CHUNK_SIZE = 1000
+# En batch nadie está esperando la respuesta: se puede esperar mucho más a la cuota que en la app (GEMINI_DEADLINE_S).
+BATCH_DEADLINE_S = float(os.environ.get("BATCH_GEMINI_DEADLINE_S", "120"))
+TRUE_VALUES = {"1", "true", "sí", "si", "yes", "y"}
+
+
+# =========================
+# Entrada
+# =========================
+def _from_csv(row: dict) -> dict:
+    data = {k: v for k, v in row.items() if k and v not in ("", None)}
+    if "alcohol" in data:
+        data["alcohol"] = data["alcohol"].strip().lower() in TRUE_VALUES
+    greens = data.get("green_flags")
+    if greens is not None:
+        if greens.lstrip().startswith("["):
+            data["green_flags"] = json.loads(greens)
+        else:
+            data["green_flags"] = [g.strip() for g in greens.split("|") if g.strip()]
+    return data
+
+
+def read_records(path: str):
+    # Generadores de principio a fin: la memoria no crece con el tamaño del fichero.
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield _from_csv(row)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def score_chunk(records: list) -> list:
+    return [compute_score(r) for r in records]
+
+
+# =========================
+# Consejos (opcional)
+# =========================
+def make_advisor(args):
+    import advice
+    from advice_cache import AdviceCache
+    from fallback_advice import local_advice
+
+    if args.dry_run:
+        # Caché desechable: los consejos falsos no deben acabar en la caché compartida.
+        cache = AdviceCache(path=os.path.join(tempfile.mkdtemp(prefix="rfd-dry-"), "advice.sqlite3"))
+        api_key = "dry-run"
+
+        def advise(data, score, level, breakdown):
+            def fake(_key, _prompt, _on_chunk=None):
+                time.sleep(args.fake_latency_ms / 1000)
+                return "[dry-run] " + local_advice(score, level, breakdown)
+
+            return advice.get_advice(api_key, data, score, level, cache=cache, generate=fake)
+
+        return advise
+
+    api_key = args.api_key or os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        sys.exit("Falta la API key: usa --api-key o GEMINI_API_KEY (o --dry-run).")
+    # Breaker propio: un lote grande no debe dejar sin Gemini a la app del mismo proceso, ni al revés.
+    breaker = advice.new_breaker()
+
+    def advise(data, score, level, breakdown):
+        return advice.get_advice(api_key, data, score, level, breaker=breaker, deadline_s=args.deadline_s)
+
+    return advise
+
+
+async def _advise_chunk(records, scored, advise, pool: ThreadPoolExecutor, concurrency: int):
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(data, result):
+        async with sem:
+            return await loop.run_in_executor(pool, advise, data, *result)
+
+    return await asyncio.gather(*(one(d, r) for d, r in zip(records, scored)), return_exceptions=True)
+
+
+def is_transient(e: BaseException) -> bool:
+    # Lo que puede salir bien más tarde: sin cuota, breaker abierto, timeouts y 429/5xx.
+    from breaker import CircuitOpen
+    from ratelimit import RateLimited, is_retryable
+
+    return isinstance(e, (RateLimited, CircuitOpen, TimeoutError)) or (isinstance(e, Exception) and is_retryable(e))
+
+
+# =========================
+# Checkpoint
+# =========================
+def load_checkpoint(path: str, input_path: str) -> tuple[int, int]:
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path, encoding="utf-8") as f:
+        ckpt = json.load(f)
+    if ckpt.get("input") != os.path.abspath(input_path):
+        sys.exit(f"El checkpoint {path} es de otro fichero de entrada ({ckpt.get('input')}).")
+    return ckpt["records_done"], ckpt["output_bytes"]
+
+
+def save_checkpoint(path: str, input_path: str, records_done: int, output_bytes: int):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "records_done": records_done, "output_bytes": output_bytes}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# =========================
+# Pipeline
+# =========================
+def run(args) -> dict:
+    ckpt_path = args.output + ".ckpt"
+    done, out_bytes = load_checkpoint(ckpt_path, args.input) if args.resume else (0, 0)
+    resumed_from = done
+
+    advise = make_advisor(args) if args.advice else None
+    advice_pool = ThreadPoolExecutor(max_workers=args.concurrency) if advise else None
+    sources = Counter()
+    # (fila, bytes) de la primera fila con un error pasajero: el checkpoint no pasa de ahí, así
+    # --resume la vuelve a intentar (lo que ya salió bien después lo sirve la caché).
+    retry_from = None
+
+    out = open(args.output, "r+b" if args.resume and os.path.exists(args.output) else "wb")
+    # Lo escrito después del último checkpoint puede estar a medias: se descarta y se rehace.
+    out.truncate(out_bytes)
+    out.seek(out_bytes)
+
+    records = read_records(args.input)
+    for _ in islice(records, done):
+        pass
+    chunks = iter(lambda: list(islice(records, args.chunk_size)), [])
+
+    def flush(chunk, future):
+        nonlocal done, retry_from
+        scored = future.result()
+        advices = None
+        if advise:
+            advices = asyncio.run(_advise_chunk(chunk, scored, advise, advice_pool, args.concurrency))
+
+        lines, offset = [], out.tell()
+        for i, (data, (score, level, breakdown)) in enumerate(zip(chunk, scored)):
+            row = {"n": done + i, "id": data.get("id"), "score": score, "level": level, "breakdown": breakdown}
+            if advices is not None:
+                res = advices[i]
+                if isinstance(res, BaseException):
+                    row["advice"], row["advice_source"] = None, f"error:{type(res).__name__}"
+                    if retry_from is None and is_transient(res):
+                        retry_from = (done + i, offset)
+                else:
+                    row["advice"], row["advice_source"] = res
+                sources[row["advice_source"]] += 1
+            lines.append(json.dumps(row, ensure_ascii=False))
+            offset += len(lines[-1].encode("utf-8")) + 1
+
+        out.write(("\n".join(lines) + "\n").encode("utf-8"))
+        out.flush()
+        os.fsync(out.fileno())
+        done += len(chunk)
+        if retry_from is None:
+            save_checkpoint(ckpt_path, args.input, done, out.tell())
+        else:
+            save_checkpoint(ckpt_path, args.input, *retry_from)
+
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Como mucho 2 lotes por worker en vuelo: memoria constante aunque la entrada sea enorme.
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(score_chunk, chunk)))
+                if len(pending) >= 2 * args.workers:
+                    flush(*pending.popleft())
+            while pending:
+                flush(*pending.popleft())
+    finally:
+        out.close()
+        if advice_pool:
+            advice_pool.shutdown()
+    elapsed = time.perf_counter() - t0
+
+    processed = done - resumed_from
+    report = {
+        "records": processed,
+        "resumed_from": resumed_from,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
+    if advise:
+        report["llm_calls"] = sources.get("gemini", 0)
+        report["llm_calls_saved_by_cache"] = sources.get("cache", 0)
+        report["advice_errors"] = sum(v for k, v in sources.items() if k.startswith("error:"))
+        if retry_from is not None:
+            # Con --resume se retoma desde aquí.
+            report["advice_retry_from"] = retry_from[0]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Red Flag Detector en modo batch (sin Streamlit).")
+    parser.add_argument("input", help="JSONL o CSV con un date_data por fila")
+    parser.add_argument("-o", "--output", required=True, help="JSONL de resultados (se escribe sobre la marcha)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos para puntuar")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--resume", action="store_true", help="sigue desde el último checkpoint")
+    parser.add_argument("--advice", action="store_true", help="genera también el consejo de la bestie")
+    parser.add_argument("--concurrency", type=int, default=4, help="llamadas de consejo en paralelo")
+    parser.add_argument("--api-key", help="API key de Gemini (por defecto GEMINI_API_KEY)")
+    parser.add_argument("--deadline-s", type=float, default=BATCH_DEADLINE_S, help="lo máximo que espera cada consejo a la cuota")
+    parser.add_argument("--dry-run", action="store_true", help="LLM falso: nada de red ni de cuota")
+    parser.add_argument("--fake-latency-ms", type=float, default=300, help="latencia del LLM falso")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# benchmarks/api_load.py
+"""Carga contra api.py con el LLM falso: peticiones/s y latencia de cola por ruta.
+
+    python benchmarks/api_load.py                                   # 2 workers, 2000 peticiones
+    python benchmarks/api_load.py --workers 4 --requests 5000 --concurrency 200 --json api.json
+
+Arranca `api.py --dry-run` en un puerto libre y le lanza una mezcla de /v1/score,
+/v1/score/batch, /v1/advice y /v1/advice/stream (--mix) con httpx asíncrono. En el streaming
+mide también el primer trozo. Las respuestas son aleatorias (--dup-ratio repite envíos para
+ejercitar la caché de consejos, compartida entre workers).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load import percentile, random_answers  # noqa: E402
+
+ROUTES = ("score", "batch", "advice", "stream")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, latency_ms: float) -> subprocess.Popen:
+    cmd = [sys.executable, os.path.join(ROOT, "api.py"), "--dry-run", "--port", str(port)]
+    cmd += ["--workers", str(workers), "--fake-latency-ms", str(latency_ms)]
+    return subprocess.Popen(cmd, cwd=ROOT)
+
+
+async def wait_ready(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("api.py no arrancó a tiempo")
+
+
+async def run_load(args, base_url: str) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    weights = [float(w) for w in args.mix.split(":")]
+    pool = [random_answers(rng) for _ in range(64)]
+
+    def answers() -> dict:
+        return rng.choice(pool) if rng.random() < args.dup_ratio else random_answers(rng)
+
+    timings = {route: [] for route in ROUTES}
+    first_chunk: list[float] = []
+    errors, sources = 0, {}
+    sem = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await wait_ready(client)
+
+        async def one(route: str):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    if route == "score":
+                        r = await client.post("/v1/score", json=answers())
+                    elif route == "batch":
+                        r = await client.post("/v1/score/batch", json={"items": [answers() for _ in range(args.batch_size)]})
+                    elif route == "advice":
+                        r = await client.post("/v1/advice", json=answers())
+                        src = r.json().get("source")
+                        sources[src] = sources.get(src, 0) + 1
+                    else:
+                        async with client.stream("POST", "/v1/advice/stream", json=answers()) as r:
+                            got_chunk = False
+                            async for raw in r.aiter_lines():
+                                msg = json.loads(raw)
+                                if "chunk" in msg and not got_chunk:
+                                    got_chunk = True
+                                    first_chunk.append(time.perf_counter() - t0)
+                                if msg.get("done"):
+                                    sources[msg["source"]] = sources.get(msg["source"], 0) + 1
+                    if r.status_code != 200:
+                        errors += 1
+                        return
+                except Exception:
+                    errors += 1
+                    return
+                timings[route].append(time.perf_counter() - t0)
+
+        plan = rng.choices(ROUTES, weights=weights, k=args.requests)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(route) for route in plan))
+        elapsed = time.perf_counter() - t0
+
+    def summary(values: list[float]) -> dict:
+        return {
+            "n": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+
+    done = sum(len(v) for v in timings.values())
+    return {
+        "requests": args.requests,
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "fake_latency_ms": args.fake_latency_ms,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(done / elapsed, 1) if elapsed > 0 else None,
+        "errors": errors,
+        "routes": {route: summary(v) for route, v in timings.items()},
+        "stream_first_chunk": summary(first_chunk),
+        "advice_sources": sources,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32, help="peticiones en vuelo a la vez")
+    ap.add_argument("--mix", default="60:10:20:10", help="pesos score:batch:advice:stream")
+    ap.add_argument("--batch-size", type=int, default=100)
+    ap.add_argument("--fake-latency-ms", type=float, default=300)
+    ap.add_argument("--dup-ratio", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="guarda el resultado en este fichero")
+    args = ap.parse_args()
+
+    port = free_port()
+    server = start_server(port, args.workers, args.fake_latency_ms)
+    try:
+        result = asyncio.run(run_load(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# benchmarks/fake_gemini.py
+"""Gemini de mentira para pruebas de carga: latencia configurable, errores/429 inyectados y tokens.
+
+Sustituye al genai.Client que construye gemini_pool, así que por encima (rate limiter, breaker,
+caché, streaming) todo corre igual que en producción, solo que sin red ni cuota real:
+
+    fake = FakeGemini(latency=Latency("lognormal", 0.8, sigma=0.4), rate_429=0.05)
+    fake.install()
+"""
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+CHARS_PER_TOKEN = 4
+ADVICE_TEXT = (
+    "Bestie, ese score no miente. 💅 Si algo te chirrió, no lo minimices. "
+    "Mañana le escribes tú solo si te apetece, sin prisas. "
+    "Ahora mismo: agua, Uber y me mandas ubicación. 🚕"
+)
+
+
+@dataclass
+class Latency:
+    """Distribución del tiempo hasta la respuesta completa (segundos)."""
+
+    kind: str = "constant"  # constant | uniform | lognormal
+    mean: float = 0.5
+    sigma: float = 0.5  # uniform: ancho a cada lado; lognormal: sigma del log
+    first_chunk_ratio: float = 0.3  # en streaming, parte del tiempo que tarda el primer trozo
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        # "0.5", "uniform:0.5:0.2", "lognormal:0.8:0.4"
+        parts = spec.split(":")
+        if len(parts) == 1:
+            return cls("constant", float(parts[0]))
+        return cls(parts[0], *(float(p) for p in parts[1:]))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "constant":
+            return self.mean
+        if self.kind == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.sigma, self.mean + self.sigma))
+        if self.kind == "lognormal":
+            # Parametrizada por la media real, no por la del log.
+            mu = math.log(self.mean) - self.sigma**2 / 2
+            return rng.lognormvariate(mu, self.sigma)
+        raise ValueError(f"Distribución desconocida: {self.kind}")
+
+
+class FakeAPIError(Exception):
+    """Imita a google.genai.errors.APIError: lo que miran ratelimit.status_code y retry_after_s."""
+
+    def __init__(self, code: int, message: str, retry_delay_s: float | None = None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.response = None
+        self.details = []
+        if retry_delay_s is not None:
+            self.details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_delay_s:g}s"}]
+
+
+class _Usage:
+    __slots__ = ("prompt_token_count", "cached_content_token_count", "candidates_token_count", "total_token_count")
+
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        # Como en Gemini, prompt_token_count incluye system_instruction.
+        self.prompt_token_count = prompt_tokens
+        self.cached_content_token_count = 0
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _Part:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Content:
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    __slots__ = ("index", "content")
+
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.content = _Content(text)
+
+
+class _Response:
+    __slots__ = ("text", "usage_metadata", "candidates")
+
+    def __init__(self, texts: list[str], usage: _Usage | None = None):
+        # Como el SDK: .text es la primera candidata y el resto solo está en candidates.
+        self.text = texts[0]
+        self.usage_metadata = usage
+        self.candidates = [_Candidate(i, t) for i, t in enumerate(texts)]
+
+
+def count_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+class FakeGemini:
+    def __init__(
+        self,
+        latency: Latency | None = None,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after_s: float | None = 1.0,
+        chunks: int = 4,
+        text: str = ADVICE_TEXT,
+        seed: int | None = None,
+        sleep=time.sleep,
+    ):
+        self.latency = latency or Latency()
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after_s = retry_after_s
+        self.chunks = max(1, chunks)
+        self.text = text
+        self._rng = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.streams = 0
+        self.errors = 0
+        self.throttled = 0
+        self.clients = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.candidates_out = 0
+
+    # --- inyección ---
+    def _draw(self) -> tuple[float, float]:
+        with self._lock:
+            self.calls += 1
+            return self.latency.sample(self._rng), self._rng.random()
+
+    def _maybe_fail(self, roll: float, delay: float):
+        if roll < self.rate_429:
+            with self._lock:
+                self.throttled += 1
+            # Un 429 de verdad vuelve rápido: no tiene sentido esperar toda la latencia.
+            self._sleep(min(delay, 0.05))
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED", self.retry_after_s)
+        if roll < self.rate_429 + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            self._sleep(delay)
+            raise FakeAPIError(503, "UNAVAILABLE")
+
+    def _texts(self, config) -> list[str]:
+        n = (config or {}).get("candidate_count") or 1
+        if n == 1:
+            return [self.text]
+        # Distintas en cada llamada, como con temperature alta: si no, la reserva no crecería.
+        with self._lock:
+            self.candidates_out += n
+            call = self.calls
+        return [f"{self.text} [{call}.{i}]" for i in range(n)]
+
+    def _account(self, prompt: str, texts: list[str], config=None) -> _Usage:
+        system = (config or {}).get("system_instruction")
+        usage = _Usage(count_tokens(prompt) + (count_tokens(system) if system else 0), sum(count_tokens(t) for t in texts))
+        with self._lock:
+            self.prompt_tokens += usage.prompt_token_count
+            self.output_tokens += usage.candidates_token_count
+        return usage
+
+    # --- la superficie que usa advice.generate_advice ---
+    def generate_content(self, model: str, contents: str, config=None) -> _Response:
+        delay, roll = self._draw()
+        self._maybe_fail(roll, delay)
+        self._sleep(delay)
+        texts = self._texts(config)
+        return _Response(texts, self._account(contents, texts, config))
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        delay, roll = self._draw()
+        with self._lock:
+            self.streams += 1
+        self._maybe_fail(roll, delay)
+        first = delay * self.latency.first_chunk_ratio
+        rest = (delay - first) / max(1, self.chunks - 1)
+        texts = self._texts(config)
+        usage = self._account(contents, texts, config)
+        split = [self._pieces(t) for t in texts]
+        steps = max(len(p) for p in split)
+        for i in range(steps):
+            self._sleep(first if i == 0 else rest)
+            last = i == steps - 1
+            yield _Response([p[i] if i < len(p) else "" for p in split], usage if last else None)
+
+    def _pieces(self, text: str) -> list[str]:
+        words = text.split(" ")
+        step = math.ceil(len(words) / self.chunks)
+        pieces = [" ".join(words[i : i + step]) + " " for i in range(0, len(words), step)]
+        pieces[-1] = pieces[-1].rstrip()
+        return pieces
+
+    def client(self, api_key: str) -> "FakeClient":
+        with self._lock:
+            self.clients += 1
+        return FakeClient(self)
+
+    def install(self):
+        """Hace que el pool por defecto de la app construya clientes falsos."""
+        import gemini_pool
+
+        with gemini_pool._default_lock:
+            gemini_pool._default_pool = gemini_pool.ClientPool(factory=self.client)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "streams": self.streams,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "clients": self.clients,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+                "candidates": self.candidates_out,
+            }
+
+
+class FakeClient:
+    def __init__(self, backend: FakeGemini):
+        self.models = backend
+
+    def close(self):
+        pass
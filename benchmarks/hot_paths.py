@@ -0,0 +1,275 @@
+# benchmarks/hot_paths.py
+"""Microbenchmarks de los caminos calientes: score, prompt, render del chat y reruns de página.
+
+    python benchmarks/hot_paths.py --save-baseline benchmarks/baseline.json
+    python benchmarks/hot_paths.py --baseline benchmarks/baseline.json      # falla si algo empeora
+    python benchmarks/hot_paths.py --filter render_chat --quick
+
+El resultado es JSON (µs por operación, el mínimo de varias repeticiones). Con --baseline, sale
+con código 1 si algún caso supera la línea base en más de --threshold (25 % por defecto).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Antes de importar nada de la app: los reruns de página no pueden tocar la caché ni el historial de verdad
+# (history.py lee HISTORY_PATH al importarse).
+_TMP = tempfile.mkdtemp(prefix="rfd-bench-")
+os.environ["ADVICE_CACHE_PATH"] = os.path.join(_TMP, "advice.sqlite3")
+os.environ["HISTORY_PATH"] = os.path.join(_TMP, "history.sqlite3")
+
+from advice import build_gemini_prompt  # noqa: E402
+from chat_html import chat_html, header_html  # noqa: E402
+from lexicon import default_matcher  # noqa: E402
+from scoring import CATEGORICAL, GREEN_FLAGS, OPTIONS, SLIDERS, compute_score, to_int_0_10  # noqa: E402
+
+SEED = 1234
+SLIDER_VALUES = ["Sin responder"] + [str(i) for i in range(11)]
+
+CASES = {}
+
+
+def case(name: str, number: int = 1000, repeat: int = 5):
+    # Cada caso es una factoría: prepara los datos fuera del tiempo medido y devuelve la función a medir.
+    def deco(factory):
+        CASES[name] = (factory, number, repeat)
+        return factory
+
+    return deco
+
+
+# =========================
+# Datos
+# =========================
+def random_date_data(rng: random.Random) -> dict:
+    # OPTIONS y no las claves de los pesos: ahí faltan las respuestas que no suman (los "No").
+    data = {key: rng.choice(OPTIONS[key]) for key, _, _, _ in CATEGORICAL}
+    data.update({key: rng.choice(SLIDER_VALUES) for key, _, _, _ in SLIDERS})
+    data["miradas_movil"] = rng.randint(0, 50)
+    data["green_flags"] = [g for g, _ in GREEN_FLAGS if rng.random() < 0.4]
+    data["location"] = rng.choice(["Restaurante chic", "Cine", "Su casa (🚩)", "Otro"])
+    data["alcohol"] = rng.random() < 0.5
+    data["nota_rara"] = ""
+    data["nota_buena"] = ""
+    return data
+
+
+EDGE_CASES = [
+    {},
+    {key: "Sin responder" for key in [k for k, _, _, _ in CATEGORICAL] + [k for k, _, _, _ in SLIDERS]},
+    {key: None for key in [k for k, _, _, _ in CATEGORICAL] + [k for k, _, _, _ in SLIDERS]},
+    {key: 10 for key, _, _, _ in SLIDERS},
+    {key: " 42 " for key, _, _, _ in SLIDERS} | {"miradas_movil": "7", "green_flags": "Comunicación clara y amable"},
+    {key: "nope" for key, _, _, _ in SLIDERS} | {"miradas_movil": "x", "trato_personal": "??"},
+]
+
+SHORT_NOTE = "Insistió en ir a su casa y no me escuchó nada, me sentí incómoda"
+LONG_NOTE = ("Me dijo que su ex era una loca y que yo era diferente, luego pidió otra copa por mí. " * 60).strip()
+
+
+def _messages(n: int) -> list:
+    return [
+        {"side": "right" if i % 3 == 0 else "left", "text": f"Mensaje {i}: ¿y qué le dijiste?\nNada, bestie.", "time": f"22:{i % 60:02d}"}
+        for i in range(n)
+    ]
+
+
+# =========================
+# compute_score
+# =========================
+@case("compute_score/random", number=2000)
+def _():
+    rng = random.Random(SEED)
+    rows = [random_date_data(rng) for _ in range(256)]
+    it = iter(rows * 10_000)
+    return lambda: compute_score(next(it))
+
+
+@case("compute_score/edge_cases", number=2000)
+def _():
+    it = iter(EDGE_CASES * 10_000)
+    return lambda: compute_score(next(it))
+
+
+@case("to_int_0_10/str", number=20000)
+def _():
+    return lambda: to_int_0_10("7")
+
+
+@case("to_int_0_10/int", number=20000)
+def _():
+    return lambda: to_int_0_10(7)
+
+
+@case("to_int_0_10/sin_responder", number=20000)
+def _():
+    return lambda: to_int_0_10("Sin responder")
+
+
+@case("to_int_0_10/invalid", number=20000)
+def _():
+    return lambda: to_int_0_10("nope")
+
+
+# =========================
+# build_gemini_prompt
+# =========================
+@case("build_gemini_prompt/short", number=5000)
+def _():
+    data = random_date_data(random.Random(SEED))
+    score, level, _ = compute_score(data)
+    return lambda: build_gemini_prompt(data, score, level)
+
+
+@case("build_gemini_prompt/long_notes", number=5000)
+def _():
+    data = random_date_data(random.Random(SEED)) | {"nota_rara": LONG_NOTE, "nota_buena": LONG_NOTE}
+    score, level, _ = compute_score(data)
+    return lambda: build_gemini_prompt(data, score, level)
+
+
+# =========================
+# Notas (lexicon.py)
+# =========================
+@case("lexicon_scan/short", number=5000)
+def _():
+    m = default_matcher()
+    return lambda: m.scan(SHORT_NOTE)
+
+
+@case("lexicon_scan/long", number=200)
+def _():
+    # Sin la lru_cache de lexicon.scan: mide el autómata.
+    m = default_matcher()
+    return lambda: m.scan(LONG_NOTE)
+
+
+# =========================
+# Render del chat
+# =========================
+for _n in (10, 100, 1000, 10_000):
+
+    @case(f"render_chat/{_n}_msgs", number=max(1, 20_000 // _n))
+    def _(n=_n):
+        msgs = _messages(n)
+        return lambda: chat_html(msgs)
+
+
+@case("render_chat_header", number=20000)
+def _():
+    return lambda: header_html("Bestie 💖", status="escribiendo…")
+
+
+# =========================
+# Reruns de página (AppTest, Gemini stubeado)
+# =========================
+def _page_app(page: str):
+    from fake_gemini import FakeGemini, Latency
+    from streamlit.testing.v1 import AppTest
+
+    # El cliente falso y no un stub de generate_advice: así se mide el camino entero hasta el SDK.
+    FakeGemini(latency=Latency(mean=0.0)).install()
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    if page != "landing":
+        at.session_state.api_key = "bench-key"
+        at.session_state.page = "cuestionario"
+        at.run()
+        # Respuestas distintas por página: si no, veredicto encontraría en la caché el consejo de cuestionario.
+        rng = random.Random(f"{SEED}/{page}")
+        for key, _, weights, _ in CATEGORICAL:
+            at.selectbox(key=key).set_value(rng.choice([w for w in weights if w != "Sin responder"]))
+        for key, _, _, _ in SLIDERS:
+            at.select_slider(key=key).set_value(str(rng.randint(0, 10)))
+        at.run()
+        if page == "veredicto":
+            next(b for b in at.button if "Veredicto" in b.label).click()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{page}: {[e.value for e in at.exception]}")
+    if page == "veredicto":
+        sources = {source for source, _ in at.session_state.advice_source.values()}
+        # Un fallback aquí mediría la página sin Gemini: el caso no valdría.
+        if sources != {"gemini"}:
+            raise RuntimeError(f"veredicto: el consejo salió de {sources}, no de Gemini")
+    return lambda: at.run()
+
+
+for _page in ("landing", "cuestionario", "veredicto"):
+
+    @case(f"page_rerun/{_page}", number=1, repeat=15)
+    def _(page=_page):
+        return _page_app(page)
+
+
+# =========================
+# Runner
+# =========================
+def run(filter_: str | None = None, quick: bool = False) -> dict:
+    results = {}
+    for name, (factory, number, repeat) in CASES.items():
+        if filter_ and filter_ not in name:
+            continue
+        if quick:
+            number, repeat = max(1, number // 10), max(3, repeat // 2)
+        fn = factory()
+        fn()  # calentamiento
+        best = min(timeit.Timer(fn).repeat(repeat=repeat, number=number)) / number
+        results[name] = {"us_per_op": round(best * 1e6, 3)}
+        print(f"{name:40s} {best * 1e6:12.2f} µs", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, res in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        ratio = res["us_per_op"] / base["us_per_op"] if base["us_per_op"] else 1.0
+        res["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {base['us_per_op']} µs -> {res['us_per_op']} µs (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="solo los casos que contengan este texto")
+    parser.add_argument("--quick", action="store_true", help="menos iteraciones (para CI)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="guarda el resultado como línea base")
+    parser.add_argument("--baseline", metavar="PATH", help="compara contra esta línea base")
+    parser.add_argument("--threshold", type=float, default=0.25, help="empeoramiento tolerado (0.25 = 25 %%)")
+    args = parser.parse_args(argv)
+
+    report = run(args.filter, args.quick)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if regressions:
+        print("Regresiones:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# benchmarks/load.py
+"""Carga concurrente: N sesiones simuladas de landing → cuestionario → veredicto contra un Gemini falso.
+
+    python benchmarks/load.py --sessions 200 --concurrency 50
+    python benchmarks/load.py --sessions 100 --latency lognormal:0.8:0.4 --rate-429 0.05 --json load.json
+
+Cada sesión es un AppTest con su propia API key y respuestas aleatorias (--dup-ratio repite
+envíos para ejercitar la caché). AppTest parchea el Runtime global de Streamlit, así que no se
+puede correr en paralelo con hilos: cada usuaria concurrente es un proceso, con las sesiones
+una detrás de otra, y todos comparten la caché SQLite como los workers de un despliegue real.
+Informa p50/p95/p99 por página, llamadas al LLM por sesión, de dónde salió cada consejo y la
+memoria pico por proceso.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ("landing", "cuestionario", "veredicto")
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def random_answers(rng: random.Random) -> dict:
+    from scoring import OPTIONS, SLIDERS
+
+    # Las opciones del cuestionario, no las claves de la tabla de pesos: ahí los "No" (0 puntos) no están.
+    answers = {key: rng.choice([o for o in options if o != "Sin responder"]) for key, options in OPTIONS.items()}
+    answers.update({key: str(rng.randint(0, 10)) for key, _, _, _ in SLIDERS})
+    return answers
+
+
+def run_session(i: int, answers: dict, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    timings = {page: [] for page in PAGES}
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+
+    def step(action=None):
+        if action:
+            action()
+        t0 = time.perf_counter()
+        at.run()
+        timings[at.session_state.page].append(time.perf_counter() - t0)
+        if at.exception:
+            raise RuntimeError([e.value for e in at.exception])
+
+    # Landing: primera carga, pega la key y la envía.
+    step()
+    step(lambda: at.text_input(key="api_key_draft").input(f"load-key-{i:05d}"))
+    step(lambda: next(b for b in at.button if b.label == "Enviar").click())
+
+    # Cuestionario: contesta todo de golpe (lo que dispara el prefetch) y pide el veredicto.
+    def answer():
+        for key, value in answers.items():
+            widget = at.selectbox(key=key) if not key.endswith("_0_10") else at.select_slider(key=key)
+            widget.set_value(value)
+
+    step(answer)
+    step(lambda: next(b for b in at.button if "Veredicto" in b.label).click())
+    if at.session_state.page != "veredicto":
+        raise RuntimeError(f"La sesión {i} acabó en {at.session_state.page}")
+
+    sid = at.session_state.submission_id
+    source, _ = at.session_state.advice_source.get(sid, ("?", None))
+    return {"timings": timings, "source": source}
+
+
+def run_worker(w: int, sessions: list[tuple[int, dict]], args) -> dict:
+    import advice
+    from fake_gemini import FakeGemini, Latency
+
+    fake = FakeGemini(
+        latency=Latency.parse(args.latency),
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        retry_after_s=args.retry_after,
+        seed=args.seed + w,
+    )
+    fake.install()
+
+    results, failures = [], []
+    for i, answers in sessions:
+        try:
+            results.append(run_session(i, answers, args.timeout))
+        except Exception as e:
+            failures.append(f"{i}: {e}")
+        if args.think_ms:
+            time.sleep(args.think_ms / 1000)
+    return {
+        "results": results,
+        "failures": failures,
+        "llm": fake.stats(),
+        "breaker": advice.served_stats()["breaker"],
+        # En Linux ru_maxrss va en KiB.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 4, help="procesos (usuarias a la vez)")
+    parser.add_argument("--latency", default="lognormal:0.8:0.4", help="constant (0.5) | uniform:media:ancho | lognormal:media:sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de llamadas que fallan con 503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fracción de llamadas que devuelven 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="RetryInfo de los 429 (s)")
+    parser.add_argument("--dup-ratio", type=float, default=0.0, help="fracción de sesiones que repiten un envío anterior")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pausa entre sesiones de un mismo proceso")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout de cada rerun (s)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="guarda el resultado en este fichero")
+    args = parser.parse_args(argv)
+
+    # Caché limpia por ejecución (si no, la segunda vez todo sale de la caché). Los procesos la heredan.
+    tmp = tempfile.mkdtemp(prefix="rfd-load-")
+    os.environ.setdefault("ADVICE_CACHE_PATH", os.path.join(tmp, "advice.sqlite3"))
+    os.environ.setdefault("HISTORY_PATH", os.path.join(tmp, "history.sqlite3"))
+
+    rng = random.Random(args.seed)
+    plans = []
+    for i in range(args.sessions):
+        if plans and rng.random() < args.dup_ratio:
+            plans.append(rng.choice(plans))
+        else:
+            plans.append(random_answers(rng))
+
+    workers = max(1, min(args.concurrency, args.sessions))
+    shares = [[(i, plans[i]) for i in range(w, args.sessions, workers)] for w in range(workers)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        outs = list(ex.map(run_worker, range(workers), shares, [args] * workers))
+    wall = time.perf_counter() - t0
+
+    results = [r for o in outs for r in o["results"]]
+    failures = [f for o in outs for f in o["failures"]]
+
+    pages = {}
+    for page in PAGES:
+        runs = [t for r in results for t in r["timings"][page]]
+        pages[page] = {
+            "runs": len(runs),
+            "p50_ms": round(percentile(runs, 50) * 1000, 1),
+            "p95_ms": round(percentile(runs, 95) * 1000, 1),
+            "p99_ms": round(percentile(runs, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(runs) * 1000, 1) if runs else 0.0,
+        }
+
+    sources = {}
+    for r in results:
+        sources[r["source"]] = sources.get(r["source"], 0) + 1
+    llm = {k: sum(o["llm"][k] for o in outs) for k in outs[0]["llm"]}
+    report = {
+        "sessions": args.sessions,
+        "completed": len(results),
+        "failed": len(failures),
+        "concurrency": workers,
+        "wall_s": round(wall, 2),
+        "sessions_per_s": round(len(results) / wall, 2) if wall else 0.0,
+        "pages": pages,
+        "llm_calls_per_session": round(llm["calls"] / len(results), 3) if results else 0.0,
+        "llm": llm,
+        "advice_sources": sources,
+        "breaker_trips": sum(o["breaker"]["trips"] for o in outs),
+        "peak_rss_mb": round(max(o["peak_rss_mb"] for o in outs), 1),
+        "peak_rss_total_mb": round(sum(o["peak_rss_mb"] for o in outs), 1),
+        "failures": failures[:10],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/prompt_tokens.py
+"""Tokens de entrada por llamada: el prompt de antes (PROMPT_VERSION 1) contra el actual.
+
+    python benchmarks/prompt_tokens.py
+    python benchmarks/prompt_tokens.py --budget 100 --dates 5000 --json prompt.json
+
+Sobre citas aleatorias (sin notas, nota corta y nota larga) cuenta con estimate_tokens lo que se
+manda en cada llamada: v1 lo lleva todo en el mensaje; v2 manda SYSTEM_INSTRUCTION más el contexto
+empaquetado. Los tokens reales de cada llamada (usage_metadata) salen en el JSONL de telemetría,
+en los eventos "llm_call".
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def prompt_v1(data: dict, score: int, level: str) -> str:
+    # Copia del build_gemini_prompt de PROMPT_VERSION 1 (sin la parte de tendencia), para comparar.
+    lines = [
+        f"- Score: {score}/100 ({level})",
+        f"- Ubicación: {data.get('location', 'Sin responder')}",
+        f"- ¿Alcohol?: {'Sí' if data.get('alcohol') else 'No'}",
+        f"- Trato al personal: {data.get('trato_personal', 'Sin responder')}",
+        f"- Ex’s: {data.get('tema_exs', 'Sin responder')}",
+        f"- Celos: {data.get('celos', 'Sin responder')}",
+    ]
+    red = (data.get("nota_rara", "") or "").strip()[:180]
+    green = (data.get("nota_buena", "") or "").strip()[:180]
+    if red:
+        lines.append(f"- Lo que chirrió: {red}")
+    if green:
+        lines.append(f"- Lo bueno: {green}")
+    summary = "\n".join(lines)
+    return (
+        "Eres la mejor amiga de la chica que está contando su cita por WhatsApp. "
+        "Tono: divertido, directo, cariñoso y protector. Un toque sarcástico suave, cero insultos. "
+        "Nada de diagnósticos clínicos, nada de terapia, nada de patologizar.\n\n"
+        "Objetivo: dale un consejo realista y accionable según el score. "
+        "Si hay señales de seguridad o control, prioriza seguridad y límites. "
+        "Si pinta bien, hypea con cautela.\n\n"
+        "Formato: máximo 4 frases cortas, estilo chat. Usa 1-3 emojis máximo.\n\n"
+        "Contexto:\n"
+        f"{summary}\n\n"
+        "Termina con un consejo práctico para hacer ahora (durante o después de la cita)."
+    )
+
+
+def summary(values: list[int]) -> dict:
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values), 1),
+        "p95": values[int(0.95 * (len(values) - 1))],
+        "max": values[-1],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dates", type=int, default=2000)
+    ap.add_argument("--budget", type=int, help="ADVICE_PROMPT_TOKENS para esta medida")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="guarda el resultado en este fichero")
+    args = ap.parse_args()
+    if args.budget is not None:
+        os.environ["ADVICE_PROMPT_TOKENS"] = str(args.budget)
+
+    import advice
+    from hot_paths import LONG_NOTE, SHORT_NOTE, random_date_data
+    from scoring import compute_score
+
+    rng = random.Random(args.seed)
+    system = advice.estimate_tokens(advice.SYSTEM_INSTRUCTION)
+    result = {"budget": advice.PROMPT_TOKEN_BUDGET, "system_instruction_tokens": system, "notes": {}}
+    for name, note in (("none", ""), ("short", SHORT_NOTE), ("long", LONG_NOTE)):
+        dates = []
+        for _ in range(args.dates):
+            data = random_date_data(rng) | {"nota_rara": note, "nota_buena": note[: len(note) // 2]}
+            dates.append((data, *compute_score(data)[:2]))
+
+        v1 = [advice.estimate_tokens(prompt_v1(d, s, lv)) for d, s, lv in dates]
+        context = [advice.estimate_tokens(advice.build_gemini_prompt(d, s, lv)) for d, s, lv in dates]
+        n = min(len(dates), 500)
+        result["notes"][name] = {
+            "v1_tokens": summary(v1),
+            "v2_tokens": summary([system + c for c in context]),
+            "v2_context_tokens": summary(context),
+            "v1_build_us": round(timeit.timeit(lambda: [prompt_v1(*d) for d in dates[:n]], number=3) / (3 * n) * 1e6, 2),
+            "v2_build_us": round(timeit.timeit(lambda: [advice.build_gemini_prompt(*d) for d in dates[:n]], number=3) / (3 * n) * 1e6, 2),
+        }
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/startup.py
+"""Arranque en frío: cuánto tarda un intérprete nuevo en importar y pintar page_landing.
+
+    python benchmarks/startup.py            # 5 repeticiones, mediana
+    python benchmarks/startup.py --repeat 10 --json startup.json
+
+Cada repetición es un proceso nuevo, así que no hay módulos ya cargados que maquillen el número.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lo que no debería cargarse solo por abrir la landing.
+LAZY_MODULES = ("google.genai", "httpx", "pandas", "numpy", "altair")
+
+_IMPORTS = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import advice, scoring, chat_html, fallback_advice
+t1 = time.perf_counter()
+from google import genai
+t2 = time.perf_counter()
+print(json.dumps({{"import_app_modules_s": t1 - t0, "import_genai_s": t2 - t1}}))
+"""
+
+_LANDING = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({{
+    "import_streamlit_s": t1 - t0,
+    "first_render_landing_s": t2 - t1,
+    "total_s": t2 - t0,
+    "page": at.session_state.page,
+    "errors": [str(e.value) for e in at.exception],
+    "loaded": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _run(code: str) -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int) -> dict:
+    imports = [_run(_IMPORTS.format(root=ROOT)) for _ in range(repeat)]
+    landing = [_run(_LANDING.format(root=ROOT, app=os.path.join(ROOT, "app.py"), lazy=LAZY_MODULES)) for _ in range(repeat)]
+
+    report = {"repeat": repeat}
+    for runs in (imports, landing):
+        for k, v in runs[0].items():
+            if isinstance(v, float):
+                report[k] = round(statistics.median(r[k] for r in runs), 4)
+    report["errors"] = sorted({e for r in landing for e in r["errors"]})
+    report["loaded_on_landing"] = sorted({m for r in landing for m in r["loaded"]})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="guarda el resultado en este fichero")
+    args = parser.parse_args(argv)
+
+    report = measure(args.repeat)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if report["errors"] or report["loaded_on_landing"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
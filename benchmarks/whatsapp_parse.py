@@ -0,0 +1,77 @@
+# benchmarks/whatsapp_parse.py
+"""Throughput del parser de exports de WhatsApp sobre un chat sintético.
+
+    python benchmarks/whatsapp_parse.py                # 200 MB
+    python benchmarks/whatsapp_parse.py --mb 500 --json whatsapp.json
+
+Genera el export en un fichero temporal (formato Android e iOS mezclados, mensajes de varias
+líneas) y lo parsea con mmap. Da MB/s y cuánto crece la memoria del proceso mientras parsea.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from whatsapp import parse_file  # noqa: E402
+
+WORDS = "vale jaja qué tal cena mañana vienes guapa te echo de menos dónde estás ya llego mira esto".split()
+
+
+def write_chat(path: str, mb: int, seed: int = 7):
+    rng = random.Random(seed)
+    target = mb * 1_000_000
+    t = datetime(2020, 1, 1)
+    people = ("Lucía", "Él 😎")
+    with open(path, "w", encoding="utf-8") as f:
+        size = 0
+        while size < target:
+            # Casi siempre seguidos, a veces media hora de silencio: unos pocos años de chat por cada 100 MB.
+            t += timedelta(minutes=rng.choice((0, 0, 0, 0, 0, 0, 1, 1, 2, 30)))
+            who = people[rng.random() < 0.45]
+            text = " ".join(rng.choices(WORDS, k=rng.randint(1, 14))) + ("?" if rng.random() < 0.15 else "")
+            if rng.random() < 0.5:
+                line = f"{t:%d/%m/%Y, %H:%M} - {who}: {text}\n"
+            else:
+                line = f"[{t.day}/{t.month}/{t:%y}, {t:%H:%M:%S}] {who}: {text}\n"
+            if rng.random() < 0.05:
+                line += " ".join(rng.choices(WORDS, k=6)) + "\n"
+            f.write(line)
+            size += len(line.encode("utf-8"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=int, default=200)
+    ap.add_argument("--json", help="guarda el resultado en este fichero")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        write_chat(path, args.mb)
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats = parse_file(path)
+        rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result = {
+        "mb": round(stats.size / 1e6, 1),
+        "messages": stats.messages,
+        "seconds": round(stats.seconds, 3),
+        "mb_s": round(stats.mb_s, 1),
+        # ru_maxrss va en KiB en Linux. Las páginas del mmap cuentan hasta que el parser las suelta (RELEASE_EVERY).
+        "peak_rss_growth_mb": round((rss1 - rss0) / 1024, 1),
+        "senders": {name: s.messages for name, s in stats.senders.items()},
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
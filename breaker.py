@@ -0,0 +1,89 @@
+# breaker.py
+import os
+import threading
+import time
+
+FAILURE_THRESHOLD = int(os.environ.get("GEMINI_BREAKER_FAILURES", "5"))
+RESET_S = float(os.environ.get("GEMINI_BREAKER_RESET_S", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Gemini ha fallado demasiadas veces seguidas: ni lo intentamos hasta la siguiente prueba."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"Gemini desactivado temporalmente ({retry_in:.0f} s para reintentar).")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_s: float = RESET_S, is_failure=None, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self._is_failure = is_failure or (lambda e: True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_s:
+            self._state = HALF_OPEN
+        return self._state
+
+    def call(self, fn):
+        with self._lock:
+            state = self._current_state()
+            # En half-open solo dejamos pasar una llamada de prueba a la vez.
+            if state == OPEN or (state == HALF_OPEN and self._probing):
+                self.rejected += 1
+                raise CircuitOpen(max(0.0, self.reset_s - (self._clock() - self._opened_at)))
+            if state == HALF_OPEN:
+                self._probing = True
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._on_failure(e)
+            raise
+        self._on_success()
+        return result
+
+    def _on_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def _on_failure(self, e: Exception):
+        with self._lock:
+            probing, self._probing = self._probing, False
+            if not self._is_failure(e):
+                return
+            self._failures += 1
+            if probing or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
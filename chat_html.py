@@ -0,0 +1,50 @@
+# chat_html.py
+from functools import lru_cache
+
+# Vive fuera de app.py a propósito: app.py se re-ejecuta en cada rerun y perdería la caché.
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def message_html(text: str, side: str, t: str | None) -> str:
+    text = (text or "").replace("\n", "<br>")
+    row_class = "row-right" if side == "right" else "row-left"
+    bubble_class = "right" if side == "right" else "left"
+    time_html = f"<span class='time'>{t}</span>" if t else ""
+    return f"""
+<div class="chat-row {row_class}">
+  <div class="bubble {bubble_class}">
+    {text}{time_html}
+  </div>
+</div>
+"""
+
+
+def chat_html(messages) -> str:
+    html = ["<div class='chat-wrap'>"]
+    for m in messages:
+        html.append(message_html(m.get("text", "") or "", m.get("side", "left"), m.get("time", None)))
+    html.append("</div>")
+    return "\n".join(html)
+
+
+DEFAULT_AVATAR = (
+    "data:image/svg+xml;utf8,"
+    "<svg xmlns='http://www.w3.org/2000/svg' width='84' height='84'>"
+    "<rect width='100%25' height='100%25' rx='42' ry='42' fill='%23FFD6E7'/>"
+    "<text x='50%25' y='58%25' font-size='44' text-anchor='middle'>💅</text>"
+    "</svg>"
+)
+
+
+def header_html(name: str, status: str = "en línea", avatar_url: str | None = None) -> str:
+    avatar_url = avatar_url or DEFAULT_AVATAR
+    return f"""
+<div class="wa-header">
+  <img class="wa-avatar" src="{avatar_url}" />
+  <div class="wa-title">
+    <div class="wa-name">{name}</div>
+    <div class="wa-status">{status}</div>
+  </div>
+</div>
+"""
@@ -0,0 +1,60 @@
+# fallback_advice.py
+# Consejo local y determinista para cuando Gemini no llega a tiempo (o está caído).
+from scoring import level_for
+
+OPENERS = {
+    "🟢 Verde": "Bestie, esto pinta sano y me alegro muchísimo. ✨",
+    "🟡 Amarillo": "Vale, no es drama total, pero hay cositas que no me cuadran. 👀",
+    "🟠 Naranja": "Te lo digo con amor: aquí hay señales serias. 🚧",
+    "🔴 Rojo": "Bestie, alarma roja y no es broma. 🚨",
+}
+
+# Una frase por factor del breakdown de compute_score.
+FLAG_LINES = {
+    "Trato al personal": "Cómo trató al camarero dice mucho de cómo te tratará a ti cuando se acabe el postureo.",
+    "Control (móvil/redes)": "Lo de querer controlar tu móvil o tus redes no es interés, es control.",
+    "Respeto de límites": "Si un límite tuyo le pareció negociable, eso es lo más importante de toda la cita.",
+    "Tema ex’s": "Si en la primera cita ya sale la ex (y encima comparándote), ahí hay tarea pendiente que no es tuya.",
+    "Celos": "Los celos tan pronto no son romanticismo, son una señal de lo que viene.",
+    "Insistió en sitio aislado": "Que insistiera en ir a un sitio aislado es para tomárselo muy en serio.",
+    "Presión con alcohol": "Presionarte para beber más es cruzar una línea, punto.",
+    "Love bombing": "Tanto halago tan rápido suele ser más estrategia que flechazo.",
+    "Incoherencias": "Las historias que no cuadran tienden a descuadrarse más con el tiempo.",
+    "No escuchó / poca atención": "Si no te escuchó en la cita, donde se supone que se esfuerza, imagina después.",
+    "Interrumpía / no te dejó hablar": "Una cita es una conversación, no un monólogo con público.",
+    "Cero curiosidad por ti": "Cero preguntas sobre ti es cero interés real en conocerte.",
+    "Valores poco alineados": "Lo de los valores no se arregla con química: fíjate bien en eso.",
+    "Móvil (demasiado presente)": "Si el móvil le interesaba más que tú, ya tienes tu respuesta.",
+    "Lo que contaste en las notas": "Lo que tú misma escribiste en las notas pesa: si algo te chirrió, no lo minimices.",
+}
+
+CLOSERS = {
+    "🟢 Verde": "Disfruta, ve a tu ritmo y sigue escuchando a tu instinto. 💖",
+    "🟡 Amarillo": "Antes de una segunda cita, marca un límite claro y mira cómo reacciona.",
+    "🟠 Naranja": "Ahora mismo: avisa a alguien de dónde estás y ten tu forma de volver a casa controlada.",
+    "🔴 Rojo": "Ahora mismo: si sigues con él, busca una excusa, pide tu taxi y escríbeme cuando estés a salvo.",
+}
+
+# Por debajo de esto un factor no merece frase propia.
+MIN_POINTS = 8
+
+
+def level_key(score: int, level: str | None) -> str:
+    return level if level in OPENERS else level_for(score)
+
+
+def top_flags(breakdown: dict, n: int = 2) -> list[str]:
+    order = list(FLAG_LINES)
+    flags = [(p, order.index(k), k) for k, p in breakdown.items() if k in FLAG_LINES and p >= MIN_POINTS]
+    flags.sort(key=lambda f: (-f[0], f[1]))
+    return [k for _, _, k in flags[:n]]
+
+
+def local_advice(score: int, level: str | None, breakdown: dict) -> str:
+    key = level_key(score, level)
+    lines = [OPENERS[key]]
+    # En verde no sacamos defectos salvo que alguno pese de verdad.
+    for flag in top_flags(breakdown, n=1 if key == "🟢 Verde" else 2):
+        lines.append(FLAG_LINES[flag])
+    lines.append(CLOSERS[key])
+    return " ".join(lines)
@@ -0,0 +1,186 @@
+# gemini_pool.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_CLIENTS = int(os.environ.get("GEMINI_POOL_MAX_CLIENTS", "256"))
+IDLE_S = float(os.environ.get("GEMINI_POOL_IDLE_S", "600"))
+# httpx cierra por defecto las conexiones ociosas a los 5 s; las mantenemos vivas más tiempo
+# para que los reruns de la misma usuaria no paguen otro handshake TLS.
+KEEPALIVE_S = float(os.environ.get("GEMINI_POOL_KEEPALIVE_S", "120"))
+MAX_CONNECTIONS_PER_CLIENT = 4
+
+
+def key_hash(api_key: str) -> str:
+    # Nunca guardamos la key en claro como clave del pool (ni en métricas ni en logs).
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("client", "created", "last_used", "in_use", "evicted", "calls")
+
+    def __init__(self, client):
+        self.client = client
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.in_use = 0
+        self.evicted = False
+        self.calls = 0
+
+
+class ClientPool:
+    """Un genai.Client por API key (por hash), reutilizado entre reruns y sesiones."""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS, idle_s: float = IDLE_S, factory=None):
+        self.max_clients = max_clients
+        self.idle_s = idle_s
+        self._factory = factory or _new_client
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._acquires = 0
+        self._reuses = 0
+        self._created = 0
+        self._evicted = 0
+        self._setup_s = 0.0
+        self._cold_call_s = 0.0
+        self._cold_calls = 0
+        self._warm_call_s = 0.0
+        self._warm_calls = 0
+
+    @contextmanager
+    def client(self, api_key: str):
+        h = key_hash(api_key)
+        entry, reused = self._acquire(h, api_key)
+        t0 = time.perf_counter()
+        try:
+            yield entry.client
+        finally:
+            self._release(entry, reused, time.perf_counter() - t0)
+
+    def _acquire(self, h: str, api_key: str):
+        with self._lock:
+            self._acquires += 1
+            self._evict_idle()
+            entry = self._entries.get(h)
+            if entry is not None:
+                self._entries.move_to_end(h)
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                self._reuses += 1
+                return entry, entry.calls > 0
+
+        # Construimos fuera del lock: no bloqueamos al resto de sesiones.
+        t0 = time.perf_counter()
+        client = self._factory(api_key)
+        setup = time.perf_counter() - t0
+
+        to_close = []
+        with self._lock:
+            self._created += 1
+            self._setup_s += setup
+            entry = self._entries.get(h)
+            if entry is not None:
+                # Otro hilo ganó la carrera: usamos el suyo y tiramos el nuestro.
+                to_close.append(client)
+                self._entries.move_to_end(h)
+            else:
+                entry = _Entry(client)
+                self._entries[h] = entry
+                while len(self._entries) > self.max_clients:
+                    _, old = self._entries.popitem(last=False)
+                    to_close.extend(self._retire(old))
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            reused = entry.calls > 0
+        for c in to_close:
+            _close(c)
+        return entry, reused
+
+    def _release(self, entry: _Entry, reused: bool, elapsed: float):
+        with self._lock:
+            entry.in_use -= 1
+            entry.calls += 1
+            entry.last_used = time.monotonic()
+            if reused:
+                self._warm_call_s += elapsed
+                self._warm_calls += 1
+            else:
+                self._cold_call_s += elapsed
+                self._cold_calls += 1
+            close = entry.evicted and entry.in_use == 0
+        if close:
+            _close(entry.client)
+
+    def _evict_idle(self):
+        # Llamar con el lock cogido. El OrderedDict va de menos a más reciente.
+        now = time.monotonic()
+        while self._entries:
+            h, entry = next(iter(self._entries.items()))
+            if now - entry.last_used < self.idle_s:
+                break
+            del self._entries[h]
+            for c in self._retire(entry):
+                _close(c)
+
+    def _retire(self, entry: _Entry) -> list:
+        self._evicted += 1
+        entry.evicted = True
+        # Si alguien lo está usando, lo cierra el último en soltarlo.
+        return [entry.client] if entry.in_use == 0 else []
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_setup = self._setup_s / self._created if self._created else 0.0
+            avg_cold = self._cold_call_s / self._cold_calls if self._cold_calls else 0.0
+            avg_warm = self._warm_call_s / self._warm_calls if self._warm_calls else 0.0
+            # Lo que nos ahorramos por reuso: construir el cliente + el sobrecoste de la
+            # primera llamada (conexión + TLS) frente a una llamada con conexión ya abierta.
+            per_reuse = avg_setup + (max(0.0, avg_cold - avg_warm) if self._warm_calls else 0.0)
+            return {
+                "live_clients": len(self._entries),
+                "acquires": self._acquires,
+                "reuses": self._reuses,
+                "reuse_ratio": self._reuses / self._acquires if self._acquires else 0.0,
+                "created": self._created,
+                "evicted": self._evicted,
+                "avg_setup_ms": avg_setup * 1000,
+                "avg_cold_call_ms": avg_cold * 1000,
+                "avg_warm_call_ms": avg_warm * 1000,
+                "setup_saved_s": self._reuses * per_reuse,
+            }
+
+
+def _new_client(api_key: str):
+    # El SDK tarda en importarse: solo lo paga quien de verdad llega a pedir un consejo.
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS_PER_CLIENT,
+        max_keepalive_connections=MAX_CONNECTIONS_PER_CLIENT,
+        keepalive_expiry=KEEPALIVE_S,
+    )
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(client_args={"limits": limits}))
+
+
+def _close(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+_default_pool: ClientPool | None = None
+_default_lock = threading.Lock()
+
+
+def default_pool() -> ClientPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool()
+        return _default_pool
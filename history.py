@@ -0,0 +1,425 @@
+# history.py
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from timeline import Trend, person_key
+
+HISTORY_PATH = os.environ.get(
+    "HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data", "history.sqlite3"),
+)
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "1") != "0"
+# El writer agrupa lo que llega en ventanas de FLUSH_S (o BATCH filas) en una sola transacción.
+BATCH = 500
+FLUSH_S = 0.5
+# Si el disco se atasca no bloqueamos la página: pasado este tope se descarta (y se cuenta).
+MAX_QUEUE = 10_000
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    submission_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    score INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    data TEXT NOT NULL,
+    breakdown TEXT NOT NULL,
+    advice TEXT,
+    advice_source TEXT,
+    owner TEXT,
+    person TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_created_at ON submissions(created_at, level, score);
+CREATE INDEX IF NOT EXISTS submissions_level_created_at ON submissions(level, created_at);
+CREATE INDEX IF NOT EXISTS submissions_score ON submissions(score, created_at);
+CREATE TABLE IF NOT EXISTS rollup_score (
+    level TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (level, score)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    day INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    score_sum INTEGER NOT NULL,
+    PRIMARY KEY (day, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_context (
+    location TEXT NOT NULL,
+    alcohol INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (location, alcohol, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_contrib (
+    factor TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    points INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS people (
+    owner TEXT NOT NULL,
+    person TEXT NOT NULL,
+    name TEXT NOT NULL,
+    trend TEXT NOT NULL,
+    PRIMARY KEY (owner, person)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Reconstrucción completa de los rollups (solo si el fichero viene de antes de que existieran).
+_REBUILD = """
+DELETE FROM rollup_score;
+DELETE FROM rollup_daily;
+DELETE FROM rollup_context;
+DELETE FROM rollup_contrib;
+INSERT INTO rollup_score(level, score, n)
+    SELECT level, score, COUNT(*) FROM submissions GROUP BY level, score;
+INSERT INTO rollup_daily(day, level, n, score_sum)
+    SELECT CAST(created_at / 86400 AS INTEGER), level, COUNT(*), SUM(score) FROM submissions GROUP BY 1, 2;
+INSERT INTO rollup_context(location, alcohol, level, n)
+    SELECT COALESCE(NULLIF(json_extract(data, '$.location'), ''), 'Sin responder'),
+           CASE WHEN json_extract(data, '$.alcohol') THEN 1 ELSE 0 END,
+           level, COUNT(*)
+    FROM submissions GROUP BY 1, 2, 3;
+INSERT INTO rollup_contrib(factor, n, points)
+    SELECT j.key, COUNT(*), SUM(j.value) FROM submissions, json_each(submissions.breakdown) AS j
+    WHERE j.value > 0 GROUP BY j.key;
+INSERT OR REPLACE INTO meta(name, value) VALUES ('rollups', 1);
+"""
+
+_UPSERTS = (
+    "INSERT INTO rollup_score(level, score, n) VALUES (?, ?, ?) "
+    "ON CONFLICT(level, score) DO UPDATE SET n = n + excluded.n",
+    "INSERT INTO rollup_daily(day, level, n, score_sum) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(day, level) DO UPDATE SET n = n + excluded.n, score_sum = score_sum + excluded.score_sum",
+    "INSERT INTO rollup_context(location, alcohol, level, n) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(location, alcohol, level) DO UPDATE SET n = n + excluded.n",
+    "INSERT INTO rollup_contrib(factor, n, points) VALUES (?, ?, ?) "
+    "ON CONFLICT(factor) DO UPDATE SET n = n + excluded.n, points = points + excluded.points",
+)
+
+_PERSON_UPSERT = (
+    "INSERT INTO people(owner, person, name, trend) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(owner, person) DO UPDATE SET name = excluded.name, trend = excluded.trend"
+)
+
+_INSERT = """
+INSERT INTO submissions(submission_id, created_at, score, level, data, breakdown, advice, advice_source, owner, person)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_COLUMNS = ("id", "submission_id", "created_at", "score", "level", "data", "breakdown", "advice", "advice_source", "owner", "person")
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class History:
+    """Histórico de envíos (solo se añade). Las escrituras van por cola a un hilo que las agrupa."""
+
+    def __init__(self, path: str = HISTORY_PATH, batch: int = BATCH, flush_s: float = FLUSH_S, max_queue: int = MAX_QUEUE):
+        self.path = path
+        self.batch = batch
+        self.flush_s = flush_s
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Ficheros de antes de las personas: les añadimos las columnas (quedan a NULL).
+        if "person" not in {row[1] for row in conn.execute("PRAGMA table_info(submissions)")}:
+            conn.executescript("ALTER TABLE submissions ADD COLUMN owner TEXT; ALTER TABLE submissions ADD COLUMN person TEXT;")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS submissions_person ON submissions(owner, person, created_at) WHERE person IS NOT NULL"
+        )
+        conn.execute("INSERT OR IGNORE INTO meta(name, value) VALUES ('version', 0)")
+        if conn.execute("SELECT value FROM meta WHERE name = 'rollups'").fetchone() is None:
+            conn.executescript("BEGIN IMMEDIATE;" + _REBUILD + "COMMIT;")
+        self._thread = threading.Thread(target=self._writer, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------------------------
+    # Escritura (fuera del rerun)
+    # -------------------------
+    def record(
+        self,
+        submission_id: str,
+        data: dict,
+        score: int,
+        level: str,
+        breakdown: dict,
+        advice: str | None = None,
+        advice_source: str | None = None,
+        owner: str | None = None,
+    ) -> bool:
+        # Serializamos aquí (es barato) para no guardar referencias al session_state en la cola.
+        # La persona solo se enlaza si sabemos de quién es el envío (owner = hash de su API key).
+        person = person_key(data.get("person")) if owner else ""
+        row = (
+            submission_id, time.time(), int(score), level, _dumps(data), _dumps(breakdown), advice, advice_source,
+            owner if person else None, person or None,
+        )
+        context = (
+            data.get("location") or "Sin responder",
+            1 if data.get("alcohol") else 0,
+            tuple((factor, pts) for factor, pts in breakdown.items() if pts > 0),
+            (" ".join(str(data["person"]).split()), dict(breakdown)) if person else None,
+        )
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((row, context))
+            return True
+        except queue.Full:
+            with self._idle:
+                self._pending -= 1
+                self.dropped += 1
+            return False
+
+    def _writer(self):
+        conn = self._conn()
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                rows = [self._queue.get(timeout=self.flush_s)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_s
+            while len(rows) < self.batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(_INSERT, [row for row, _ in rows])
+                self._update_rollups(conn, rows)
+                self._update_people(conn, rows)
+                conn.execute("COMMIT")
+                written = len(rows)
+            except Exception:
+                # Cualquier fallo (también una fila rara en _update_people) tira solo este lote:
+                # si el hilo muriera, flush() se quedaría esperando y no se guardaría nada más.
+                log.exception("history: se descarta un lote de %d filas", len(rows))
+                try:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                written = 0
+            with self._idle:
+                self.written += written
+                self.dropped += len(rows) - written
+                self.batches += 1
+                self._pending -= len(rows)
+                self._idle.notify_all()
+
+    def _update_rollups(self, conn: sqlite3.Connection, rows: list):
+        # Se suman en memoria por lote y se aplican con un UPSERT por celda: el coste no crece con la tabla.
+        by_score, by_day, by_context, by_factor = Counter(), Counter(), Counter(), Counter()
+        day_sum, factor_pts = Counter(), Counter()
+        for (_, created_at, score, level, *_), (location, alcohol, contribs, _) in rows:
+            by_score[(level, score)] += 1
+            day = (int(created_at // 86400), level)
+            by_day[day] += 1
+            day_sum[day] += score
+            by_context[(location, alcohol, level)] += 1
+            for factor, pts in contribs:
+                by_factor[factor] += 1
+                factor_pts[factor] += pts
+        conn.executemany(_UPSERTS[0], [(*k, n) for k, n in by_score.items()])
+        conn.executemany(_UPSERTS[1], [(*k, n, day_sum[k]) for k, n in by_day.items()])
+        conn.executemany(_UPSERTS[2], [(*k, n) for k, n in by_context.items()])
+        conn.executemany(_UPSERTS[3], [(f, n, factor_pts[f]) for f, n in by_factor.items()])
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+
+    def _update_people(self, conn: sqlite3.Connection, rows: list):
+        # Una lectura y un UPSERT por persona del lote; Trend.advance no mira las citas anteriores.
+        trends, names = {}, {}
+        for (_, created_at, score, *_, owner, person), (*_, linked) in rows:
+            if linked is None:
+                continue
+            key = (owner, person)
+            if key not in trends:
+                found = conn.execute("SELECT trend FROM people WHERE owner = ? AND person = ?", key).fetchone()
+                trends[key] = Trend.from_json(found[0]) if found else Trend()
+            name, breakdown = linked
+            trends[key].advance(score, breakdown, created_at)
+            names[key] = name
+        conn.executemany(_PERSON_UPSERT, [(*key, names[key], t.to_json()) for key, t in trends.items()])
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que lo encolado llegue a disco (tests, benchmarks y cierre)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def query(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        level: str | None = None,
+        min_score: int | None = None,
+        max_score: int | None = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        where, args = [], []
+        if level is not None:
+            where.append("level = ?")
+            args.append(level)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        if min_score is not None:
+            where.append("score >= ?")
+            args.append(min_score)
+        if max_score is not None:
+            where.append("score <= ?")
+            args.append(max_score)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM submissions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        rows = self._conn().execute(sql, (*args, limit)).fetchall()
+        out = []
+        for row in rows:
+            rec = dict(zip(_COLUMNS, row))
+            rec["data"] = json.loads(rec["data"])
+            rec["breakdown"] = json.loads(rec["breakdown"])
+            out.append(rec)
+        return out
+
+    def count_by_level(self, since: float | None = None, until: float | None = None) -> dict[str, int]:
+        sql, args = "SELECT level, COUNT(*) FROM submissions", []
+        if since is not None or until is not None:
+            sql += " WHERE created_at >= ? AND created_at < ?"
+            args = [since if since is not None else 0.0, until if until is not None else float("inf")]
+        return dict(self._conn().execute(sql + " GROUP BY level", args).fetchall())
+
+    def person_trend(self, owner: str, name: str) -> Trend | None:
+        found = self._conn().execute(
+            "SELECT trend FROM people WHERE owner = ? AND person = ?", (owner, person_key(name))
+        ).fetchone()
+        return Trend.from_json(found[0]) if found else None
+
+    def people(self, owner: str) -> list[tuple[str, int]]:
+        """(nombre, citas) de cada persona de esta usuaria, la más reciente primero."""
+        sql = (
+            "SELECT name, json_extract(trend, '$.n') FROM people WHERE owner = ? "
+            "ORDER BY json_extract(trend, '$.at') DESC"
+        )
+        return self._conn().execute(sql, (owner,)).fetchall()
+
+    def timeline(self, owner: str, name: str, limit: int = 200) -> list[dict]:
+        # Las últimas `limit` citas con esa persona, de la más antigua a la más nueva.
+        rows = self._conn().execute(
+            "SELECT submission_id, created_at, score, level, breakdown FROM submissions "
+            "WHERE owner = ? AND person = ? ORDER BY created_at DESC LIMIT ?",
+            (owner, person_key(name), limit),
+        ).fetchall()
+        cols = ("submission_id", "created_at", "score", "level", "breakdown")
+        return [dict(zip(cols, row), breakdown=json.loads(row[4])) for row in reversed(rows)]
+
+    def version(self) -> int:
+        # Cambia con cada lote escrito (en cualquier proceso): sirve de clave para cachear gráficos.
+        return self._conn().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def rollups(self) -> dict:
+        conn = self._conn()
+        return {
+            "score": conn.execute("SELECT level, score, n FROM rollup_score").fetchall(),
+            "daily": conn.execute("SELECT day, level, n, score_sum FROM rollup_daily ORDER BY day").fetchall(),
+            "context": conn.execute("SELECT location, alcohol, level, n FROM rollup_context").fetchall(),
+            "contrib": conn.execute("SELECT factor, n, points FROM rollup_contrib ORDER BY n DESC").fetchall(),
+        }
+
+    def stats(self) -> dict:
+        with self._idle:
+            out = {"written": self.written, "dropped": self.dropped, "batches": self.batches, "pending": self._pending}
+        out["rows"] = self._conn().execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        return out
+
+
+_default_history: History | None = None
+_default_lock = threading.Lock()
+
+
+def default_history() -> History:
+    global _default_history
+    with _default_lock:
+        if _default_history is None:
+            _default_history = History()
+            atexit.register(_default_history.close)
+        return _default_history
+
+
+def record_submission(
+    submission_id: str,
+    data: dict,
+    score: int,
+    level: str,
+    breakdown: dict,
+    advice: str | None,
+    advice_source: str | None,
+    owner: str | None = None,
+):
+    if HISTORY_ENABLED:
+        default_history().record(submission_id, data, score, level, breakdown, advice, advice_source, owner)
+
+
+def person_trend(owner: str, name: str) -> Trend | None:
+    if not HISTORY_ENABLED or not person_key(name):
+        return None
+    return default_history().person_trend(owner, name)
+
+
+def person_timeline(owner: str, name: str) -> list[dict]:
+    if not HISTORY_ENABLED or not person_key(name):
+        return []
+    return default_history().timeline(owner, name)
+
+
+def known_people(owner: str) -> list[tuple[str, int]]:
+    return default_history().people(owner) if HISTORY_ENABLED else []
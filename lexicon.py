@@ -0,0 +1,386 @@
+# lexicon.py
+import html
+import os
+import threading
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+# Fichero extra con el mismo formato que DEFAULT_LEXICON; añade frases o cambia su peso (0 la quita).
+LEXICON_PATH = os.environ.get("LEXICON_PATH", "")
+NOTE_FIELDS = ("nota_rara", "nota_buena")
+# Tope de lo que pueden mover las notas: son una pista, no un veredicto.
+RED_CAP = 15
+GREEN_CAP = 10
+# "no", "sin"… justo antes de la frase le dan la vuelta: no la contamos.
+NEGATORS = frozenset({"no", "nunca", "jamas", "sin", "ni", "nada"})
+NEGATION_WORDS = 2
+CACHE_SIZE = 4096
+_SPACES = re.compile(" {2,}")
+
+# peso  frase  (se comparan sin tildes ni mayúsculas; peso negativo = green flag)
+# La última palabra acepta género y número (celoso → celosa, celosos…); con "*" al final, cualquier terminación.
+DEFAULT_LEXICON = """
+# Control y celos
+6  me control*
+6  revis* mi movil
+6  me pidio la contrasena
+6  queria ver mi movil
+5  me quito el movil
+5  celos*
+5  posesiv*
+4  con quien hablaba
+4  con quien estaba
+4  donde estaba
+4  me prohib*
+# Límites y consentimiento
+8  insisti*
+8  no acepto un no
+8  no respeto mi no
+8  me toco sin permiso
+8  sin mi consentimiento
+7  me presion*
+7  me oblig*
+7  me agarr*
+7  me empuj*
+7  me forz*
+6  me hizo sentir incomoda
+6  me senti incomoda
+6  me dio miedo
+6  me senti insegura
+8  me senti en peligro
+6  no me dejaba irme
+6  no me dejo irme
+6  me siguio
+6  me quiso llevar
+6  a su casa
+6  sitio apartado
+6  sitio aislado
+6  lugar apartado
+# Alcohol
+6  que bebiera mas
+6  otra copa
+6  emborrach*
+10 algo en la bebida
+10 algo en mi bebida
+4  borracho
+6  conducia borracho
+# Falta de respeto
+5  grit*
+6  me insult*
+6  me humill*
+4  se burl*
+4  se rio de mi
+4  me hizo sentir tonta
+4  borde
+4  maleducad*
+4  despreci*
+5  machist*
+4  comentarios sobre mi cuerpo
+4  sobre mi fisico
+5  me llamo exagerada
+5  estas loca
+5  estas exagerando
+4  me interrump*
+3  solo hablo de el
+3  solo hablaba de el
+3  no me pregunto nada
+3  ni me pregunto
+3  pendiente del movil
+3  mirando el movil
+3  con el movil todo el rato
+# Ex's
+3  hablo de su ex
+4  me compar*
+4  como su ex
+4  su ex esta loca
+4  su ex era una loca
+# Incoherencias
+5  minti*
+5  mentira*
+3  incoheren*
+3  no cuadra*
+3  contradic*
+3  me enganch*
+# Love bombing
+4  alma gemela
+4  te quiero
+4  eres la mujer de mi vida
+3  muy intens*
+3  demasiado intens*
+3  me escribio sin parar
+4  me bombarde*
+3  ya hablaba de casar*
+# Agresividad
+8  amenaz*
+8  violent*
+7  agresiv*
+9  me pego
+5  golpe*
+3  se enfad*
+3  mal rollo
+3  turbio
+3  red flag*
+3  bandera roja
+# Green flags
+-4 me escuch*
+-4 respetuos*
+-4 respeto mis limites
+-4 respeto mi espacio
+-4 me pidio permiso
+-4 pidio permiso
+-3 consentimiento
+-3 se intereso por mi
+-3 me hizo preguntas
+-2 curios*
+-3 me acompan*
+-4 me senti comoda
+-4 me senti segura
+-3 me senti a gusto
+-2 tranquila
+-3 amable
+-2 educad*
+-2 divertid*
+-2 nos reimos
+-3 buena conversacion
+-2 conexion
+-2 detallista
+-2 puntual
+-2 atent*
+-2 cuidados*
+-3 honest*
+-2 sincer*
+-2 coherente
+-3 me dejo hablar
+-3 sitio publico
+-3 si habia llegado
+-3 sin presion*
+-3 a mi ritmo
+-3 empatic*
+"""
+
+
+class Entry(NamedTuple):
+    phrase: str
+    weight: int
+
+
+class Hit(NamedTuple):
+    entry: int  # índice en Matcher.entries
+    start: int  # posiciones en el texto original (no en el normalizado)
+    end: int
+
+
+# =========================
+# Normalización
+# =========================
+def _fold_table() -> str:
+    # Carácter a carácter (1 → 1): así las posiciones del texto normalizado valen para el original.
+    # Es un str indexado por código: translate() va bastante más rápido que con un dict.
+    table = []
+    for code in range(0x2070):
+        c = chr(code)
+        if code >= 0x2000:  # comillas tipográficas, guiones, espacios raros…
+            table.append(" ")
+            continue
+        base = unicodedata.normalize("NFKD", c)[:1] or c
+        low = base.lower()
+        table.append(low if len(low) == 1 and low.isalnum() else " ")
+    return "".join(table)
+
+
+_FOLD = _fold_table()
+
+
+def fold(text: str) -> str:
+    return text.translate(_FOLD)
+
+
+def _patterns(phrase: str) -> list[tuple[str, bool]]:
+    # (patrón, abierto por el final). Los espacios de los extremos hacen de límite de palabra.
+    words = fold(phrase.rstrip("*")).split()
+    if not words:
+        return []
+    if phrase.endswith("*"):
+        return [(" " + " ".join(words), True)]
+    *head, last = words
+    endings = [last]
+    if len(last) >= 4:
+        if last[-1] in "oa":
+            endings = [last[:-1] + e for e in ("o", "a", "os", "as")]
+        elif last[-1] == "e":
+            endings = [last, last + "s"]
+        elif last[-1] not in "s":
+            endings = [last, last + "es"]
+    return [(" " + " ".join(head + [e]) + " ", False) for e in endings]
+
+
+def parse_lexicon(text: str) -> dict[str, int]:
+    entries = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        weight, _, phrase = line.partition(" ")
+        entries[phrase.strip()] = int(weight)
+    return entries
+
+
+# =========================
+# Aho-Corasick
+# =========================
+class Matcher:
+    """Autómata Aho-Corasick sobre todas las frases: una pasada por el texto, da igual cuántas haya."""
+
+    def __init__(self, lexicon: dict[str, int]):
+        self.entries = tuple(Entry(phrase, w) for phrase, w in lexicon.items() if w)
+        goto: list[dict] = [{}]
+        out: list[tuple] = [()]
+        for idx, entry in enumerate(self.entries):
+            for pattern, open_end in _patterns(entry.phrase):
+                s = 0
+                for ch in pattern:
+                    nxt = goto[s].get(ch)
+                    if nxt is None:
+                        nxt = goto[s][ch] = len(goto)
+                        goto.append({})
+                        out.append(())
+                    s = nxt
+                out[s] += ((idx, len(pattern), open_end),)
+
+        # Enlaces de fallo por anchura; cada estado hereda las salidas de su fallo.
+        fail = [0] * len(goto)
+        order = []  # estados en orden de anchura: el fallo de cada uno va siempre antes
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            order.append(s)
+            for ch, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(ch, 0)
+                out[t] += out[fail[t]]
+
+        # Tabla de transiciones completa: al escanear no hay bucle de fallos, un dict.get por carácter.
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        for t in order:
+            delta[t] = {**delta[fail[t]], **goto[t]}
+        self._delta, self._out = delta, out
+
+    def scan(self, text: str) -> tuple[Hit, ...]:
+        folded = " " + fold(text) + " "
+        # Las rachas de espacios (", " → "  ") cuentan como uno; runs permite volver a las posiciones reales.
+        runs = [(m.start(), m.end() - m.start() - 1) for m in _SPACES.finditer(folded)]
+        if runs:
+            folded = _SPACES.sub(" ", folded)
+            starts, shifts, acc = [], [0], 0
+            for start, extra in runs:
+                starts.append(start - acc)
+                acc += extra
+                shifts.append(acc)
+
+        delta, out = self._delta, self._out
+        s = 0
+        found = []
+        for i, ch in enumerate(folded):
+            s = delta[s].get(ch, 0)
+            if out[s]:
+                for idx, length, open_end in out[s]:
+                    first = i - length + 2  # primera letra
+                    last = folded.find(" ", i) - 1 if open_end else i - 1
+                    if _negated(folded, first):
+                        continue
+                    if runs:
+                        first += shifts[bisect_left(starts, first)]
+                        last += shifts[bisect_left(starts, last)]
+                    # folded lleva un espacio delante: en el original es una posición menos.
+                    found.append(Hit(idx, first - 1, last))
+
+        # Si dos frases se pisan, manda la más larga (la más concreta).
+        found.sort(key=lambda h: (h.start, h.start - h.end))
+        hits, last_end = [], -1
+        for h in found:
+            if h.start >= last_end:
+                hits.append(h)
+                last_end = h.end
+            elif h.end - h.start > hits[-1].end - hits[-1].start:
+                hits[-1] = h
+                last_end = h.end
+        return tuple(hits)
+
+
+def _negated(folded: str, start: int) -> bool:
+    return not NEGATORS.isdisjoint(folded[max(0, start - 40) : start].split()[-NEGATION_WORDS:])
+
+
+# =========================
+# Matcher por defecto (una vez por proceso)
+# =========================
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_matcher() -> Matcher:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                lexicon = parse_lexicon(DEFAULT_LEXICON)
+                if LEXICON_PATH:
+                    with open(LEXICON_PATH, encoding="utf-8") as f:
+                        lexicon.update(parse_lexicon(f.read()))
+                _default = Matcher(lexicon)
+    return _default
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def scan(text: str) -> tuple[Hit, ...]:
+    return default_matcher().scan(text)
+
+
+def _texts(values) -> list[str]:
+    return [v for v in values if isinstance(v, str) and v and not v.isspace()]
+
+
+def points_for(texts) -> int:
+    """Aportación al score de unas notas: cada frase cuenta una vez, con tope por cada lado."""
+    texts = _texts(texts)
+    if not texts:
+        return 0
+    entries = default_matcher().entries
+    seen = {h.entry for text in texts for h in scan(text)}
+    red = sum(entries[i].weight for i in seen if entries[i].weight > 0)
+    green = -sum(entries[i].weight for i in seen if entries[i].weight < 0)
+    return min(red, RED_CAP) - min(green, GREEN_CAP)
+
+
+def notes_points(data: dict) -> int:
+    return points_for(data.get(f) for f in NOTE_FIELDS)
+
+
+def explain(data: dict) -> list[tuple[str, int]]:
+    """(frase tal como la escribió, peso) de cada entrada encontrada en las notas, de más a menos peso."""
+    entries = default_matcher().entries
+    found = {}
+    for text in _texts(data.get(f) for f in NOTE_FIELDS):
+        for h in scan(text):
+            found.setdefault(h.entry, text[h.start : h.end])
+    return sorted(((phrase, entries[i].weight) for i, phrase in found.items()), key=lambda pw: -abs(pw[1]))
+
+
+def highlight(text: str) -> str:
+    """HTML del texto con las frases marcadas (rojo/verde). Escapa todo lo demás."""
+    entries = default_matcher().entries
+    parts, last = [], 0
+    for h in scan(text):
+        kind = "red" if entries[h.entry].weight > 0 else "green"
+        parts.append(html.escape(text[last : h.start]))
+        parts.append(f"<mark class='flag-{kind}'>{html.escape(text[h.start : h.end])}</mark>")
+        last = h.end
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
@@ -0,0 +1,124 @@
+# profiler.py
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# PROFILE=1 perfila todos los reruns; con PROFILE_TOKEN solo los de ?profile=<token> (para admins).
+ALWAYS = os.environ.get("PROFILE", "0") == "1"
+TOKEN = os.environ.get("PROFILE_TOKEN", "")
+THRESHOLD_MS = float(os.environ.get("PROFILE_THRESHOLD_MS", "500"))
+INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(".cache", "profiles"))
+MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+
+_files_lock = threading.Lock()
+
+
+def requested(query_params) -> bool:
+    if ALWAYS:
+        return True
+    if not TOKEN:
+        return False
+    value = query_params.get("profile") or ""
+    return hmac.compare_digest(value.encode("utf-8"), TOKEN.encode("utf-8"))
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Capture:
+    """Muestrea la pila del hilo del rerun cada INTERVAL_MS; si el rerun pasa del umbral, la vuelca."""
+
+    def __init__(self, page: str, session: str, threshold_ms: float = THRESHOLD_MS, interval_ms: float = INTERVAL_MS):
+        self.page = page
+        self.session = session
+        self.threshold_ms = threshold_ms
+        self.interval_s = interval_ms / 1000
+        self.stacks: Counter[str] = Counter()
+        self.path: str | None = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.t0 = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed_ms = (time.perf_counter() - self.t0) * 1000
+        self._stop.set()
+        self._thread.join()
+        if self.elapsed_ms >= self.threshold_ms and self.stacks:
+            self.path = self.dump()
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        # Formato "collapsed stack" (flamegraph.pl, speedscope, inferno): pila;separada;por;puntos cuenta
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def dump(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{self.page}_{self.session}_{self.elapsed_ms:.0f}ms.collapsed"
+        path = os.path.join(PROFILE_DIR, name)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        os.replace(tmp, path)
+        prune()
+        return path
+
+
+def prune(max_files: int = MAX_FILES):
+    # Nos quedamos con las capturas más recientes: el disco no se llena aunque todo vaya lento.
+    with _files_lock:
+        try:
+            entries = [e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".collapsed")]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for e in entries[max_files:]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+
+def capture(page: str, state, query_params):
+    """Envuelve el dispatch de una página. Sin PROFILE/PROFILE_TOKEN no hace nada."""
+    if not (ALWAYS or TOKEN) or not requested(query_params):
+        return _NOOP
+    session = state.get("profile_session")
+    if session is None:
+        session = state["profile_session"] = uuid.uuid4().hex[:8]
+    return Capture(page, session)
@@ -0,0 +1,182 @@
+# ratelimit.py
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Cuota por API key y modelo (el free tier de gemini-2.5-flash ronda las 10 RPM).
+RPM = float(os.environ.get("GEMINI_RPM", "10"))
+BURST = int(os.environ.get("GEMINI_BURST", "3"))
+MAX_WAITERS = int(os.environ.get("GEMINI_MAX_WAITERS", "16"))
+DEADLINE_S = float(os.environ.get("GEMINI_DEADLINE_S", "15"))
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8.0
+MAX_BUCKETS = 10_000
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimited(Exception):
+    """No hay cuota a tiempo: la cola está llena, el deadline no da o Gemini sigue con 429."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: int, max_waiters: int = MAX_WAITERS, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_s
+        self.burst = burst
+        self.max_waiters = max_waiters
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._waiters = 0
+        self.last_used = self._updated
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline: float):
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self.last_used = now
+            # Reservamos el token aunque quede en negativo: así la cola es FIFO.
+            wait = max((1 - self._tokens) / self.rate, self._blocked_until - now, 0.0)
+            if wait > 0:
+                if self._waiters >= self.max_waiters:
+                    raise RateLimited("Demasiada gente esperando a Gemini.", retry_after=wait)
+                if now + wait > deadline:
+                    raise RateLimited("No hay cuota antes del deadline.", retry_after=wait)
+                self._waiters += 1
+            self._tokens -= 1
+
+        if wait > 0:
+            try:
+                self._sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiters -= 1
+
+    def penalize(self, until: float):
+        # El servidor nos ha dicho cuándo volver: nadie con esta key/modelo llama antes.
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, until)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = RPM, burst: int = BURST, max_waiters: int = MAX_WAITERS, clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.rpm = rpm
+        self.burst = burst
+        self.max_waiters = max_waiters
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+
+    def bucket(self, key_hash: str, model: str) -> TokenBucket:
+        k = (key_hash, model)
+        with self._lock:
+            b = self._buckets.get(k)
+            if b is None:
+                b = TokenBucket(self.rpm / 60.0, self.burst, self.max_waiters, self.clock, self.sleep)
+                self._buckets[k] = b
+                if len(self._buckets) > MAX_BUCKETS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(k)
+            return b
+
+    def call(self, fn, key_hash: str, model: str, deadline_s: float = DEADLINE_S, max_attempts: int = MAX_ATTEMPTS, retry_if=None):
+        """Llama a fn(timeout_s) respetando la cuota, reintentando con backoff hasta el deadline."""
+        b = self.bucket(key_hash, model)
+        deadline = self.clock() + deadline_s
+        attempt = 0
+        while True:
+            b.acquire(deadline)
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                raise RateLimited("Se acabó el tiempo esperando a Gemini.")
+            try:
+                return fn(remaining)
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e) or (retry_if is not None and not retry_if(e)):
+                    raise
+                hint = retry_after_s(e)
+                if hint is not None:
+                    b.penalize(self.clock() + hint)
+                    delay = hint * (1 + 0.1 * self.rng())
+                else:
+                    # Full jitter: evita que todas las sesiones reintenten a la vez.
+                    delay = self.rng() * min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2**attempt)
+                if attempt >= max_attempts or self.clock() + delay > deadline:
+                    if status_code(e) == 429:
+                        raise RateLimited("Gemini sigue saturado.", retry_after=hint) from e
+                    raise
+                self.sleep(delay)
+
+
+def status_code(e: Exception) -> int | None:
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(e: Exception) -> bool:
+    # Sin importar httpx: si no está cargado, no puede haber lanzado nada.
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(e, (httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    return status_code(e) in RETRYABLE_CODES
+
+
+_DELAY_RE = re.compile(r"^\s*([\d.]+)s\s*$")
+
+
+def retry_after_s(e: Exception) -> float | None:
+    # 1) Cabecera HTTP Retry-After (segundos).
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is not None:
+            return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    # 2) google.rpc.RetryInfo en el cuerpo del error: {"retryDelay": "34s"}.
+    details = getattr(e, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details", [])
+    for d in details if isinstance(details, list) else []:
+        if isinstance(d, dict) and "retryDelay" in d:
+            m = _DELAY_RE.match(str(d["retryDelay"]))
+            if m:
+                return float(m.group(1))
+    return None
+
+
+_default_limiter: RateLimiter | None = None
+_default_lock = threading.Lock()
+
+
+def default_limiter() -> RateLimiter:
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
@@ -0,0 +1,289 @@
+# scoring.py
+from typing import NamedTuple
+
+from lexicon import NOTE_FIELDS, notes_points, points_for
+
+# =========================
+# Tabla de pesos
+# =========================
+# (campo, etiqueta del breakdown, puntos por respuesta, puntos si la respuesta no está en la tabla)
+# Si el campo falta en date_data cuenta como "Sin responder".
+CATEGORICAL = (
+    ("trato_personal", "Trato al personal", {"Maravilloso": 0, "Correcto": 5, "Seco": 15, "Maleducado": 25, "Sin responder": 10}, 10),
+    ("control_movil_redes", "Control (móvil/redes)", {"Sí": 20, "Sin responder": 8}, 0),
+    ("respeto_limites", "Respeto de límites", {"Sí, 10/10": 0, "Más o menos": 10, "No, insistió": 25, "Sin responder": 8}, 8),
+    ("tema_exs", "Tema ex’s", {"Cero drama": 0, "Lo mencionó normal": 5, "Rant / victimismo": 10, "Comparó contigo": 15, "Sin responder": 6}, 6),
+    ("celos", "Celos", {"No": 0, "Un poco": 8, "Sí": 15, "Sin responder": 6}, 6),
+    ("insistio_sitio_aislado", "Insistió en sitio aislado", {"Sí": 25, "Sin responder": 10}, 0),
+    ("presiono_alcohol", "Presión con alcohol", {"Sí": 20, "Sin responder": 8}, 0),
+    ("love_bombing", "Love bombing", {"Sí": 15, "Sin responder": 5}, 0),
+    ("incoherencias", "Incoherencias", {"Sí": 15, "Sin responder": 6}, 0),
+)
+
+# Lo que ofrece cada selectbox del cuestionario, en el orden del widget.
+OPTIONS = {
+    "trato_personal": ("Sin responder", "Maravilloso", "Correcto", "Seco", "Maleducado"),
+    "control_movil_redes": ("Sin responder", "No", "Sí"),
+    "respeto_limites": ("Sin responder", "Sí, 10/10", "Más o menos", "No, insistió"),
+    "tema_exs": ("Sin responder", "Cero drama", "Lo mencionó normal", "Rant / victimismo", "Comparó contigo"),
+    "celos": ("Sin responder", "No", "Un poco", "Sí"),
+    "insistio_sitio_aislado": ("Sin responder", "No", "Sí"),
+    "presiono_alcohol": ("Sin responder", "No", "Sí"),
+    "love_bombing": ("Sin responder", "No", "Sí"),
+    "incoherencias": ("Sin responder", "No", "Sí"),
+}
+
+# (campo 0–10, etiqueta, peso por punto que falta hasta 10, valor si no hay respuesta)
+SLIDERS = (
+    ("me_escucho_0_10", "No escuchó / poca atención", 1.2, 5),
+    ("me_dejo_hablar_0_10", "Interrumpía / no te dejó hablar", 1.2, 5),
+    ("me_hizo_preguntas_0_10", "Cero curiosidad por ti", 1.0, 5),
+    ("compatibilidad_valores_0_10", "Valores poco alineados", 0.9, 6),
+)
+
+PHONE_FIELD = "miradas_movil"
+PHONE_LABEL = "Móvil (demasiado presente)"
+PHONE_WEIGHT = 1.2
+PHONE_CAP = 15
+
+GREEN_FIELD = "green_flags"
+GREEN_LABEL = "Green flags (resta)"
+GREEN_FLAGS = (
+    ("Pidió consentimiento / fue respetuoso", 10),
+    ("Te hizo sentir segura (plan lógico, acompañar, etc.)", 8),
+    ("Comunicación clara y amable", 7),
+)
+
+# Frases de las notas (lexicon.py): suma acotada, positiva o negativa.
+NOTES_LABEL = "Lo que contaste en las notas"
+
+# (score máximo incluido, nivel)
+LEVELS = ((20, "🟢 Verde"), (45, "🟡 Amarillo"), (70, "🟠 Naranja"), (100, "🔴 Rojo"))
+
+FIELDS = tuple(
+    [key for key, _, _, _ in CATEGORICAL] + [key for key, _, _, _ in SLIDERS] + [PHONE_FIELD, GREEN_FIELD, *NOTE_FIELDS]
+)
+LABELS = tuple(
+    [label for _, label, _, _ in CATEGORICAL] + [label for _, label, _, _ in SLIDERS] + [PHONE_LABEL, GREEN_LABEL, NOTES_LABEL]
+)
+
+
+def clamp(x, lo=0, hi=100):
+    return max(lo, min(hi, x))
+
+
+# Tablas compiladas: los puntos de cada valor posible se calculan una sola vez, con la misma
+# aritmética (round de Python incluido) que la fórmula original.
+SLIDER_TABLES = tuple(tuple(int(round((10 - x) * w)) for x in range(11)) for _, _, w, _ in SLIDERS)
+# A partir de aquí el tope ya manda (13 * 1.2 = 15.6 -> 15).
+PHONE_MAX_COUNT = next(m for m in range(1000) if m * PHONE_WEIGHT >= PHONE_CAP)
+PHONE_TABLE = tuple(int(clamp(m * PHONE_WEIGHT, 0, PHONE_CAP)) for m in range(PHONE_MAX_COUNT + 1))
+
+
+# =========================
+# Parsers de respuestas
+# =========================
+def categorical_points(weights: dict, other: int, v) -> int:
+    try:
+        return weights.get(v, other)
+    except TypeError:
+        return other
+
+
+def to_int_0_10(v, default_mid=5):
+    if v is None:
+        return default_mid
+    if isinstance(v, int):
+        return clamp(v, 0, 10)
+    s = str(v).strip()
+    if s.lower().startswith("sin"):
+        return default_mid
+    try:
+        return clamp(int(s), 0, 10)
+    except Exception:
+        return default_mid
+
+
+def phone_count(v) -> int:
+    try:
+        m = int(v)
+    except Exception:
+        m = 0
+    return clamp(m, 0, PHONE_MAX_COUNT)
+
+
+def green_bonus(greens) -> int:
+    return sum(w for flag, w in GREEN_FLAGS if flag in greens)
+
+
+def level_for(score: int) -> str:
+    for top, level in LEVELS:
+        if score <= top:
+            return level
+    return LEVELS[-1][1]
+
+
+# =========================
+# Heurística de score
+# =========================
+def compute_score(data: dict) -> tuple[int, str, dict]:
+    points = 0
+    breakdown = {}
+
+    for key, label, weights, other in CATEGORICAL:
+        p = categorical_points(weights, other, data.get(key, "Sin responder"))
+        points += p
+        breakdown[label] = p
+
+    for (key, label, _, default_mid), table in zip(SLIDERS, SLIDER_TABLES):
+        p = table[to_int_0_10(data.get(key, "Sin responder"), default_mid)]
+        points += p
+        breakdown[label] = p
+
+    p = PHONE_TABLE[phone_count(data.get(PHONE_FIELD, 0))]
+    points += p
+    breakdown[PHONE_LABEL] = p
+
+    bonus = green_bonus(data.get(GREEN_FIELD, []))
+    points -= bonus
+    breakdown[GREEN_LABEL] = -bonus
+
+    p = notes_points(data)
+    points += p
+    breakdown[NOTES_LABEL] = p
+
+    score = clamp(points, 0, 100)
+    return score, level_for(score), breakdown
+
+
+# =========================
+# Scoring por lotes
+# =========================
+class BatchScores(NamedTuple):
+    score: "np.ndarray"  # (n,) int64
+    level: "np.ndarray"  # (n,) object
+    breakdown: "np.ndarray"  # (n, len(LABELS)) int64, columnas en el orden de LABELS
+    labels: tuple
+
+
+def _column(columns, key):
+    if hasattr(columns, "columns"):
+        return columns[key] if key in columns.columns else None
+    return columns.get(key)
+
+
+def _is_blank(v) -> bool:
+    # Celda vacía de un DataFrame (la fila no traía el campo): NaN o pd.NA. Un None explícito no lo es.
+    if type(v).__name__ == "NAType":
+        return True
+    return isinstance(v, float) and v != v
+
+
+def _per_value(col, fn, n, missing):
+    # Aplica fn una vez por valor distinto y reparte el resultado con un take vectorizado.
+    # Las celdas vacías cuentan como missing, igual que un campo que falta en compute_score.
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Series(col) if not isinstance(col, pd.Series) else col
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    # factorize junta 1 y 1.0 (hash iguales), pero to_int_0_10 no los trata igual: ahí vamos uno a uno.
+    if inferred not in ("mixed", "mixed-integer-float"):
+        try:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        except TypeError:
+            pass
+        else:
+            # Código -1 (nulos): [-2] si era un None explícito, [-1] si la celda estaba vacía.
+            table = np.array([fn(u) for u in uniques] + [fn(None), fn(missing)], dtype=np.int64)
+            na = np.flatnonzero(codes < 0)
+            if len(na):
+                codes = codes.copy()
+                codes[na] = [-1 if _is_blank(values.iat[i]) else -2 for i in na]
+            return table[codes]
+    return np.fromiter((fn(missing if _is_blank(v) else v) for v in values), dtype=np.int64, count=n)
+
+
+def _int_codes(col, lo, hi):
+    import numpy as np
+
+    arr = np.asarray(col)
+    if arr.dtype.kind in "iub":
+        return np.clip(arr.astype(np.int64), lo, hi)
+    return None
+
+
+def _greens(col, n):
+    import numpy as np
+
+    arr = col if isinstance(col, np.ndarray) else None
+    if arr is not None and arr.ndim == 2 and arr.dtype.kind == "b":
+        # Matriz (n, 3) de booleanos en el orden de GREEN_FLAGS.
+        return arr.astype(np.int64) @ np.array([w for _, w in GREEN_FLAGS], dtype=np.int64)
+
+    def one(g):
+        if g is None or (isinstance(g, float) and g != g):
+            return 0
+        return green_bonus(g)
+
+    return np.fromiter((one(g) for g in col), dtype=np.int64, count=n)
+
+
+def score_batch(columns) -> BatchScores:
+    """Puntúa muchas citas de una vez: mismo resultado que compute_score fila a fila.
+
+    columns es un DataFrame o un dict campo -> array con una fila por cita. Un campo que
+    falta se trata como en compute_score (como si no estuviera en date_data).
+    """
+    import numpy as np
+
+    present = [c for c in (_column(columns, f) for f in FIELDS) if c is not None]
+    n = len(columns) if hasattr(columns, "columns") else (len(present[0]) if present else 0)
+    out = np.zeros((n, len(LABELS)), dtype=np.int64)
+    j = 0
+
+    for key, _, weights, other in CATEGORICAL:
+        col = _column(columns, key)
+        if col is None:
+            out[:, j] = categorical_points(weights, other, "Sin responder")
+        else:
+            out[:, j] = _per_value(col, lambda v, w=weights, o=other: categorical_points(w, o, v), n, "Sin responder")
+        j += 1
+
+    for (key, _, _, default_mid), table in zip(SLIDERS, SLIDER_TABLES):
+        col = _column(columns, key)
+        lookup = np.array(table, dtype=np.int64)
+        if col is None:
+            out[:, j] = table[to_int_0_10("Sin responder", default_mid)]
+        else:
+            idx = _int_codes(col, 0, 10)
+            if idx is None:
+                idx = _per_value(col, lambda v, d=default_mid: to_int_0_10(v, d), n, "Sin responder")
+            out[:, j] = lookup[idx]
+        j += 1
+
+    col = _column(columns, PHONE_FIELD)
+    if col is None:
+        out[:, j] = PHONE_TABLE[phone_count(0)]
+    else:
+        idx = _int_codes(col, 0, PHONE_MAX_COUNT)
+        if idx is None:
+            idx = _per_value(col, phone_count, n, 0)
+        out[:, j] = np.array(PHONE_TABLE, dtype=np.int64)[idx]
+    j += 1
+
+    col = _column(columns, GREEN_FIELD)
+    out[:, j] = 0 if col is None else -_greens(col, n)
+    j += 1
+
+    cols = [c for c in (_column(columns, f) for f in NOTE_FIELDS) if c is not None]
+    if cols:
+        # El mismo matcher que compute_score, fila a fila (las notas casi nunca se repiten).
+        out[:, j] = np.fromiter((points_for(texts) for texts in zip(*cols)), dtype=np.int64, count=n)
+
+    score = np.clip(out.sum(axis=1), 0, 100)
+    tops = np.array([top for top, _ in LEVELS[:-1]], dtype=np.int64)
+    names = np.array([name for _, name in LEVELS], dtype=object)
+    level = names[np.searchsorted(tops, score, side="left")]
+    return BatchScores(score, level, out, LABELS)
+
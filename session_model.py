@@ -0,0 +1,169 @@
+# session_model.py
+import os
+import sys
+from collections import deque
+
+from scoring import GREEN_FIELD, GREEN_FLAGS, LABELS, OPTIONS, PHONE_FIELD, SLIDERS
+
+# Burbujas del chat que guardamos por sesión (0 = sin tope). La ventana de render_chat va aparte.
+CHAT_HISTORY_MAX = int(os.environ.get("CHAT_HISTORY_MAX", "200"))
+
+# =========================
+# Tablas compartidas
+# =========================
+# Los widgets usan estas mismas tuplas: sus valores son objetos compartidos por todas las sesiones.
+LOCATIONS = ("Restaurante chic", "Cafetería mona", "Paseo por el parque", "Cine", "Su casa (🚩)", "Otro")
+SLIDER_OPTIONS = ("Sin responder",) + tuple(str(i) for i in range(11))
+GREENS = tuple(flag for flag, _ in GREEN_FLAGS)
+
+# Campos de respuesta cerrada: se guardan como el índice de la opción (un byte cada uno).
+CODED = tuple((key, options) for key, options in OPTIONS.items()) + tuple(
+    (key, SLIDER_OPTIONS) for key, _, _, _ in SLIDERS
+) + (("location", LOCATIONS),)
+_INDEX = tuple({option: i for i, option in enumerate(options)} for _, options in CODED)
+_GREEN_INDEX = {flag: i for i, flag in enumerate(GREENS)}
+# Campos que se guardan tal cual si son del tipo que da el widget.
+PLAIN = (("alcohol", bool), (PHONE_FIELD, int), ("nota_rara", str), ("nota_buena", str), ("person", str))
+
+_ABSENT = 255  # la clave no estaba en el dict
+_NONE = 254  # estaba, con valor None
+_EXTRA = 253  # valor fuera de la tabla: va en extra
+_MISSING = object()
+
+
+class DateData:
+    """Respuestas de un envío en formato compacto. to_dict() devuelve el mismo dict que entró."""
+
+    __slots__ = ("codes", "greens", "alcohol", PHONE_FIELD, "nota_rara", "nota_buena", "person", "extra")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DateData":
+        self = cls.__new__(cls)
+        extra = {}
+        codes = bytearray()
+        for (key, _), index in zip(CODED, _INDEX):
+            if key not in data:
+                codes.append(_ABSENT)
+                continue
+            v = data[key]
+            i = index.get(v) if type(v) is str else None
+            if v is None:
+                codes.append(_NONE)
+            elif i is None:
+                codes.append(_EXTRA)
+                extra[key] = v
+            else:
+                codes.append(i)
+        self.codes = bytes(codes)
+
+        for key, kind in PLAIN:
+            v = data.get(key, _MISSING)
+            if v is not _MISSING and type(v) is not kind:
+                extra[key] = v
+                v = _MISSING
+            setattr(self, key, v)
+
+        greens = data.get(GREEN_FIELD, _MISSING)
+        if greens is _MISSING:
+            self.greens = None
+        elif type(greens) is list and all(type(f) is str and f in _GREEN_INDEX for f in greens):
+            # Índices en el orden de selección: el orden cuenta para submission_id.
+            self.greens = bytes(_GREEN_INDEX[f] for f in greens)
+        else:
+            self.greens = None
+            extra[GREEN_FIELD] = greens
+
+        # Campos que no conocemos (p. ej. de un envío por lotes) también se conservan.
+        known = {key for key, _ in CODED} | {key for key, _ in PLAIN} | {GREEN_FIELD}
+        extra.update((k, v) for k, v in data.items() if k not in known)
+        self.extra = extra or None
+        return self
+
+    def to_dict(self) -> dict:
+        extra = self.extra or {}
+        out = {}
+        for (key, options), code in zip(CODED, self.codes):
+            if code == _ABSENT:
+                continue
+            if code == _EXTRA:
+                out[key] = extra[key]
+            else:
+                out[key] = None if code == _NONE else options[code]
+        for key, _ in PLAIN:
+            v = getattr(self, key)
+            if v is not _MISSING:
+                out[key] = v
+        if self.greens is not None:
+            out[GREEN_FIELD] = [GREENS[i] for i in self.greens]
+        out.update(extra)
+        return out
+
+    def __repr__(self):
+        return f"DateData({self.to_dict()!r})"
+
+
+# =========================
+# Breakdown
+# =========================
+def pack_breakdown(breakdown: dict):
+    # Con las claves de compute_score (en su orden) basta con los puntos: las etiquetas salen de LABELS.
+    if tuple(breakdown) == LABELS and all(type(p) is int for p in breakdown.values()):
+        return tuple(breakdown.values())
+    return breakdown
+
+
+def unpack_breakdown(packed) -> dict:
+    return dict(zip(LABELS, packed)) if isinstance(packed, tuple) else packed
+
+
+# =========================
+# Chat
+# =========================
+def cap_chat(messages: list, limit: int = CHAT_HISTORY_MAX) -> list:
+    if limit > 0 and len(messages) > limit:
+        del messages[:-limit]
+    return messages
+
+
+# =========================
+# Memoria por sesión
+# =========================
+# Lo que no cuenta para la sesión: está una vez en el proceso la usen cuantas sesiones la usen.
+_SHARED = {id(o) for o in (*LABELS, *LOCATIONS, *SLIDER_OPTIONS, *GREENS, *(o for _, opts in CODED for o in opts))}
+_CONTAINERS = (dict, list, tuple, set, frozenset, deque)
+
+
+def deep_size(obj, seen: set | None = None) -> int:
+    """Bytes de obj y de lo que cuelga de él. Objetos opacos (jobs, locks…) solo cuentan su cabecera."""
+    seen = set() if seen is None else seen
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or id(o) in _SHARED or o is None or type(o) is bool or (type(o) is int and -5 <= o <= 256):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, _CONTAINERS):
+            stack.extend(o)
+        elif isinstance(o, DateData):
+            stack.extend(getattr(o, s) for s in DateData.__slots__ if getattr(o, s) is not _MISSING)
+        elif type(o).__module__ == "telemetry" and hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return total
+
+
+def memory_report(state) -> list[tuple[str, int]]:
+    """(clave, bytes) de cada entrada del session_state, de mayor a menor. Lo compartido no suma."""
+    seen: set = set()
+    sizes = [(str(k), deep_size(v, seen)) for k, v in list(state.items())]
+    return sorted(sizes, key=lambda kv: kv[1], reverse=True)
+
+
+def format_memory(report: list[tuple[str, int]]) -> str:
+    total = sum(n for _, n in report)
+    lines = [f"{'total':<28} {total / 1024:9.1f} KiB"]
+    lines += [f"{k:<28} {n / 1024:9.1f} KiB" for k, n in report]
+    return "\n".join(lines)
@@ -0,0 +1,340 @@
+# telemetry.py
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import NamedTuple
+
+# Apagado por defecto: sin TELEMETRY=1, span() devuelve un objeto vacío compartido y count() sale al momento.
+ENABLED = os.environ.get("TELEMETRY", "0") == "1"
+# Panel en el sidebar con los spans de la sesión (solo si además ENABLED).
+DEBUG_PANEL = ENABLED and os.environ.get("TELEMETRY_DEBUG", "0") == "1"
+EXPORT = os.environ.get("TELEMETRY_EXPORT", "jsonl")  # jsonl | prometheus | both | none
+JSONL_PATH = os.environ.get("TELEMETRY_JSONL_PATH", os.path.join(".cache", "telemetry.jsonl"))
+JSONL_MAX_BYTES = int(os.environ.get("TELEMETRY_JSONL_MAX_BYTES", str(10 * 1024 * 1024)))
+JSONL_BACKUPS = int(os.environ.get("TELEMETRY_JSONL_BACKUPS", "5"))
+METRICS_EVERY_S = float(os.environ.get("TELEMETRY_METRICS_EVERY_S", "60"))
+PROM_HOST = os.environ.get("TELEMETRY_HOST", "127.0.0.1")
+PROM_PORT = int(os.environ.get("TELEMETRY_PORT", "9464"))
+SESSION_SPANS = 300
+PREFIX = "rfd_"
+
+BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+log = logging.getLogger(__name__)
+
+
+class SpanRecord(NamedTuple):
+    name: str
+    ms: float
+    rerun: int  # el rerun que lo lanzó (también para los spans de hilos de fondo)
+    ts: float
+
+
+class SessionTrace:
+    """Spans recientes de una sesión. Vive en st.session_state; los hilos de fondo escriben en la misma deque."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:8]
+        self.spans: deque[SpanRecord] = deque(maxlen=SESSION_SPANS)
+        self.reruns = 0
+
+
+# =========================
+# Métricas (proceso)
+# =========================
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = {}
+_hists: dict[tuple[str, tuple], list] = {}  # [bucket_counts..., +Inf], sum, count
+
+
+def count(metric: str, value: float = 1, **labels):
+    if not ENABLED:
+        return
+    k = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def observe(metric: str, seconds: float, **labels):
+    if not ENABLED:
+        return
+    k = (metric, tuple(sorted(labels.items())))
+    i = bisect_left(BUCKETS_S, seconds)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = [[0] * (len(BUCKETS_S) + 1), 0.0, 0]
+        h[0][i] += 1
+        h[1] += seconds
+        h[2] += 1
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = {_series(n, ls): v for (n, ls), v in _counters.items()}
+        hists = {_series(n, ls): {"sum": h[1], "count": h[2]} for (n, ls), h in _hists.items()}
+    return {"counters": counters, "histograms": hists}
+
+
+def _series(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        hists = sorted((k, (list(h[0]), h[1], h[2])) for k, h in _hists.items())
+    typed = set()
+    for (name, labels), v in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{_series(name, labels)} {v:g}")
+    for (name, labels), (buckets, total, n) in hists:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+        acc = 0
+        for le, c in zip(list(BUCKETS_S) + ["+Inf"], buckets):
+            acc += c
+            lines.append(f"{PREFIX}{_series(name + '_bucket', labels + (('le', le),))} {acc}")
+        lines.append(f"{PREFIX}{_series(name + '_sum', labels)} {total:.6f}")
+        lines.append(f"{PREFIX}{_series(name + '_count', labels)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# Spans
+# =========================
+_local = threading.local()
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.t0
+        observe("span_seconds", elapsed, name=self.name)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.spans.append(SpanRecord(self.name, elapsed * 1000, _local.rerun, time.time()))
+        return False
+
+
+def span(name: str):
+    return _Span(name) if ENABLED else _NOOP
+
+
+def current():
+    """Contexto a pasar a un hilo de fondo para que sus spans acaben en la sesión que lo lanzó."""
+    if not ENABLED:
+        return None
+    trace = getattr(_local, "trace", None)
+    return None if trace is None else (trace, _local.rerun)
+
+
+class _Bound:
+    __slots__ = ("ctx", "prev")
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def __enter__(self):
+        self.prev = (getattr(_local, "trace", None), getattr(_local, "rerun", -1))
+        _local.trace, _local.rerun = self.ctx
+        return self
+
+    def __exit__(self, *exc):
+        _local.trace, _local.rerun = self.prev
+        return False
+
+
+def bound(ctx):
+    return _Bound(ctx) if ctx is not None else _NOOP
+
+
+# =========================
+# Reruns
+# =========================
+def begin_rerun(state) -> SessionTrace | None:
+    """Llamar al principio de app.py con st.session_state."""
+    if not ENABLED:
+        return None
+    _ensure_exporters()
+    trace = state.get("telemetry")
+    if trace is None:
+        trace = state["telemetry"] = SessionTrace()
+    trace.reruns += 1
+    _local.trace, _local.rerun = trace, trace.reruns
+    _local.t0 = time.perf_counter()
+    return trace
+
+
+def end_rerun(page: str, fragment: str | None = None):
+    trace = getattr(_local, "trace", None) if ENABLED else None
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - _local.t0
+    rerun = _local.rerun
+    if fragment is None:
+        observe("rerun_seconds", elapsed, page=page)
+        count("reruns_total", page=page)
+    else:
+        observe("fragment_rerun_seconds", elapsed, fragment=fragment)
+        count("fragment_reruns_total", fragment=fragment)
+        # La raíz del rerun: sin ella, en format_spans no se sabría qué fragmento fue.
+        trace.spans.append(SpanRecord(f"fragment:{fragment}", elapsed * 1000, rerun, time.time()))
+    _local.trace = None
+    if _writer is not None:
+        spans = [(s.name, round(s.ms, 3)) for s in trace.spans if s.rerun == rerun]
+        rec = {"type": "rerun", "ts": time.time(), "session": trace.id, "rerun": rerun, "page": page, "ms": round(elapsed * 1000, 3), "spans": spans}
+        if fragment is not None:
+            rec["fragment"] = fragment
+        _writer.put(rec)
+
+
+class _Fragment:
+    __slots__ = ("state", "name", "trace")
+
+    def __init__(self, state, name: str):
+        self.state = state
+        self.name = name
+
+    def __enter__(self):
+        # Dentro de un rerun completo el fragmento ya va en su traza; solo abrimos una si corre él solo.
+        self.trace = begin_rerun(self.state) if getattr(_local, "trace", None) is None else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            end_rerun(self.state.get("page", "?"), fragment=self.name)
+        return False
+
+
+def fragment(state, name: str):
+    """Envuelve el cuerpo de un @st.fragment: sus reruns no pasan por begin_rerun/end_rerun de app.py."""
+    return _Fragment(state, name) if ENABLED else _NOOP
+
+
+def format_spans(trace: SessionTrace | None, reruns: int = 5) -> str:
+    if trace is None:
+        return "Telemetría apagada (TELEMETRY=1)."
+    spans = list(trace.spans)
+    keep = sorted({s.rerun for s in spans if s.rerun > 0})[-reruns:]
+    lines = [f"sesión {trace.id} · {trace.reruns} reruns"]
+    for r in reversed(keep):
+        lines.append(f"\n# rerun {r}")
+        lines += [f"{s.name:<24} {s.ms:9.2f} ms" for s in spans if s.rerun == r]
+    return "\n".join(lines)
+
+
+# =========================
+# Exportadores
+# =========================
+_writer: "queue.SimpleQueue | None" = None
+_exporters_lock = threading.Lock()
+_exporters_started = False
+
+
+def _ensure_exporters():
+    global _exporters_started, _writer
+    if _exporters_started:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if EXPORT in ("jsonl", "both"):
+            _writer = queue.SimpleQueue()
+            threading.Thread(target=_jsonl_loop, args=(_writer,), name="telemetry-jsonl", daemon=True).start()
+        if EXPORT in ("prometheus", "both"):
+            _start_prometheus()
+
+
+def event(kind: str, **fields):
+    """Un registro suelto al JSONL (p. ej. los tokens de cada llamada a Gemini)."""
+    if not ENABLED:
+        return
+    _ensure_exporters()
+    if _writer is not None:
+        _writer.put({"type": kind, "ts": time.time(), **fields})
+
+
+def _jsonl_loop(q: "queue.SimpleQueue"):
+    # La escritura a disco va en su hilo: el rerun solo encola.
+    os.makedirs(os.path.dirname(JSONL_PATH) or ".", exist_ok=True)
+    handler = RotatingFileHandler(JSONL_PATH, maxBytes=JSONL_MAX_BYTES, backupCount=JSONL_BACKUPS, encoding="utf-8")
+    last_metrics = time.monotonic()
+    while True:
+        try:
+            item = q.get(timeout=METRICS_EVERY_S)
+        except queue.Empty:
+            item = None
+        now = time.monotonic()
+        records = [item] if item is not None else []
+        if now - last_metrics >= METRICS_EVERY_S:
+            last_metrics = now
+            records.append({"type": "metrics", "ts": time.time(), **snapshot()})
+        for rec in records:
+            handler.emit(logging.makeLogRecord({"msg": json.dumps(rec, ensure_ascii=False)}))
+
+
+def _start_prometheus():
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((PROM_HOST, PROM_PORT), Handler)
+    except OSError as e:
+        # Con varios workers solo el primero se queda el puerto.
+        log.warning("No se pudo abrir /metrics en %s:%s (%s)", PROM_HOST, PROM_PORT, e)
+        return
+    threading.Thread(target=server.serve_forever, name="telemetry-prometheus", daemon=True).start()
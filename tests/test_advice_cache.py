@@ -0,0 +1,18 @@
+# tests/test_advice_cache.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advice_cache import AdviceCache  # noqa: E402
+
+
+def test_path_from_env_at_construction(tmp_path, monkeypatch):
+    # Sin path, ADVICE_CACHE_PATH se lee al crearla (no al importar el módulo).
+    path = str(tmp_path / "sub" / "advice.sqlite3")
+    monkeypatch.setenv("ADVICE_CACHE_PATH", path)
+    cache = AdviceCache()
+    assert cache.path == path
+    cache.put("k", "consejo")
+    assert cache.get("k") == "consejo"
+    assert os.path.exists(path)
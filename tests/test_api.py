@@ -0,0 +1,171 @@
+# tests/test_api.py
+# La API en dry-run: validación (422/400/413) y los caminos del consejo sin llamar a Gemini.
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("starlette")
+pytest.importorskip("httpx")
+
+# api.py lee la configuración al importarse.
+os.environ["API_DRY_RUN"] = "1"
+os.environ["API_FAKE_LATENCY_MS"] = "0"
+os.environ.setdefault("API_DRY_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="rfd-test-api-"), "advice.sqlite3"))
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import advice  # noqa: E402
+import api  # noqa: E402
+from ratelimit import RateLimited  # noqa: E402
+from scoring import compute_score  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with TestClient(api.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("value", [[1], {"a": 1}, [], {}])
+def test_slider_unhashable_is_422(client, value):
+    r = client.post("/v1/score", json={"me_escucho_0_10": value})
+    assert r.status_code == 422
+    assert r.json()["errors"][0]["field"] == "me_escucho_0_10"
+
+
+@pytest.mark.parametrize("field, value", [("location", ["Cine"]), ("location", {"x": 1}), ("trato_personal", ["Bien"])])
+def test_choice_unhashable_is_422(client, field, value):
+    r = client.post("/v1/score", json={field: value})
+    assert r.status_code == 422
+    assert r.json()["errors"][0]["field"] == field
+
+
+def test_slider_accepts_int_and_string(client):
+    assert client.post("/v1/score", json={"me_escucho_0_10": 7}).status_code == 200
+    assert client.post("/v1/score", json={"me_escucho_0_10": "Sin responder"}).status_code == 200
+
+
+def test_unknown_field_and_bad_json(client):
+    r = client.post("/v1/score", json={"celos": "Sí", "horoscopo": "Aries"})
+    assert r.status_code == 422
+    assert r.json()["errors"] == [{"field": "horoscopo", "error": "campo desconocido"}]
+    r = client.post("/v1/score", content=b"{no es json", headers={"content-type": "application/json"})
+    assert r.status_code == 400
+
+
+def test_batch(client, monkeypatch):
+    r = client.post("/v1/score/batch", json={"items": [{"id": "a", "celos": "Sí"}, {"id": 2}]})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [res["id"] for res in results] == ["a", 2]
+    score, level, _ = compute_score({"id": "a", "celos": "Sí"})
+    assert (results[0]["score"], results[0]["level"]) == (score, level)
+
+    r = client.post("/v1/score/batch", json={"items": [{}, {"celos": ["Sí"]}]})
+    assert r.status_code == 422
+    assert r.json()["errors"][0]["index"] == 1
+
+    assert client.post("/v1/score/batch", json={"items": "todo"}).status_code == 422
+    monkeypatch.setattr(api, "BATCH_MAX", 2)
+    assert client.post("/v1/score/batch", json={"items": [{}, {}, {}]}).status_code == 413
+
+
+def test_advice_dry_run_then_cache(client):
+    body = {"celos": "Sí", "nota_rara": "test_advice_dry_run_then_cache"}
+    first = client.post("/v1/advice", json=body).json()
+    assert first["source"] == "gemini"
+    assert first["advice"].startswith("[dry-run]")
+    again = client.post("/v1/advice", json=body).json()
+    assert (again["source"], again["advice"]) == ("cache", first["advice"])
+    # Nunca en la caché compartida.
+    assert api._cache().path == os.environ["API_DRY_CACHE_PATH"]
+
+
+def test_advice_stream(client):
+    r = client.post("/v1/advice/stream", json={"alcohol": True, "nota_rara": "test_advice_stream"})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert "score" in lines[0] and "level" in lines[0]
+    chunks = [line["chunk"] for line in lines[1:-1]]
+    assert len(chunks) > 1
+    assert lines[-1]["done"] and lines[-1]["source"] == "gemini"
+    assert "".join(chunks).strip() == lines[-1]["advice"]
+
+
+def test_rate_limited_falls_back_to_local_advice(client, monkeypatch):
+    def throttled(_key, _prompt, on_chunk=None):
+        raise RateLimited("sin cuota", retry_after=30)
+
+    monkeypatch.setattr(api, "GENERATE", throttled)
+    r = client.post("/v1/advice", json={"nota_rara": "test_rate_limited"})
+    assert r.status_code == 200
+    assert r.json()["source"] == "fallback_ratelimit"
+    assert not r.json()["advice"].startswith("[dry-run]")
+
+
+def test_busy_llm_falls_back_without_waiting(client, monkeypatch):
+    monkeypatch.setattr(api, "_llm_slots", asyncio.Semaphore(0))
+    monkeypatch.setattr(api, "LLM_QUEUE_S", 0.01)
+    r = client.post("/v1/advice", json={"nota_rara": "test_busy"})
+    assert r.json()["source"] == "fallback_busy"
+    lines = client.post("/v1/advice/stream", json={"nota_rara": "test_busy"}).text.splitlines()
+    assert json.loads(lines[-1])["source"] == "fallback_busy"
+
+
+def test_missing_api_key_is_401(client, monkeypatch):
+    monkeypatch.setattr(api, "DRY_RUN", False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    r = client.post("/v1/advice", json={})
+    assert r.status_code == 401
+
+
+def test_slot_is_held_until_the_llm_call_finishes(client, monkeypatch):
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow(_key, _prompt, on_chunk=None):
+        release.wait(10)
+        finished.set()
+        return "consejo lento"
+
+    monkeypatch.setattr(api, "GENERATE", slow)
+    monkeypatch.setattr(api, "_llm_slots", asyncio.Semaphore(1))
+    monkeypatch.setattr(api, "LLM_QUEUE_S", 0.05)
+    monkeypatch.setattr(api, "ADVICE_TIMEOUT_S", 0.05)
+
+    assert client.post("/v1/advice", json={"nota_rara": "test_slot_1"}).json()["source"] == "fallback_timeout"
+    # La llamada sigue en vuelo: el único hueco no se ha soltado con la respuesta.
+    assert client.post("/v1/advice", json={"nota_rara": "test_slot_2"}).json()["source"] == "fallback_busy"
+
+    release.set()
+    assert finished.wait(5)
+    deadline = time.monotonic() + 5
+    while api._llm_slots.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    monkeypatch.setattr(api, "ADVICE_TIMEOUT_S", 5)
+    assert client.post("/v1/advice", json={"nota_rara": "test_slot_3"}).json()["source"] == "gemini"
+
+
+def test_plain_advice_does_not_stream_from_the_llm(client, monkeypatch):
+    seen = []
+
+    def generate(_key, _prompt, on_chunk=None):
+        seen.append(on_chunk)
+        if on_chunk is not None:
+            on_chunk("consejo ")
+        return "consejo"
+
+    monkeypatch.setattr(api, "GENERATE", generate)
+    monkeypatch.setattr(advice, "STREAM_ADVICE", True)
+    assert client.post("/v1/advice", json={"nota_rara": "test_plain_1"}).json()["source"] == "gemini"
+    client.post("/v1/advice/stream", json={"nota_rara": "test_plain_2"})
+    assert seen[0] is None
+    assert seen[1] is not None
@@ -0,0 +1,138 @@
+# tests/test_batch.py
+# Checkpoint y --resume de batch.py, con un consejero falso (sin Gemini ni red).
+import argparse
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch  # noqa: E402
+from breaker import CircuitOpen  # noqa: E402
+from ratelimit import RateLimited  # noqa: E402
+
+
+def write_input(path, n: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": i, "celos": "Sí" if i % 2 else "No"}) + "\n")
+
+
+def make_args(tmp_path, resume=False, advice=False, chunk_size=10) -> argparse.Namespace:
+    return argparse.Namespace(
+        input=str(tmp_path / "in.jsonl"),
+        output=str(tmp_path / "out.jsonl"),
+        workers=1,
+        chunk_size=chunk_size,
+        resume=resume,
+        advice=advice,
+        concurrency=2,
+        api_key=None,
+        deadline_s=5,
+        dry_run=False,
+        fake_latency_ms=0,
+    )
+
+
+def read_rows(path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def fake_advisor(failing: set):
+    calls = []
+
+    def make(args):
+        def advise(data, score, level, breakdown):
+            calls.append(data["id"])
+            if data["id"] in failing:
+                raise RateLimited("sin cuota")
+            return f"consejo {data['id']}", "gemini"
+
+        return advise
+
+    return make, calls
+
+
+def test_resume_discards_partial_output(tmp_path):
+    write_input(tmp_path / "in.jsonl", 25)
+    report = batch.run(make_args(tmp_path))
+    assert report["records"] == 25
+    full = (tmp_path / "out.jsonl").read_bytes()
+
+    # Un corte a mitad: el checkpoint dice 20 filas y detrás queda una línea a medias.
+    rows = full.split(b"\n")
+    head = b"\n".join(rows[:20]) + b"\n"
+    (tmp_path / "out.jsonl").write_bytes(head + rows[20][:7])
+    batch.save_checkpoint(str(tmp_path / "out.jsonl.ckpt"), str(tmp_path / "in.jsonl"), 20, len(head))
+
+    report = batch.run(make_args(tmp_path, resume=True))
+    assert report["resumed_from"] == 20
+    assert report["records"] == 5
+    assert (tmp_path / "out.jsonl").read_bytes() == full
+
+
+def test_checkpoint_of_another_input_is_rejected(tmp_path):
+    write_input(tmp_path / "in.jsonl", 3)
+    batch.save_checkpoint(str(tmp_path / "out.jsonl.ckpt"), str(tmp_path / "otro.jsonl"), 1, 0)
+    with pytest.raises(SystemExit):
+        batch.run(make_args(tmp_path, resume=True))
+
+
+def test_transient_advice_errors_are_retried_on_resume(tmp_path, monkeypatch):
+    write_input(tmp_path / "in.jsonl", 25)
+    failing = {7, 18}
+    make, calls = fake_advisor(failing)
+    monkeypatch.setattr(batch, "make_advisor", make)
+
+    report = batch.run(make_args(tmp_path, advice=True))
+    assert report["advice_errors"] == 2
+    assert report["advice_retry_from"] == 7
+    with open(tmp_path / "out.jsonl.ckpt", encoding="utf-8") as f:
+        assert json.load(f)["records_done"] == 7
+    assert read_rows(tmp_path / "out.jsonl")[7]["advice_source"] == "error:RateLimited"
+
+    # Vuelve la cuota: --resume rehace desde la fila 7 y el fichero acaba entero y en orden.
+    failing.clear()
+    calls.clear()
+    report = batch.run(make_args(tmp_path, resume=True, advice=True))
+    assert report["resumed_from"] == 7
+    assert "advice_retry_from" not in report
+    assert calls[0] == 7 and len(calls) == 18
+    rows = read_rows(tmp_path / "out.jsonl")
+    assert [r["n"] for r in rows] == list(range(25))
+    assert {r["advice_source"] for r in rows} == {"gemini"}
+
+
+def test_permanent_advice_errors_do_not_hold_the_checkpoint(tmp_path, monkeypatch):
+    write_input(tmp_path / "in.jsonl", 15)
+
+    def make(args):
+        def advise(data, score, level, breakdown):
+            if data["id"] == 3:
+                raise ValueError("no es cosa de cuota")
+            return "ok", "gemini"
+
+        return advise
+
+    monkeypatch.setattr(batch, "make_advisor", make)
+    report = batch.run(make_args(tmp_path, advice=True))
+    assert report["advice_errors"] == 1
+    assert "advice_retry_from" not in report
+    with open(tmp_path / "out.jsonl.ckpt", encoding="utf-8") as f:
+        assert json.load(f)["records_done"] == 15
+
+
+def test_is_transient():
+    class HTTPError(Exception):
+        def __init__(self, code):
+            self.code = code
+
+    assert batch.is_transient(RateLimited("x"))
+    assert batch.is_transient(CircuitOpen(3))
+    assert batch.is_transient(TimeoutError())
+    assert batch.is_transient(HTTPError(503))
+    assert not batch.is_transient(HTTPError(400))
+    assert not batch.is_transient(ValueError())
@@ -0,0 +1,127 @@
+# tests/test_breaker.py
+# closed → open → half-open → closed con un reloj falso y FakeGemini fallando a demanda.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen  # noqa: E402
+from fake_gemini import FakeAPIError, FakeGemini, Latency  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def setup():
+    clock = Clock()
+    fake = FakeGemini(latency=Latency(mean=0.0), sleep=lambda s: None, seed=1)
+    breaker = CircuitBreaker(failure_threshold=3, reset_s=30, clock=clock)
+    client = fake.client("k")
+
+    def call():
+        return breaker.call(lambda: client.models.generate_content(model="m", contents="hola").text)
+
+    return clock, fake, breaker, call
+
+
+def trip(fake, breaker, call):
+    fake.error_rate = 1.0
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(FakeAPIError):
+            call()
+
+
+def test_opens_after_consecutive_failures(setup):
+    clock, fake, breaker, call = setup
+    trip(fake, breaker, call)
+    assert breaker.state == OPEN
+    calls = fake.stats()["calls"]
+    with pytest.raises(CircuitOpen) as e:
+        call()
+    # Abierto: ni siquiera llega a Gemini.
+    assert fake.stats()["calls"] == calls
+    assert e.value.retry_in == pytest.approx(30)
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_the_failure_count(setup):
+    clock, fake, breaker, call = setup
+    fake.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(FakeAPIError):
+            call()
+    fake.error_rate = 0.0
+    call()
+    fake.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(FakeAPIError):
+            call()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_on_success(setup):
+    clock, fake, breaker, call = setup
+    trip(fake, breaker, call)
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+
+    fake.error_rate = 0.0
+    assert call()
+    assert breaker.state == CLOSED
+    assert breaker.stats() == {"state": CLOSED, "consecutive_failures": 0, "trips": 1, "rejected": 0}
+
+
+def test_half_open_probe_reopens_on_failure(setup):
+    clock, fake, breaker, call = setup
+    trip(fake, breaker, call)
+    clock.now += 30
+    with pytest.raises(FakeAPIError):
+        call()
+    # Una sola prueba fallida basta para volver a abrir, con el reloj a cero.
+    assert breaker.state == OPEN
+    assert breaker.stats()["trips"] == 2
+    clock.now += 29
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_lets_one_probe_at_a_time(setup):
+    clock, fake, breaker, call = setup
+    trip(fake, breaker, call)
+    clock.now += 30
+    fake.error_rate = 0.0
+    inner = []
+
+    def probe():
+        # Mientras la prueba está en vuelo, las demás llamadas se rechazan.
+        with pytest.raises(CircuitOpen):
+            call()
+        inner.append(1)
+        return "ok"
+
+    assert breaker.call(probe) == "ok"
+    assert inner == [1]
+    assert breaker.state == CLOSED
+
+
+def test_ignored_errors_do_not_count():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, clock=clock, is_failure=lambda e: e.code != 429)
+
+    def throttled():
+        raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+
+    with pytest.raises(FakeAPIError):
+        breaker.call(throttled)
+    assert breaker.state == CLOSED
@@ -0,0 +1,35 @@
+# tests/test_history.py
+# El hilo escritor del histórico: un lote que falla se descarta entero y el hilo sigue vivo.
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import History  # noqa: E402
+
+
+def test_writer_survives_a_failing_batch(tmp_path, caplog):
+    h = History(path=str(tmp_path / "history.sqlite3"), batch=1, flush_s=0.01)
+    try:
+        assert h.record("a", {"person": "Dani"}, 50, "🟡 Amarillo", {"Celos": 8}, owner="o")
+        assert h.flush(5)
+        rollups = h.rollups()
+
+        # Una tendencia corrupta en people hace fallar _update_people a mitad del lote.
+        h._conn().execute("UPDATE people SET trend = '{roto'")
+        with caplog.at_level(logging.ERROR, logger="history"):
+            h.record("b", {"person": "Dani"}, 60, "🟡 Amarillo", {"Celos": 15}, owner="o")
+            assert h.flush(5)
+        assert "se descarta un lote" in caplog.text
+        # Rollback completo: ni la fila ni los rollups del lote fallido.
+        assert h.rollups() == rollups
+        assert [r[0] for r in h._conn().execute("SELECT submission_id FROM submissions")] == ["a"]
+
+        h.record("c", {}, 10, "🟢 Verde", {"Celos": 0})
+        assert h.flush(5)
+        assert h._thread.is_alive()
+        stats = h.stats()
+        assert (stats["written"], stats["dropped"], stats["pending"], stats["rows"]) == (2, 1, 0, 2)
+    finally:
+        h.close()
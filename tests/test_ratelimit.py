@@ -0,0 +1,132 @@
+# tests/test_ratelimit.py
+# Cubo de tokens y reintentos con reloj y sleep falsos: nada espera de verdad.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_gemini import FakeAPIError, FakeGemini, Latency  # noqa: E402
+from ratelimit import RateLimited, RateLimiter, TokenBucket, retry_after_s  # noqa: E402
+
+
+class Clock:
+    """Reloj que solo avanza cuando alguien 'duerme'."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, s: float):
+        self.sleeps.append(s)
+        self.now += s
+
+
+class Headers(dict):
+    def get(self, k, default=None):
+        return super().get(k.lower(), default)
+
+
+class HTTPError(Exception):
+    def __init__(self, code: int, retry_after: str):
+        self.code = code
+        self.response = type("R", (), {"status_code": code, "headers": Headers({"retry-after": retry_after})})()
+
+
+def test_bucket_burst_then_refill():
+    clock = Clock()
+    b = TokenBucket(rate_per_s=1.0, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        b.acquire(deadline=clock.now + 10)
+    assert clock.sleeps == []
+    # Sin tokens: espera lo que tarda en rellenarse uno.
+    b.acquire(deadline=clock.now + 10)
+    assert clock.sleeps == [pytest.approx(1.0)]
+    # Tras 2 s parado rellena 2 (nunca más que el burst).
+    clock.now += 2
+    b.acquire(deadline=clock.now + 10)
+    b.acquire(deadline=clock.now + 10)
+    assert len(clock.sleeps) == 1
+    clock.now += 100
+    for _ in range(3):
+        b.acquire(deadline=clock.now + 10)
+    assert len(clock.sleeps) == 1
+
+
+def test_bucket_rejects_past_deadline_and_full_queue():
+    clock = Clock()
+    b = TokenBucket(rate_per_s=0.1, burst=1, clock=clock, sleep=clock.sleep)
+    b.acquire(deadline=clock.now + 1)
+    with pytest.raises(RateLimited) as e:
+        b.acquire(deadline=clock.now + 1)
+    assert e.value.retry_after == pytest.approx(10.0)
+
+    b = TokenBucket(rate_per_s=1.0, burst=1, max_waiters=0, clock=clock, sleep=clock.sleep)
+    b.acquire(deadline=clock.now + 1)
+    with pytest.raises(RateLimited, match="esperando"):
+        b.acquire(deadline=clock.now + 100)
+
+
+def test_retry_after_header():
+    assert retry_after_s(HTTPError(429, "7")) == 7.0
+    assert retry_after_s(HTTPError(429, "-3")) == 0.0
+    assert retry_after_s(HTTPError(429, "mañana")) is None
+
+
+def test_retry_info_details():
+    assert retry_after_s(FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_delay_s=34)) == 34.0
+    assert retry_after_s(FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_delay_s=0.5)) == 0.5
+    assert retry_after_s(FakeAPIError(503, "UNAVAILABLE")) is None
+    # El cuerpo JSON tal cual: {"error": {"details": [...]}}.
+    e = FakeAPIError(429, "RESOURCE_EXHAUSTED")
+    e.details = {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12s"}]}}
+    assert retry_after_s(e) == 12.0
+
+
+def test_retry_after_penalizes_the_bucket():
+    clock = Clock()
+    limiter = RateLimiter(rpm=600, burst=10, clock=clock, sleep=clock.sleep, rng=lambda: 0.0)
+    calls = []
+
+    def fn(timeout_s):
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_delay_s=5)
+        return "ok"
+
+    assert limiter.call(fn, "k", "m", deadline_s=30) == "ok"
+    assert calls[1] - calls[0] >= 5
+
+
+def test_rate_limited_after_deadline():
+    clock = Clock()
+    fake = FakeGemini(latency=Latency(mean=0.0), rate_429=1.0, retry_after_s=4, sleep=clock.sleep, seed=1)
+    limiter = RateLimiter(rpm=600, burst=10, clock=clock, sleep=clock.sleep, rng=lambda: 0.0)
+    client = fake.client("k")
+
+    with pytest.raises(RateLimited) as e:
+        limiter.call(lambda t: client.models.generate_content(model="m", contents="hola"), "k", "m", deadline_s=10)
+    assert e.value.retry_after == 4.0
+    # Reintenta mientras cabe en el deadline y no más.
+    assert fake.stats()["throttled"] == 3
+    assert clock.now - 1000.0 <= 10
+
+
+def test_non_retryable_error_is_not_retried():
+    clock = Clock()
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    calls = []
+
+    def fn(timeout_s):
+        calls.append(1)
+        raise FakeAPIError(400, "INVALID_ARGUMENT")
+
+    with pytest.raises(FakeAPIError):
+        limiter.call(fn, "k", "m")
+    assert len(calls) == 1
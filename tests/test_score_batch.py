@@ -0,0 +1,63 @@
+# tests/test_score_batch.py
+# score_batch tiene que dar exactamente lo mismo que compute_score fila a fila (el oráculo).
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pd = pytest.importorskip("pandas")
+
+from scoring import CATEGORICAL, GREEN_FIELD, GREEN_FLAGS, LABELS, OPTIONS, PHONE_FIELD, SLIDERS, compute_score, score_batch  # noqa: E402
+
+NOTES = ["", "me controló el móvil", "fue muy respetuoso y me escuchó", "no me presionó nada", "me dio miedo"]
+SLIDER_VALUES = ["Sin responder"] + [str(i) for i in range(11)]
+
+
+def random_row(rng: random.Random, drop: float) -> dict:
+    row = {key: rng.choice(OPTIONS[key]) for key, _, _, _ in CATEGORICAL}
+    row.update({key: rng.choice(SLIDER_VALUES) for key, _, _, _ in SLIDERS})
+    row[PHONE_FIELD] = rng.randint(0, 30)
+    row[GREEN_FIELD] = [g for g, _ in GREEN_FLAGS if rng.random() < 0.4]
+    row["nota_rara"] = rng.choice(NOTES)
+    row["nota_buena"] = rng.choice(NOTES)
+    # Campos que no vienen: en el DataFrame quedan como celdas vacías (NaN).
+    return {k: v for k, v in row.items() if rng.random() >= drop}
+
+
+def assert_matches_oracle(rows: list[dict], frame):
+    batch = score_batch(frame)
+    for i, row in enumerate(rows):
+        score, level, breakdown = compute_score(row)
+        assert int(batch.score[i]) == score, (i, row)
+        assert batch.level[i] == level, (i, row)
+        assert [int(x) for x in batch.breakdown[i]] == [breakdown[label] for label in LABELS], (i, row)
+
+
+@pytest.mark.parametrize("drop", [0.0, 0.3])
+def test_random_rows_match_compute_score(drop):
+    rng = random.Random(1234)
+    rows = [random_row(rng, drop) for _ in range(500)]
+    assert_matches_oracle(rows, pd.DataFrame(rows))
+
+
+def test_missing_fields_count_as_sin_responder():
+    rows = [
+        {"trato_personal": "Correcto", "celos": "No"},
+        {"trato_personal": "Correcto", "celos": "No", "control_movil_redes": "No", "me_escucho_0_10": "10"},
+    ]
+    assert_matches_oracle(rows, pd.DataFrame(rows))
+
+
+def test_column_missing_everywhere():
+    rows = [{"trato_personal": "Seco"}, {"trato_personal": "Maravilloso"}]
+    assert_matches_oracle(rows, pd.DataFrame(rows))
+
+
+def test_dict_of_columns():
+    rng = random.Random(7)
+    rows = [random_row(rng, 0.0) for _ in range(50)]
+    columns = {key: [row[key] for row in rows] for key in rows[0]}
+    assert_matches_oracle(rows, columns)
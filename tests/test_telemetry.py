@@ -0,0 +1,67 @@
+# tests/test_telemetry.py
+# Spans de los reruns de un fragmento solo (sin begin_rerun de app.py).
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(telemetry, "ENABLED", True)
+    monkeypatch.setattr(telemetry, "_exporters_started", True)
+    monkeypatch.setattr(telemetry, "_writer", None)
+
+
+def names(trace, rerun):
+    return [s.name for s in trace.spans if s.rerun == rerun]
+
+
+def test_fragment_rerun_gets_its_own_trace():
+    state = {"page": "cuestionario"}
+    with telemetry.fragment(state, "questionnaire_context"):
+        with telemetry.span("render_chat"):
+            pass
+    trace = state["telemetry"]
+    assert trace.reruns == 1
+    assert names(trace, 1) == ["render_chat", "fragment:questionnaire_context"]
+    # Cerrado: lo que venga después no se cuelga de este rerun.
+    assert telemetry.current() is None
+    assert "fragment_rerun_seconds{fragment=\"questionnaire_context\"}" in telemetry.snapshot()["histograms"]
+
+
+def test_fragment_inside_a_full_rerun_uses_that_rerun():
+    state = {}
+    telemetry.begin_rerun(state)
+    with telemetry.fragment(state, "verdict_reroll"):
+        with telemetry.span("reroll"):
+            pass
+    telemetry.end_rerun("veredicto")
+    trace = state["telemetry"]
+    assert trace.reruns == 1
+    assert names(trace, 1) == ["reroll"]
+
+
+def test_fragment_closes_its_trace_on_rerun_exception():
+    state = {}
+
+    class Rerun(Exception):
+        pass
+
+    with pytest.raises(Rerun):
+        with telemetry.fragment(state, "questionnaire_seguridad"):
+            raise Rerun()
+    assert telemetry.current() is None
+    assert names(state["telemetry"], 1) == ["fragment:questionnaire_seguridad"]
+
+
+def test_disabled_is_a_noop(monkeypatch):
+    monkeypatch.setattr(telemetry, "ENABLED", False)
+    state = {}
+    with telemetry.fragment(state, "x"):
+        pass
+    assert state == {}
@@ -0,0 +1,107 @@
+# tests/test_whatsapp.py
+# El parser de chats exportados y las respuestas que se deducen de ellos.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from whatsapp import BURST_MIN, BURSTS_MIN_MESSAGES, LATENCY_SCORES, MIN_REPLIES, parse_buffer, parse_file  # noqa: E402
+
+
+def chat(lines: list[str]) -> bytes:
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def test_short_chat_keeps_love_bombing_answer():
+    stats = parse_buffer(chat([
+        "12/03/2024, 21:15 - Ana: hola!",
+        "12/03/2024, 21:16 - Luis: qué tal?",
+        "12/03/2024, 21:16 - Luis: te echo de menos",
+        "12/03/2024, 21:16 - Luis: eres increíble",
+        "12/03/2024, 21:16 - Luis: nunca conocí a nadie así",
+        "12/03/2024, 21:17 - Luis: te quiero",
+    ]))
+    assert stats.senders["Luis"].bursts == 1
+    assert stats.senders["Luis"].messages < BURSTS_MIN_MESSAGES
+    signals = stats.signals("Ana")
+    assert "love_bombing" not in signals
+
+    # Lo mismo que hace el botón de app.py: lo que ya había contestado ella no se pisa.
+    state = {"love_bombing": "No"}
+    state.update(signals)
+    assert state["love_bombing"] == "No"
+
+
+def test_header_formats():
+    # Android en español, iOS con corchetes y segundos, 12 h con "p. m." y espacios raros, y nombres con ~ y LRM.
+    stats = parse_buffer(chat([
+        "12/03/2024, 21:15 - Ana: hola",
+        "[12/3/24, 21:16:03] Luis: buenas",
+        "12/3/24 9:17 p. m. - Ana: qué tal",
+        "3/12/24, 9:18 PM - Luis: bien",
+        "\u200e[12.03.24, 21:19:00] ~\u00a0Luis: y tú",
+        "12/03/2024, 21:20 - Ana: esto sigue",
+        "en otra línea: con dos puntos",
+    ]))
+    assert stats.people() == ["Ana", "Luis"]
+    assert stats.senders["Ana"].messages == 3
+    assert stats.senders["Luis"].messages == 3
+    # La línea de continuación no es un mensaje nuevo, pero sus palabras cuentan.
+    assert stats.senders["Ana"].words >= 7
+
+
+def test_bytes_and_file_agree(tmp_path):
+    buf = chat([f"12/03/2024, 21:{m:02d} - {'Ana' if m % 3 else 'Luis'}: mensaje {m}?" for m in range(60)])
+    path = tmp_path / "chat.txt"
+    path.write_bytes(buf)
+    a, b = parse_buffer(buf), parse_file(str(path))
+    assert {n: s.messages for n, s in a.senders.items()} == {n: s.messages for n, s in b.senders.items()}
+    # Un fichero vacío no se puede mapear: sale un chat vacío, no una excepción.
+    (tmp_path / "vacío.txt").write_bytes(b"")
+    assert parse_file(str(tmp_path / "vacío.txt")).messages == 0
+
+
+def test_bursts_and_latency_signals():
+    lines = []
+    t = 0  # minutos desde las 10:00
+
+    def say(who, text="hola"):
+        lines.append(f"12/03/2024, {10 + t // 60:02d}:{t % 60:02d} - {who}: {text}")
+
+    # 25 rondas: ella escribe, él contesta a los 3 min con una ráfaga de 5 mensajes (uno con pregunta).
+    for _ in range(25):
+        say("Ana", "te cuento una cosa muy larga de mi día")
+        t += 3
+        for i in range(BURST_MIN):
+            say("Luis", "y tú qué tal?" if i == 0 else "guapa")
+        t += 1
+    stats = parse_buffer(chat(lines))
+    luis = stats.senders["Luis"]
+    assert luis.messages == 25 * BURST_MIN >= BURSTS_MIN_MESSAGES
+    assert luis.bursts == 25
+    # Tarda 3 min: tramo 1–5 min.
+    assert luis.median_latency_bucket() == 1
+    signals = stats.signals("Ana")
+    assert signals["love_bombing"] == "Sí"
+    assert signals["me_escucho_0_10"] == str(LATENCY_SCORES[1])
+    assert signals["me_hizo_preguntas_0_10"] == "10"
+
+
+def test_slow_replies_and_no_bursts():
+    lines = []
+    for h in range(0, 20):
+        lines.append(f"12/03/2024, {h:02d}:00 - Ana: hola")
+        lines.append(f"12/03/2024, {h:02d}:45 - Luis: ok")
+    stats = parse_buffer(chat(lines))
+    signals = stats.signals("Ana")
+    assert stats.senders["Luis"].median_latency_bucket() == 3  # 30 min–2 h
+    assert signals["me_escucho_0_10"] == str(LATENCY_SCORES[3])
+    assert "love_bombing" not in signals
+    assert signals["me_hizo_preguntas_0_10"] == "0"
+
+
+def test_too_few_replies_gives_no_latency():
+    stats = parse_buffer(chat(["12/03/2024, 21:15 - Ana: hola", "12/03/2024, 21:16 - Luis: hola"]))
+    assert stats.senders["Luis"].replies < MIN_REPLIES
+    assert "me_escucho_0_10" not in stats.signals("Ana")
+    assert stats.signals("Nadie") == {}
@@ -0,0 +1,98 @@
+# timeline.py
+import json
+import os
+
+# Peso de la última cita en la media móvil (EWMA). Con pocas citas por persona, alto.
+TREND_ALPHA = float(os.environ.get("TREND_ALPHA", "0.5"))
+# Un factor "va a peor" si hoy suma al menos WORSE_DELTA puntos más que su media…
+WORSE_DELTA = 5
+# …o si lleva WORSE_STREAK citas seguidas subiendo.
+WORSE_STREAK = 2
+# Diferencia con la media por debajo de la cual el score se considera estable.
+STABLE_BAND = 5
+
+
+def person_key(name) -> str:
+    # "Dani", " dani " y "DANI" son la misma persona.
+    return " ".join(str(name or "").split()).casefold()
+
+
+class Trend:
+    """Agregados de las citas con una persona. advance() es O(1) por cita: nunca relee el historial."""
+
+    __slots__ = ("n", "ewma", "last", "last_at", "factors", "worse")
+
+    def __init__(self):
+        self.n = 0
+        self.ewma = 0.0
+        self.last = None
+        self.last_at = None
+        self.factors: dict[str, list] = {}  # etiqueta → [media, puntos de la última cita, racha subiendo]
+        self.worse: tuple = ()  # factores que iban a peor en la última cita
+
+    def _step(self, breakdown: dict) -> tuple[dict, tuple]:
+        factors, worse = {}, []
+        for label in {**self.factors, **breakdown}:
+            pts = breakdown.get(label, 0)
+            prev = self.factors.get(label)
+            if prev is None:
+                # Primera vez que aparece: lo de antes contaba 0.
+                prev = [0.0, 0, 0] if self.n else [pts, pts, 0]
+            avg, last, streak = prev
+            streak = streak + 1 if pts > last else 0
+            if self.n and (pts - avg >= WORSE_DELTA or streak >= WORSE_STREAK):
+                worse.append(label)
+            factors[label] = [round(avg + TREND_ALPHA * (pts - avg), 2), pts, streak]
+        return factors, tuple(sorted(worse, key=lambda f: -factors[f][1]))
+
+    def advance(self, score: int, breakdown: dict, at: float) -> "Trend":
+        self.factors, self.worse = self._step(breakdown)
+        self.ewma = float(score) if not self.n else round(self.ewma + TREND_ALPHA * (score - self.ewma), 2)
+        self.n += 1
+        self.last = int(score)
+        self.last_at = at
+        return self
+
+    def direction(self, score: int) -> str:
+        delta = score - self.ewma
+        if delta >= STABLE_BAND:
+            return "empeora"
+        if delta <= -STABLE_BAND:
+            return "mejora"
+        return "estable"
+
+    def context(self, score: int, breakdown: dict) -> dict | None:
+        """Lo que cambia de esta cita respecto a las anteriores (para el prompt). None si es la primera."""
+        if not self.n:
+            return None
+        _, worse = self._step(breakdown)
+        return {
+            "dates": self.n,
+            "ewma": round(self.ewma),
+            "last": self.last,
+            "direction": self.direction(score),
+            "worse": list(worse),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"n": self.n, "ewma": self.ewma, "last": self.last, "at": self.last_at, "f": self.factors, "worse": self.worse},
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Trend":
+        d = json.loads(raw)
+        self = cls()
+        self.n, self.ewma, self.last, self.last_at = d["n"], d["ewma"], d["last"], d["at"]
+        self.factors, self.worse = d["f"], tuple(d["worse"])
+        return self
+
+
+def replay(rows) -> list[tuple[dict, float, tuple]]:
+    """(fila, media tras ella, factores a peor) para cada cita, en orden. Solo para pintar la evolución."""
+    trend, out = Trend(), []
+    for row in rows:
+        trend.advance(row["score"], row["breakdown"], row["created_at"])
+        out.append((row, trend.ewma, trend.worse))
+    return out
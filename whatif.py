@@ -0,0 +1,163 @@
+# whatif.py
+from typing import NamedTuple
+
+from scoring import (
+    CATEGORICAL,
+    GREEN_FIELD,
+    GREEN_FLAGS,
+    LEVELS,
+    OPTIONS,
+    PHONE_FIELD,
+    PHONE_LABEL,
+    PHONE_MAX_COUNT,
+    PHONE_TABLE,
+    SLIDER_TABLES,
+    SLIDERS,
+    categorical_points,
+    clamp,
+    level_for,
+    phone_count,
+    to_int_0_10,
+)
+
+# compute_score es una suma de aportaciones independientes (más el clamp final), así que
+# "¿y si hubiera contestado X?" es restar la aportación actual y sumar la de X.
+
+
+class Factor(NamedTuple):
+    key: str  # campo de date_data ("green_flags:<flag>" para cada green flag)
+    label: str  # cómo se lo enseñamos a la usuaria
+    options: tuple  # respuestas posibles, en el orden del widget
+    points: tuple  # puntos de cada respuesta
+
+
+class Change(NamedTuple):
+    factor: Factor
+    before: str
+    after: str
+    delta: int
+
+
+def _build() -> tuple[Factor, ...]:
+    factors = []
+    for key, label, weights, other in CATEGORICAL:
+        options = OPTIONS[key]
+        factors.append(Factor(key, label, options, tuple(categorical_points(weights, other, o) for o in options)))
+    for (key, label, _, default_mid), table in zip(SLIDERS, SLIDER_TABLES):
+        options = ("Sin responder",) + tuple(str(i) for i in range(11))
+        factors.append(Factor(key, label, options, (table[default_mid],) + table))
+    # A partir de PHONE_MAX_COUNT manda el tope: una sola opción "13+".
+    phone_options = tuple(str(m) for m in range(PHONE_MAX_COUNT)) + (f"{PHONE_MAX_COUNT}+",)
+    factors.append(Factor(PHONE_FIELD, PHONE_LABEL, phone_options, PHONE_TABLE))
+    for flag, w in GREEN_FLAGS:
+        factors.append(Factor(f"{GREEN_FIELD}:{flag}", f"Green flag: {flag}", ("No", "Sí"), (0, -w)))
+    return tuple(factors)
+
+
+# Tablas de aportación por campo: se calculan una vez al importar.
+FACTORS = _build()
+TOPS = tuple(top for top, _ in LEVELS)
+
+
+def _current_option(factor: Factor, data: dict) -> int | None:
+    if factor.key.startswith(GREEN_FIELD + ":"):
+        return 1 if factor.key.split(":", 1)[1] in (data.get(GREEN_FIELD) or []) else 0
+    if factor.key == PHONE_FIELD:
+        return phone_count(data.get(PHONE_FIELD, 0))
+    v = data.get(factor.key, "Sin responder")
+    if factor.key.endswith("_0_10"):
+        if v is None or str(v).strip().lower().startswith("sin"):
+            return 0
+        return to_int_0_10(v) + 1
+    try:
+        return factor.options.index(v)
+    except ValueError:
+        # Respuesta fuera del widget (p. ej. un envío por lotes): no la podemos señalar, pero sus puntos sí cuentan.
+        return None
+
+
+def _real(factor: Factor):
+    # "Sin responder" no es algo que él pudiera haber hecho distinto: no lo proponemos como cambio.
+    return [(j, pts) for j, (opt, pts) in enumerate(zip(factor.options, factor.points)) if opt != "Sin responder"]
+
+
+def _move(direction: int, cur: int, pts: int) -> int:
+    # Cuánto empuja cambiar de cur a pts en la dirección pedida (negativo si va al revés).
+    return (pts - cur) * direction
+
+
+def _level_index(score: int) -> int:
+    for i, top in enumerate(TOPS):
+        if score <= top:
+            return i
+    return len(TOPS) - 1
+
+
+class WhatIf:
+    """Escenarios sobre un envío: aportación actual de cada pregunta y lo que pasaría con cada alternativa."""
+
+    def __init__(self, data: dict, breakdown: dict):
+        # Puntos antes del clamp: con el clamp aplicado no se podría restar/sumar bien.
+        self.raw = sum(breakdown.values())
+        self.current = []
+        self.answers = []
+        for f in FACTORS:
+            idx = _current_option(f, data)
+            self.answers.append(idx)
+            if idx is not None:
+                self.current.append(f.points[idx])
+            else:
+                # Solo pasa en las categóricas: sus puntos salen del breakdown, que usa la misma etiqueta.
+                self.current.append(breakdown.get(f.label, 0))
+        self.score = clamp(self.raw)
+        self.level = level_for(self.score)
+
+    def answer(self, i: int) -> str:
+        idx = self.answers[i]
+        return FACTORS[i].options[idx] if idx is not None else "(otra)"
+
+    def alternatives(self, i: int) -> list[tuple[str, int, str, bool]]:
+        """(respuesta, score, nivel, es la actual) para cada opción de la pregunta i."""
+        f, cur = FACTORS[i], self.current[i]
+        out = []
+        for j, (opt, pts) in enumerate(zip(f.options, f.points)):
+            score = clamp(self.raw - cur + pts)
+            out.append((opt, score, level_for(score), j == self.answers[i]))
+        return out
+
+    def minimal_changes(self, direction: int) -> tuple[str, list[Change]] | None:
+        """Menos preguntas a cambiar para bajar (direction=-1) o subir (+1) un nivel. None si no se puede."""
+        li = _level_index(self.score)
+        target = li + direction
+        if not 0 <= target < len(TOPS):
+            return None
+        # Bajar: raw' <= tope del nivel inferior. Subir: raw' > tope del nivel actual.
+        need = self.raw - TOPS[target] if direction < 0 else TOPS[li] + 1 - self.raw
+
+        # Lo más que puede mover cada pregunta en esa dirección.
+        gains = []
+        for i, f in enumerate(FACTORS):
+            g = max((_move(direction, self.current[i], pts) for _, pts in _real(f)), default=0)
+            if g > 0:
+                gains.append((g, i))
+        # Para minimizar cuántas preguntas cambian basta con coger las que más mueven.
+        gains.sort(reverse=True)
+        chosen, total = [], 0
+        for g, i in gains:
+            if total >= need:
+                break
+            chosen.append((g, i))
+            total += g
+        if total < need:
+            return None
+
+        # Dentro de cada pregunta elegida, el cambio más suave que siga llegando al objetivo.
+        changes, remaining = [], need
+        for n, (g, i) in enumerate(chosen):
+            rest = sum(gg for gg, _ in chosen[n + 1 :])
+            f, cur = FACTORS[i], self.current[i]
+            options = sorted((_move(direction, cur, pts), j) for j, pts in _real(f))
+            move, j = next((m, j) for m, j in options if m > 0 and m >= remaining - rest)
+            remaining -= move
+            changes.append(Change(f, self.answer(i), f.options[j], f.points[j] - cur))
+        return LEVELS[target][1], changes
@@ -0,0 +1,239 @@
+# whatsapp.py
+import mmap
+import re
+import time
+from bisect import bisect_right
+from datetime import date
+
+# Exportaciones de WhatsApp ("Exportar chat" → sin archivos), de Android e iOS, en español o inglés:
+#   12/03/2024, 21:15 - Nombre: mensaje
+#   [12/3/24, 21:15:03] Nombre: mensaje
+#   12/3/24 9:15 p. m. - Nombre: mensaje
+# Las líneas que no empiezan por fecha son continuación del mensaje anterior.
+_LINE = re.compile(
+    rb"^(?:\xe2\x80\x8e)?\[?(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4}),? (\d{1,2}):(\d{2})(?::\d{2})?"
+    rb"(?:(?: |\xc2\xa0|\xe2\x80\xaf)*([apAP])\.?(?: |\xc2\xa0|\xe2\x80\xaf)?[mM]\.?)?\]?(?: -|:)? ([^:\r\n]{1,80}?): ",
+    re.M,
+)
+
+RELEASE_EVERY = 64 * 1024 * 1024  # con mmap, cada cuánto devolvemos al sistema las páginas ya leídas
+MAX_SENDERS = 50  # en grupos enormes, los demás no cuentan
+BURST_GAP_MIN = 2  # mensajes seguidos de la misma persona con menos de esto entre ellos…
+BURST_MIN = 5  # …a partir de cuántos son una ráfaga
+BURSTS_PER_100 = 3.0  # ráfagas por cada 100 mensajes suyos a partir de las que sugerimos love bombing
+BURSTS_MIN_MESSAGES = 100  # con menos mensajes suyos, una sola ráfaga ya pasaría del umbral: no decimos nada
+QUESTION_TARGET = 0.2  # 1 de cada 5 mensajes suyos con pregunta ya es un 10 en curiosidad
+# Tramos de tiempo de respuesta (minutos) y la nota de atención de cada uno.
+LATENCY_BUCKETS_MIN = (1, 5, 30, 120, 720)
+LATENCY_SCORES = (10, 9, 7, 5, 3, 1)
+LATENCY_LABELS = ("menos de 1 min", "1–5 min", "5–30 min", "30 min–2 h", "2–12 h", "más de 12 h")
+MIN_REPLIES = 5
+
+
+class Sender:
+    __slots__ = ("messages", "words", "questions", "replies", "latency", "bursts")
+
+    def __init__(self):
+        self.messages = 0
+        self.words = 0
+        self.questions = 0
+        self.replies = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS_MIN) + 1)
+        self.bursts = 0
+
+    def median_latency_bucket(self) -> int | None:
+        if self.replies < MIN_REPLIES:
+            return None
+        acc = 0
+        for i, n in enumerate(self.latency):
+            acc += n
+            if acc * 2 >= self.replies:
+                return i
+        return len(self.latency) - 1
+
+
+class ChatStats:
+    """Recuentos por persona de un chat exportado. Memoria constante: nunca guarda mensajes."""
+
+    def __init__(self):
+        self.senders: dict[str, Sender] = {}
+        self.size = 0
+        self.seconds = 0.0
+
+    @property
+    def messages(self) -> int:
+        return sum(s.messages for s in self.senders.values())
+
+    @property
+    def mb_s(self) -> float:
+        return self.size / 1e6 / self.seconds if self.seconds else 0.0
+
+    def people(self) -> list[str]:
+        return sorted(self.senders, key=lambda name: self.senders[name].messages, reverse=True)
+
+    def other(self, me: str) -> str | None:
+        # En un grupo, "él" es quien más escribe después de ti.
+        return next((name for name in self.people() if name != me), None)
+
+    def signals(self, me: str) -> dict:
+        """Respuestas del cuestionario que se pueden deducir del chat (clave del widget → valor)."""
+        other = self.other(me)
+        if other is None or me not in self.senders:
+            return {}
+        mine, his = self.senders[me], self.senders[other]
+        out = {}
+        if mine.words + his.words:
+            # Si tú escribes al menos la mitad, te dejó hablar.
+            share = mine.words / (mine.words + his.words)
+            out["me_dejo_hablar_0_10"] = str(round(min(1.0, share / 0.5) * 10))
+        if his.messages:
+            out["me_hizo_preguntas_0_10"] = str(round(min(1.0, his.questions / his.messages / QUESTION_TARGET) * 10))
+        bucket = his.median_latency_bucket()
+        if bucket is not None:
+            out["me_escucho_0_10"] = str(LATENCY_SCORES[bucket])
+        # Solo lo marcamos si salta: que no haya ráfagas no demuestra nada. Con un chat corto, ni eso
+        # (y sin clave, lo que ya hubiera contestado ella se queda como estaba).
+        if his.messages >= BURSTS_MIN_MESSAGES and his.bursts * 100 / his.messages >= BURSTS_PER_100:
+            out["love_bombing"] = "Sí"
+        return out
+
+    def summary(self, me: str) -> list[str]:
+        other = self.other(me)
+        if other is None or me not in self.senders:
+            return []
+        mine, his = self.senders[me], self.senders[other]
+        lines = [
+            f"Mensajes: tú {mine.messages:,} · {other} {his.messages:,}",
+            f"Palabras: tú {mine.words:,} · {other} {his.words:,}",
+            f"Mensajes suyos con pregunta: {his.questions:,} ({his.questions / max(1, his.messages):.0%})",
+            f"Ráfagas suyas (≥{BURST_MIN} mensajes seguidos): {his.bursts:,}",
+        ]
+        bucket = his.median_latency_bucket()
+        if bucket is not None:
+            lines.append(f"Tarda en contestarte (mediana): {LATENCY_LABELS[bucket]}")
+        return lines
+
+
+def _day(a: bytes, b: bytes, y: bytes) -> int | None:
+    # Día primero (como en España) salvo que el segundo número no pueda ser un mes.
+    day, month, year = int(a), int(b), int(y)
+    if month > 12:
+        day, month = month, day
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day).toordinal()
+    except ValueError:
+        return None
+
+
+def parse_buffer(buf) -> ChatStats:
+    """Recorre el export entero (bytes, mmap o memoryview) sin copiarlo: solo guarda contadores."""
+    stats = ChatStats()
+    senders = stats.senders
+    names: dict[bytes, Sender | None] = {}
+    days: dict[tuple, int | None] = {}
+    t0 = time.perf_counter()
+    cur = None  # Sender del último mensaje
+    body_start = 0
+    last_t = None
+    run = 0
+    # Solo un mmap sabe soltar páginas; con bytes no hace falta (ya están en memoria).
+    madvise = getattr(buf, "madvise", None)
+    released = 0
+
+    # La búsqueda de cabeceras va en C sobre el buffer; lo que hay entre dos cabeceras es el texto
+    # del mensaje anterior, con sus líneas de continuación.
+    for m in _LINE.finditer(buf):
+        start, end = m.span()
+        if cur is not None:
+            body = buf[body_start:start]
+            cur.words += body.count(b" ") + (body.count(b"\n") or 1)
+            if b"?" in body:
+                cur.questions += 1
+        body_start = end
+        if madvise is not None and start - released >= RELEASE_EVERY:
+            upto = start - start % mmap.PAGESIZE
+            madvise(mmap.MADV_DONTNEED, released, upto - released)
+            released = upto
+
+        d, mo, y, hour, minute, ampm, raw = m.groups()
+        sender = names.get(raw, False)
+        if sender is False:
+            name = raw.replace(b"\xe2\x80\x8e", b"").lstrip(b"~").strip().decode("utf-8", "replace").strip("\u00a0\u202f ")
+            sender = senders.get(name)
+            if sender is None and len(senders) < MAX_SENDERS:
+                sender = senders[name] = Sender()
+            names[raw] = sender
+        if sender is None:
+            cur = None
+            continue
+
+        key = (d, mo, y)
+        day = days.get(key, False)
+        if day is False:
+            day = days[key] = _day(d, mo, y)
+        t = None
+        if day is not None:
+            hour = int(hour)
+            if ampm is not None:
+                hour = hour % 12 + (12 if ampm in b"pP" else 0)
+            t = day * 1440 + hour * 60 + int(minute)
+
+        sender.messages += 1
+        if sender is cur:
+            if t is not None and last_t is not None and t - last_t <= BURST_GAP_MIN:
+                run += 1
+            else:
+                if run >= BURST_MIN:
+                    cur.bursts += 1
+                run = 1
+        else:
+            if cur is not None and run >= BURST_MIN:
+                cur.bursts += 1
+            run = 1
+            # Cambio de persona: esto es una respuesta al último mensaje del otro.
+            if cur is not None and t is not None and last_t is not None and t >= last_t:
+                sender.latency[bisect_right(LATENCY_BUCKETS_MIN, t - last_t)] += 1
+                sender.replies += 1
+        cur = sender
+        last_t = t
+
+    if cur is not None:
+        body = buf[body_start:]
+        cur.words += body.count(b" ") + (body.count(b"\n") or 1)
+        if b"?" in body:
+            cur.questions += 1
+        if run >= BURST_MIN:
+            cur.bursts += 1
+    stats.size = len(buf)
+    stats.seconds = time.perf_counter() - t0
+    return stats
+
+
+def parse_file(path: str) -> ChatStats:
+    # mmap: el sistema pagina el fichero según lo leemos, sin cargarlo entero en memoria.
+    with open(path, "rb") as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # fichero vacío
+            return parse_buffer(b"")
+        with m:
+            m.madvise(mmap.MADV_SEQUENTIAL)
+            return parse_buffer(m)
+
+
+def parse_upload(upload) -> ChatStats:
+    # st.file_uploader ya lo tiene en memoria (bytes): lo recorremos tal cual, sin copiarlo.
+    return parse_buffer(upload.getvalue())
+
+
+if __name__ == "__main__":
+    import sys
+
+    stats = parse_file(sys.argv[1])
+    print(f"{stats.messages:,} mensajes · {stats.size / 1e6:.1f} MB en {stats.seconds:.2f} s ({stats.mb_s:.1f} MB/s)")
+    people = stats.people()
+    me = sys.argv[2] if len(sys.argv) > 2 else (people[0] if people else "")
+    print("\n".join(stats.summary(me)))
+    print(stats.signals(me))